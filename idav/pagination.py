@@ -0,0 +1,228 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PaginationCurseur(BasePagination):
+    """
+    Pagination par clé (keyset) : le curseur contient les valeurs de tri de la
+    dernière ligne vue, et la page suivante est lue avec un WHERE sur ces valeurs
+    au lieu d'un OFFSET. Une page profonde coûte donc autant que la première.
+
+    Contrairement à CursorPagination de DRF, le tri peut porter sur n'importe quel
+    champ de OrderingFilter, même nullable et non unique (puissance_W, marque__nom...) :
+    les NULL sont rangés en dernier et la clé primaire sert de départage.
+
+    ?page_size= ajuste la taille de page, ?count=true ajoute le COUNT(*) total.
+    """
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    prefixe_annotation = 'cle_pagination_'
+    invalid_cursor_message = "Curseur invalide."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if self.count_demande(request) else None
+
+        ordering = self.get_ordering(request, queryset, view)
+        self.cles = self.cles_de_tri(ordering, queryset)
+        annotations = {nom: F(champ) for nom, champ, _ in self.cles if nom != 'pk'}
+        queryset = queryset.annotate(**annotations)
+        self.champs = self.champs_de_tri(queryset)
+
+        valeurs, precedent = self.decode_cursor(request)
+        if precedent:
+            queryset = queryset.filter(self.filtre_avant(valeurs)).order_by(*self.tri(inverse=True))
+            lignes = list(queryset[:self.page_size + 1])
+            self.has_previous = len(lignes) > self.page_size
+            self.has_next = True
+            page = list(reversed(lignes[:self.page_size]))
+        else:
+            if valeurs is not None:
+                queryset = queryset.filter(self.filtre_apres(valeurs))
+            lignes = list(queryset.order_by(*self.tri())[:self.page_size + 1])
+            self.has_next = len(lignes) > self.page_size
+            self.has_previous = valeurs is not None
+            page = lignes[:self.page_size]
+
+        self.premier = self.valeurs_de(page[0]) if page else None
+        self.dernier = self.valeurs_de(page[-1]) if page else None
+        return page
+
+    def get_paginated_response(self, data):
+        contenu = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            contenu = {'count': self.count, **contenu}
+        return Response(contenu)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'description': "Présent seulement avec ?count=true"},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            demande = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(demande, self.max_page_size))
+
+    def count_demande(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'oui')
+
+    # Tri
+
+    def get_ordering(self, request, queryset, view):
+        """Tri demandé via OrderingFilter, sinon celui de la vue, du queryset ou du modèle."""
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return list(ordering)
+        ordering = getattr(view, 'ordering', None)
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        return list(ordering or queryset.query.order_by or queryset.model._meta.ordering or [])
+
+    def cles_de_tri(self, ordering, queryset):
+        """[(nom d'annotation, champ, décroissant)], toujours terminé par la clé primaire."""
+        cles = []
+        pk = queryset.model._meta.pk.name
+        desc_pk = False
+        for terme in ordering:
+            if not isinstance(terme, str):
+                continue
+            desc = terme.startswith('-')
+            champ = terme.lstrip('-')
+            if champ in ('pk', pk):
+                desc_pk = desc
+                break
+            cles.append((f"{self.prefixe_annotation}{len(cles)}", champ, desc))
+            desc_pk = desc
+        cles.append(('pk', 'pk', desc_pk))
+        return cles
+
+    def champs_de_tri(self, queryset):
+        """Champ de modèle de chaque clé de tri, qui reconvertit les valeurs du curseur."""
+        return [
+            queryset.model._meta.pk if nom == 'pk' else queryset.query.annotations[nom]._output_field_or_none
+            for nom, _, _ in self.cles
+        ]
+
+    def tri(self, inverse=False):
+        # Sens inverse (page précédente) : chaque clé est retournée, NULL compris
+        nulls = {'nulls_first': True} if inverse else {'nulls_last': True}
+        termes = []
+        for nom, _, desc in self.cles:
+            desc = desc != inverse
+            if nom == 'pk':
+                termes.append('-pk' if desc else 'pk')
+            elif desc:
+                termes.append(F(nom).desc(**nulls))
+            else:
+                termes.append(F(nom).asc(**nulls))
+        return termes
+
+    def filtre_apres(self, valeurs):
+        """Lignes strictement après `valeurs` dans l'ordre de tri (NULL en dernier)."""
+        conditions = []
+        egal = Q()
+        for (nom, _, desc), valeur in zip(self.cles, valeurs):
+            if valeur is None:
+                strict = None  # rien ne suit un NULL, sauf à égalité sur les clés suivantes
+            else:
+                strict = Q(**{f"{nom}__{'lt' if desc else 'gt'}": valeur})
+                if nom != 'pk':
+                    strict |= Q(**{f"{nom}__isnull": True})
+            if strict is not None:
+                conditions.append(egal & strict)
+            egal &= Q(**{f"{nom}__isnull": True}) if valeur is None else Q(**{nom: valeur})
+        return reduce(or_, conditions)
+
+    def filtre_avant(self, valeurs):
+        """Lignes strictement avant `valeurs` dans l'ordre de tri (NULL en dernier)."""
+        conditions = []
+        egal = Q()
+        for (nom, _, desc), valeur in zip(self.cles, valeurs):
+            if valeur is None:
+                strict = Q(**{f"{nom}__isnull": False})
+            else:
+                strict = Q(**{f"{nom}__{'gt' if desc else 'lt'}": valeur})
+            conditions.append(egal & strict)
+            egal &= Q(**{f"{nom}__isnull": True}) if valeur is None else Q(**{nom: valeur})
+        return reduce(or_, conditions)
+
+    def valeurs_de(self, obj):
+        return [obj.pk if nom == 'pk' else getattr(obj, nom) for nom, _, _ in self.cles]
+
+    # Curseur
+
+    def decode_cursor(self, request):
+        brut = request.query_params.get(self.cursor_query_param)
+        if not brut:
+            return None, False
+        try:
+            curseur = json.loads(base64.urlsafe_b64decode(brut.encode('ascii')))
+            valeurs, precedent = curseur['v'], bool(curseur.get('p'))
+        except (binascii.Error, ValueError, TypeError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(valeurs, list) or len(valeurs) != len(self.cles):
+            raise NotFound(self.invalid_cursor_message)
+        # Chaque valeur est reconvertie par son champ : une valeur mal typée
+        # (texte pour un décimal...) ne doit pas atteindre la requête
+        try:
+            valeurs = [
+                valeur if valeur is None or champ is None else champ.to_python(valeur)
+                for champ, valeur in zip(self.champs, valeurs)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return valeurs, precedent
+
+    def encode_cursor(self, valeurs, precedent):
+        curseur = {'v': valeurs}
+        if precedent:
+            curseur['p'] = 1
+        brut = json.dumps(curseur, cls=DjangoJSONEncoder, separators=(',', ':'))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, base64.urlsafe_b64encode(brut.encode()).decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or self.dernier is None:
+            return None
+        return self.encode_cursor(self.dernier, precedent=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.premier is None:
+            # Page vide atteinte par un curseur : revenir au début
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.premier, precedent=True)
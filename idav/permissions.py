@@ -0,0 +1,14 @@
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+
+class IsAdminOrReadOnly(BasePermission):
+    """
+    Lecture pour tous ; création, modification et suppression réservées au staff
+    et aux utilisateurs de rôle admin (grilles de prix, tarifs...).
+    """
+
+    def has_permission(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        user = request.user
+        return bool(user and user.is_authenticated and (user.is_staff or getattr(user, 'role', None) == 'admin'))
@@ -54,6 +54,7 @@ INSTALLED_APPS = [
         'installation',
         'maintenance',
         'product',
+        'django_filters',
 
       "corsheaders",
          'drf_yasg',
@@ -108,6 +109,50 @@ GRAPH_MODELS ={
     'graph_models': True,
      }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Le cache local-mémoire est propre à chaque processus : en production avec plusieurs
+# workers (ou pour que l'import invalide le cache de l'API), configurer un backend partagé
+# (Redis, Memcached) pour que la version du catalogue soit vue par tous.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'idav',
+    }
+}
+
+CATALOGUE_CACHE_ALIAS = 'default'
+CATALOGUE_CACHE_TIMEOUT = 60 * 60  # secondes
+
+# Prix unitaires (FCFA) utilisés par le dimensionnement pour estimer le coût d'une
+# configuration ; surcharge les valeurs par défaut de installation/dimensionnement.py
+DIMENSIONNEMENT_COUTS_UNITAIRES = {
+    'panneau_Wc': 350,
+    'batterie_Wh': 150,
+    'batterie_lithium_Wh': 300,
+    'onduleur_VA': 120,
+    'regulateur_A': 2500,
+}
+
+# Main d'œuvre et maintenance annuelle d'un nouveau devis, en fraction du coût
+# des équipements tiré de la grille de prix (installation/devis.py)
+DEVIS_TAUX = {
+    'main_oeuvre': 0.15,
+    'maintenance_an': 0.02,
+}
+
+# Hypothèses des comparaisons économiques avec le réseau (installation/economie.py)
+ECONOMIE_HYPOTHESES = {
+    'duree_vie_ans': 20,
+    'taux_actualisation': 0.08,
+    'hausse_tarif_an': 0.03,
+}
+
+# Profils météo d'année type par province (installation/meteo.py) : fichiers
+# synthétiques livrés, remplaçables par des années types mesurées de même format
+PROFILS_METEO_DOSSIER = BASE_DIR / 'installation' / 'profils_meteo'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -165,5 +210,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', # Par défaut, les vues sont protégées
     ),
+    # Pagination par curseur (keyset) sur toutes les listes, voir idav/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'idav.pagination.PaginationCurseur',
+    'PAGE_SIZE': 50,
 }
 
@@ -43,6 +43,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
    path('user/', include('user.urls')),
    path('product/' ,include('product.urls')),
+   path('installation/', include('installation.urls')),
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
@@ -0,0 +1,153 @@
+"""
+Chiffrage des devis à partir de la grille de prix (product.PrixEquipement).
+
+Le coût des équipements d'une ou de plusieurs installations est calculé en une
+requête agrégée : pour chaque ligne, une sous-requête corrélée lit le prix en
+vigueur à la date voulue (celui de la province de l'installation s'il existe,
+sinon le prix national), puis les lignes sont sommées par installation.
+
+Le recalcul des devis ouverts avance par lots d'ids : une lecture des devis,
+une requête agrégée et un bulk_update par lot. La main d'œuvre et la
+maintenance saisies sur un devis existant sont conservées ; un nouveau devis
+les reçoit en pourcentage du coût des équipements (`DEVIS_TAUX`).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from product.models import PrixEquipement
+from .models import Devis, InstallationEquipement
+
+# Installations dont le devis suit encore les prix ; au-delà il est figé
+STATUTS_OUVERTS = ('pending', 'in_progress', 'proposed')
+
+# Main d'œuvre et maintenance annuelle d'un nouveau devis, en fraction du coût des équipements
+TAUX = {
+    'main_oeuvre': Decimal('0.15'),
+    'maintenance_an': Decimal('0.02'),
+}
+
+CENTIME = Decimal('0.01')
+SANS_LIGNE = {'cout': Decimal('0.00'), 'lignes': 0, 'sans_prix': 0}
+CHAMPS_CHIFFRES = ['cout_achat_equipements', 'montant_total']
+
+
+def taux():
+    return {cle: Decimal(str(v)) for cle, v in {**TAUX, **getattr(settings, 'DEVIS_TAUX', {})}.items()}
+
+
+def prix_en_vigueur(date):
+    """
+    Prix de l'équipement de la ligne (OuterRef) à `date`. Parmi le prix de la
+    province de l'installation et le prix national (province ''), le tri
+    décroissant sur province place celui de la province en premier.
+    """
+    return Subquery(
+        PrixEquipement.objects.filter(
+            Q(province=OuterRef('installation__province')) | Q(province=''),
+            equipement=OuterRef('equipement_id'), date_effet__lte=date,
+        ).order_by('-province', '-date_effet').values('prix')[:1]
+    )
+
+
+def couts_equipements(installation_ids, date=None):
+    """
+    {installation_id: {'cout', 'lignes', 'sans_prix'}} en une requête ; le coût ne
+    compte que les lignes dont l'équipement a un prix. Une installation sans
+    ligne est absente du résultat.
+    """
+    date = date or timezone.localdate()
+    lignes = (
+        InstallationEquipement.objects.filter(installation_id__in=installation_ids)
+        .annotate(prix=prix_en_vigueur(date))
+        .values('installation_id')
+        .annotate(cout=Sum(F('quantite') * F('prix')), lignes=Count('id'), avec_prix=Count('prix'))
+        .order_by()
+    )
+    return {
+        ligne['installation_id']: {
+            'cout': Decimal(ligne['cout'] or 0).quantize(CENTIME),
+            'lignes': ligne['lignes'],
+            'sans_prix': ligne['lignes'] - ligne['avec_prix'],
+        }
+        for ligne in lignes
+    }
+
+
+def equipements_sans_prix(installation, date=None):
+    """Ids des équipements de l'installation sans prix en vigueur à `date`."""
+    date = date or timezone.localdate()
+    return list(
+        installation.installationequipement_set.annotate(prix=prix_en_vigueur(date))
+        .filter(prix__isnull=True).order_by('equipement_id').values_list('equipement_id', flat=True)
+    )
+
+
+def appliquer(devis, cout):
+    """Reporte le coût des équipements sur `devis` ; True si un montant a changé."""
+    montant_total = (cout + devis.cout_installation_main_oeuvre).quantize(CENTIME)
+    if devis.cout_achat_equipements == cout and devis.montant_total == montant_total:
+        return False
+    devis.cout_achat_equipements = cout
+    devis.montant_total = montant_total
+    return True
+
+
+def chiffrer_installation(installation, date=None):
+    """
+    Devis de l'installation recalculé, non enregistré (nouveau si elle n'en a pas),
+    et les équipements sans prix. Avec des équipements sans prix, le devis
+    retourné est incomplet : à ne pas enregistrer.
+    """
+    date = date or timezone.localdate()
+    cout = couts_equipements([installation.pk], date).get(installation.pk, SANS_LIGNE)
+    sans_prix = equipements_sans_prix(installation, date) if cout['sans_prix'] else []
+
+    try:
+        devis = Devis.objects.get(installation=installation)
+    except Devis.DoesNotExist:
+        t = taux()
+        devis = Devis(
+            installation=installation,
+            cout_installation_main_oeuvre=(cout['cout'] * t['main_oeuvre']).quantize(CENTIME),
+            cout_maintenance_estime_an=(cout['cout'] * t['maintenance_an']).quantize(CENTIME),
+        )
+    appliquer(devis, cout['cout'])
+    return devis, sans_prix
+
+
+def recalculer_devis(date=None, taille_lot=500, devis=None):
+    """
+    Réapplique la grille de prix aux devis des installations ouvertes (ou à
+    `devis`, un queryset), par lots. Un devis dont un équipement n'a pas de prix
+    est laissé tel quel et compté dans 'incomplets'.
+    Retourne {'devis', 'modifies', 'incomplets'}.
+    """
+    date = date or timezone.localdate()
+    if devis is None:
+        devis = Devis.objects.filter(installation__status__in=STATUTS_OUVERTS)
+    devis = devis.order_by('pk').only('id', 'installation_id', *CHAMPS_CHIFFRES, 'cout_installation_main_oeuvre')
+
+    compteurs = {'devis': 0, 'modifies': 0, 'incomplets': 0}
+    dernier = 0
+    while True:
+        lot = list(devis.filter(pk__gt=dernier)[:taille_lot])
+        if not lot:
+            break
+        dernier = lot[-1].pk
+        couts = couts_equipements([d.installation_id for d in lot], date)
+
+        a_modifier = []
+        for d in lot:
+            cout = couts.get(d.installation_id, SANS_LIGNE)
+            if cout['sans_prix']:
+                compteurs['incomplets'] += 1
+            elif appliquer(d, cout['cout']):
+                a_modifier.append(d)
+        Devis.objects.bulk_update(a_modifier, CHAMPS_CHIFFRES)
+
+        compteurs['devis'] += len(lot)
+        compteurs['modifies'] += len(a_modifier)
+    return compteurs
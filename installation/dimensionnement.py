@@ -0,0 +1,338 @@
+"""
+Dimensionnement d'un système solaire autonome à partir du catalogue.
+
+Les colonnes utiles des panneaux, batteries, onduleurs et contrôleurs de charge
+sont chargées une fois dans des tableaux NumPy, rechargés quand les marqueurs
+du catalogue en base changent (écritures de n'importe quel processus). Toutes
+les combinaisons panneau × batterie × onduleur sont ensuite évaluées d'un seul
+passage vectorisé : nombre de panneaux et de batteries, contrôleur le moins
+cher compatible, coût, autonomie obtenue et surface occupée. Les
+configurations réalisables (tension du parc, puissance de pointe, budget,
+surface) sont classées et les k meilleures renvoyées.
+
+Hypothèses : `consommation_energetique` de l'installation est une consommation
+journalière en kWh ; les coûts sont estimés à partir de prix unitaires (par Wc,
+Wh, VA, A) réglables par `DIMENSIONNEMENT_COUTS_UNITAIRES`.
+"""
+import math
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from product.cache import version_marqueurs
+from product.compatibilite import FACTEUR_PUISSANCE, FAMILLES, MARGE_VOC, TOLERANCE_TENSION
+from product.models import Categorie, Equipement
+
+
+HEURES_SOLEIL_PLEIN = 5.5  # kWh/m²/jour, moyenne annuelle au Burkina Faso
+RATIO_PERFORMANCE = 0.75  # pertes câblage, température, salissure, contrôleur
+AUTONOMIE_JOURS = 1.0
+# La pointe de consommation est estimée comme l'énergie du jour consommée sur 4 heures
+HEURES_POINTE = 4.0
+PROFONDEUR_DECHARGE = {'lithium': 0.9, 'plomb': 0.5}
+RENDEMENT_ONDULEUR = 0.9  # quand le catalogue ne le donne pas
+IRRADIANCE_STC = 1000.0  # W/m²
+
+# Prix unitaires (FCFA) tant que le catalogue n'a pas de prix
+COUTS_UNITAIRES = {
+    'panneau_Wc': 350,
+    'batterie_Wh': 150,
+    'batterie_lithium_Wh': 300,
+    'onduleur_VA': 120,
+    'regulateur_A': 2500,
+}
+
+K_MAX = 50
+TRIS = ('cout', 'autonomie', 'surface')
+# Nombre maximal de combinaisons évaluées ensemble (mémoire des tableaux intermédiaires)
+TAILLE_BLOC = 2_000_000
+
+
+def _flottants(valeurs):
+    return np.array([np.nan if v is None else float(v) for v in valeurs], dtype=float)
+
+
+def _texte(equipement):
+    return f"{equipement['type_equipement']} {equipement['nom']}".lower()
+
+
+def _tensions(encodees):
+    """"/12/24/" -> {12.0, 24.0} (ensemble vide : non renseigné)."""
+    return {float(v) for v in encodees.strip('/').split('/') if v}
+
+
+def couts_unitaires():
+    return {**COUTS_UNITAIRES, **getattr(settings, 'DIMENSIONNEMENT_COUTS_UNITAIRES', {})}
+
+
+class CatalogueDimensionnement:
+    """Colonnes du catalogue en tableaux NumPy, une entrée par équipement actif."""
+
+    CHAMPS = [
+        'id', 'nom', 'type_equipement', 'mode', 'puissance_W', 'puissance_VA', 'tension_V',
+        'tension_entree_DC_V', 'capacite_Ah', 'energie_Wh', 'surface_m2', 'efficacite_module_pourcent',
+        'tension_circuit_ouvert_VOC', 'rendement_pourcent', 'tension_max_PV_V', 'courant_charge_A',
+        'tensions_systeme_V',
+    ]
+
+    def __init__(self, version=None):
+        self.version = version
+        couts = couts_unitaires()
+
+        panneaux = self._lire('panneau')
+        self.panneaux = self._identites(panneaux)
+        puissance = _flottants(e['puissance_W'] for e in panneaux)
+        efficacite = _flottants(e['efficacite_module_pourcent'] for e in panneaux)
+        surface = _flottants(e['surface_m2'] for e in panneaux)
+        # Sans dimensions, la surface découle de la puissance crête et du rendement du module
+        surface = np.where(np.isnan(surface), puissance / (efficacite / 100 * IRRADIANCE_STC), surface)
+        self.panneau_puissance = puissance
+        self.panneau_surface = surface
+        self.panneau_voc = _flottants(e['tension_circuit_ouvert_VOC'] for e in panneaux)
+        self.panneau_cout = puissance * couts['panneau_Wc']
+
+        batteries = self._lire('batterie')
+        self.batteries = self._identites(batteries)
+        tension = _flottants(e['tension_V'] for e in batteries)
+        energie = _flottants(e['energie_Wh'] for e in batteries)
+        energie = np.where(np.isnan(energie), _flottants(e['capacite_Ah'] for e in batteries) * tension, energie)
+        lithium = np.array(['lithium' in _texte(e) or 'lifepo4' in _texte(e) for e in batteries], dtype=bool)
+        self.batterie_tension = tension
+        self.batterie_energie = energie
+        self.batterie_dod = np.where(lithium, PROFONDEUR_DECHARGE['lithium'], PROFONDEUR_DECHARGE['plomb'])
+        self.batterie_cout = energie * np.where(
+            lithium, couts['batterie_lithium_Wh'], couts['batterie_Wh']
+        )
+
+        # Les onduleurs raccordés au réseau n'ont pas d'entrée batterie
+        onduleurs = [e for e in self._lire('onduleur') if 'on-grid' not in _texte(e) and 'réseau' not in _texte(e)]
+        self.onduleurs = self._identites(onduleurs)
+        va = _flottants(e['puissance_VA'] for e in onduleurs)
+        watts = _flottants(e['puissance_W'] for e in onduleurs)
+        self.onduleur_puissance = np.where(np.isnan(watts), va * FACTEUR_PUISSANCE, watts)
+        self.onduleur_tension = _flottants(e['tension_entree_DC_V'] or e['tension_V'] for e in onduleurs)
+        rendement = _flottants(e['rendement_pourcent'] for e in onduleurs) / 100
+        self.onduleur_rendement = np.where(np.isnan(rendement), RENDEMENT_ONDULEUR, rendement)
+        # Un onduleur hybride intègre son contrôleur MPPT
+        self.onduleur_hybride = np.array(['hybride' in _texte(e) for e in onduleurs], dtype=bool)
+        self.onduleur_cout = np.where(np.isnan(va), self.onduleur_puissance / FACTEUR_PUISSANCE, va) * couts['onduleur_VA']
+
+        regulateurs = self._lire('regulateur')
+        self.regulateurs = self._identites(regulateurs)
+        self.regulateur_tension_pv = _flottants(e['tension_max_PV_V'] for e in regulateurs)
+        self.regulateur_courant = _flottants(e['courant_charge_A'] for e in regulateurs)
+        self.regulateur_cout = self.regulateur_courant * couts['regulateur_A']
+        # Tensions de parc acceptées par chaque contrôleur pour chaque onduleur (non renseigné : acceptée)
+        tensions = [_tensions(e['tensions_systeme_V']) for e in regulateurs]
+        self.regulateur_tension_ok = np.array(
+            [[not t or v in t for v in self.onduleur_tension] for t in tensions], dtype=bool,
+        ).reshape(len(regulateurs), len(onduleurs))
+
+    @classmethod
+    def _lire(cls, famille):
+        chemins = Categorie.objects.filter(nom=FAMILLES[famille]).values_list('chemin', flat=True)
+        equipements = []
+        for chemin in chemins:
+            equipements.extend(
+                Equipement.objects.filter(Categorie.filtre_descendants(chemin, 'categorie__chemin'), actif=True)
+                .order_by('pk').values(*cls.CHAMPS)
+            )
+        return equipements
+
+    @staticmethod
+    def _identites(equipements):
+        return {
+            'id': np.array([e['id'] for e in equipements], dtype=np.int64),
+            'nom': [e['nom'] for e in equipements],
+        }
+
+    def taille(self):
+        return {famille: len(getattr(self, attribut)['id']) for famille, attribut in (
+            ('panneau', 'panneaux'), ('batterie', 'batteries'), ('onduleur', 'onduleurs'), ('regulateur', 'regulateurs'),
+        )}
+
+
+_verrou = threading.Lock()
+_catalogue = None
+
+
+def catalogue_dimensionnement():
+    """Tableaux du catalogue, rechargés si les marqueurs du catalogue en base ont changé."""
+    global _catalogue
+    version = version_marqueurs()
+    catalogue = _catalogue
+    if catalogue is not None and catalogue.version == version:
+        return catalogue
+    with _verrou:
+        if _catalogue is None or _catalogue.version != version:
+            _catalogue = CatalogueDimensionnement(version)
+        return _catalogue
+
+
+def _regulateurs(cat, nb_panneaux):
+    """
+    Contrôleur le moins cher pour chaque (panneau, onduleur) : indice (-1 : aucun,
+    onduleur hybride), nombre d'unités et coût ; coût infini si aucun ne convient.
+    Le choix ne dépend de l'onduleur que par sa tension de parc : il est fait une
+    fois par tension distincte, par blocs de panneaux de TAILLE_BLOC combinaisons.
+    """
+    n_p, n_r = len(nb_panneaux), len(cat.regulateur_courant)
+    tensions, representant, groupe = np.unique(cat.onduleur_tension, return_index=True, return_inverse=True)
+    n_v = len(tensions)
+    choix = np.full((n_p, n_v), -1)
+    nombre = np.zeros((n_p, n_v))
+    cout = np.full((n_p, n_v), np.inf)
+
+    if n_r:
+        # Une chaîne d'au moins un panneau doit rester sous la tension PV maximale du contrôleur
+        voc_ok = ~(cat.panneau_voc[:, None] * MARGE_VOC > cat.regulateur_tension_pv[None, :])
+        tension_ok = cat.regulateur_tension_ok[:, representant].T
+        crete = nb_panneaux * cat.panneau_puissance
+        pas = max(1, TAILLE_BLOC // max(1, n_v * n_r))
+        for debut in range(0, n_p, pas):
+            tranche = slice(debut, debut + pas)
+            # Courant de charge : puissance crête du champ ramenée à la tension du parc
+            courant = crete[tranche, None] / tensions[None, :]
+            unites = np.ceil(courant[:, :, None] / cat.regulateur_courant[None, None, :])
+            compatible = voc_ok[tranche, None, :] & tension_ok[None, :, :] & (unites >= 1)
+            couts = np.where(compatible, unites * cat.regulateur_cout[None, None, :], np.inf)
+            retenu = couts.argmin(axis=2)[:, :, None]
+            choix[tranche] = retenu[:, :, 0]
+            cout[tranche] = np.take_along_axis(couts, retenu, axis=2)[:, :, 0]
+            nombre[tranche] = np.take_along_axis(unites, retenu, axis=2)[:, :, 0]
+
+    hybride = cat.onduleur_hybride[None, :]
+    return (
+        np.where(hybride, -1, choix[:, groupe]),
+        np.where(hybride, 0, nombre[:, groupe]),
+        np.where(hybride, 0.0, cout[:, groupe]),
+    )
+
+
+def dimensionner(
+    consommation_kwh_jour,
+    budget=None,
+    surface_m2=None,
+    autonomie_jours=AUTONOMIE_JOURS,
+    puissance_pointe_W=None,
+    k=5,
+    tri='cout',
+    catalogue=None,
+):
+    """
+    Les `k` meilleures configurations réalisables, triées par coût croissant,
+    autonomie décroissante ou surface croissante (`tri`), à coût égal ensuite.
+    """
+    cat = catalogue or catalogue_dimensionnement()
+    energie = float(consommation_kwh_jour) * 1000
+    pointe = float(puissance_pointe_W) if puissance_pointe_W else energie / HEURES_POINTE
+    k = max(1, min(int(k), K_MAX))
+
+    # Panneaux : nombre pour couvrir la consommation du jour
+    crete_requise = energie / (HEURES_SOLEIL_PLEIN * RATIO_PERFORMANCE)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nb_panneaux = np.ceil(crete_requise / cat.panneau_puissance)
+        surface = nb_panneaux * cat.panneau_surface
+        panneau_ok = np.isfinite(nb_panneaux) & (nb_panneaux >= 1)
+        if surface_m2 is not None:
+            panneau_ok &= surface <= float(surface_m2)
+
+        # Onduleurs : puissance de pointe
+        onduleur_ok = cat.onduleur_puissance >= pointe
+
+        # Batteries × onduleurs : montage en série à la tension d'entrée DC, branches en parallèle
+        en_serie = np.rint(cat.onduleur_tension[None, :] / cat.batterie_tension[:, None])
+        ecart = np.abs(en_serie * cat.batterie_tension[:, None] - cat.onduleur_tension[None, :])
+        tension_ok = (en_serie >= 1) & (ecart <= TOLERANCE_TENSION * cat.onduleur_tension[None, :])
+        stockage = energie * float(autonomie_jours) / (
+            cat.batterie_dod[:, None] * cat.onduleur_rendement[None, :]
+        )
+        en_parallele = np.maximum(np.ceil(stockage / (en_serie * cat.batterie_energie[:, None])), 1)
+        nb_batteries = en_serie * en_parallele
+        autonomie = (
+            nb_batteries * cat.batterie_energie[:, None] * cat.batterie_dod[:, None]
+            * cat.onduleur_rendement[None, :] / energie
+        )
+        batterie_ok = tension_ok & np.isfinite(nb_batteries) & onduleur_ok[None, :]
+        cout_batteries = nb_batteries * cat.batterie_cout[:, None] + cat.onduleur_cout[None, :]
+
+    choix_regulateur, nb_regulateurs, cout_regulateurs = _regulateurs(cat, nb_panneaux)
+    cout_panneaux = nb_panneaux * cat.panneau_cout
+
+    n_p, (n_b, n_o) = len(nb_panneaux), nb_batteries.shape
+    meilleurs = []  # (clé de tri, coût, p, b, o) retenus bloc par bloc
+    pas = max(1, TAILLE_BLOC // max(1, n_b * n_o))
+    for debut in range(0, n_p, pas):
+        tranche = slice(debut, debut + pas)
+        # Axes : panneau, batterie, onduleur
+        cout = (
+            cout_panneaux[tranche, None, None]
+            + cout_batteries[None, :, :]
+            + cout_regulateurs[tranche, None, :]
+        )
+        realisable = panneau_ok[tranche, None, None] & batterie_ok[None, :, :] & np.isfinite(cout)
+        if budget is not None:
+            realisable &= cout <= float(budget)
+
+        if tri == 'autonomie':
+            cle = np.broadcast_to(-autonomie[None, :, :], cout.shape)
+        elif tri == 'surface':
+            cle = np.broadcast_to(surface[tranche, None, None], cout.shape)
+        else:
+            cle = cout
+        cle = np.where(realisable, cle, np.inf).ravel()
+        cout = cout.ravel()
+
+        nombre = min(k, int(np.count_nonzero(np.isfinite(cle))))
+        if not nombre:
+            continue
+        retenus = np.argpartition(cle, nombre - 1)[:nombre] if nombre < cle.size else np.arange(cle.size)
+        retenus = retenus[np.isfinite(cle[retenus])]
+        p, b, o = np.unravel_index(retenus, (min(pas, n_p - debut), n_b, n_o))
+        meilleurs.extend(zip(cle[retenus], cout[retenus], p + debut, b, o))
+
+    meilleurs.sort(key=lambda m: (m[0], m[1]))
+    configurations = []
+    for _, cout, p, b, o in meilleurs[:k]:
+        r = int(choix_regulateur[p, o])
+        configurations.append({
+            'panneau': _ligne(cat.panneaux, p, nb_panneaux[p]),
+            'batterie': _ligne(cat.batteries, b, nb_batteries[b, o]),
+            'onduleur': _ligne(cat.onduleurs, o, 1),
+            'regulateur': _ligne(cat.regulateurs, r, nb_regulateurs[p, o]) if r >= 0 else None,
+            'tension_systeme_V': float(cat.onduleur_tension[o]),
+            'puissance_crete_W': float(nb_panneaux[p] * cat.panneau_puissance[p]),
+            'capacite_stockage_Wh': float(nb_batteries[b, o] * cat.batterie_energie[b]),
+            'autonomie_jours': round(float(autonomie[b, o]), 2),
+            'surface_m2': None if math.isnan(surface[p]) else round(float(surface[p]), 2),
+            'cout_estime': round(float(cout), 2),
+        })
+    return {
+        'hypotheses': {
+            'consommation_Wh_jour': energie,
+            'puissance_pointe_W': pointe,
+            'autonomie_jours': float(autonomie_jours),
+            'heures_soleil_plein': HEURES_SOLEIL_PLEIN,
+            'ratio_performance': RATIO_PERFORMANCE,
+            'budget': None if budget is None else float(budget),
+            'surface_disponible_m2': None if surface_m2 is None else float(surface_m2),
+        },
+        'combinaisons': n_p * n_b * n_o,
+        'configurations': configurations,
+    }
+
+
+def _ligne(identites, i, quantite):
+    return {'id': int(identites['id'][i]), 'nom': identites['nom'][i], 'quantite': int(quantite)}
+
+
+def dimensionner_installation(installation, **options):
+    """Dimensionnement à partir des besoins saisis sur l'installation (surchargés par `options`)."""
+    besoins = {
+        'consommation_kwh_jour': installation.consommation_energetique,
+        'budget': installation.budget_client,
+        'surface_m2': installation.surface_disponible_m2,
+    }
+    besoins.update({cle: valeur for cle, valeur in options.items() if valeur is not None})
+    return dimensionner(**besoins)
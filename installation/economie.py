@@ -0,0 +1,213 @@
+"""
+Comparaison économique d'un devis avec l'électricité du réseau.
+
+Pour chaque devis : coût annuel du réseau pour la consommation de
+l'installation (tarif de sa province, sinon tarif national), économies de
+chaque année sur la durée de vie du système (coût évité, indexé sur la hausse
+des tarifs, moins la maintenance), retour sur investissement, valeur actuelle
+nette et taux de rentabilité interne.
+
+Le calcul est vectorisé : les devis sont chargés en tableaux (un par
+grandeur) et les flux forment une matrice devis × années. Le TRI est obtenu
+par dichotomie menée sur tous les devis à la fois. Le recalcul en masse
+avance par lots d'ids et réécrit les comparaisons par bulk_update ; la
+comparaison à la volée d'une installation passe par le même calcul.
+
+Hypothèse, comme pour le dimensionnement : `consommation_energetique` est une
+consommation journalière en kWh.
+"""
+import math
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ComparaisonEconomique, Devis, TarifElectricite
+
+JOURS_PAR_AN = 365
+
+# Hypothèses par défaut, réglables par `ECONOMIE_HYPOTHESES`
+HYPOTHESES = {
+    'duree_vie_ans': 20,
+    'taux_actualisation': 0.08,
+    'hausse_tarif_an': 0.03,
+}
+
+# Bornes de la dichotomie du TRI (taux annuels)
+TRI_MIN = -0.99
+TRI_MAX = 10.0
+TRI_ITERATIONS = 60
+
+CENTIME = Decimal('0.01')
+CHAMPS_COMPARAISON = [
+    'cout_electricite_traditionnelle_estime_an', 'economies_potentielles_annuelles',
+    'duree_retour_investissement_annees', 'valeur_actuelle_nette', 'taux_rentabilite_interne_pourcent',
+]
+
+
+def hypotheses(**surcharges):
+    valeurs = {**HYPOTHESES, **getattr(settings, 'ECONOMIE_HYPOTHESES', {})}
+    valeurs.update({cle: v for cle, v in surcharges.items() if v is not None})
+    return valeurs
+
+
+def tarifs_en_vigueur(date=None):
+    """{province: (prix_kwh, redevance_an)} à `date` ; '' pour le tarif national."""
+    date = date or timezone.localdate()
+    tarifs = {}
+    lignes = (
+        TarifElectricite.objects.filter(date_effet__lte=date)
+        .order_by('province', 'date_effet').values_list('province', 'prix_kwh', 'redevance_an')
+    )
+    for province, prix_kwh, redevance_an in lignes:
+        tarifs[province] = (float(prix_kwh), float(redevance_an))
+    return tarifs
+
+
+def tarif_province(tarifs, province):
+    return tarifs.get(province) or tarifs.get('')
+
+
+def _van(flux, taux, annees):
+    """Valeur actuelle des flux (n, années) à un taux par ligne (n,)."""
+    return (flux * (1 + taux[:, None]) ** -annees).sum(axis=1)
+
+
+def _tri(flux, investissement, annees):
+    """
+    Taux annulant la VAN, par dichotomie sur toutes les lignes à la fois ; NaN si
+    la VAN ne change pas de signe entre TRI_MIN et TRI_MAX.
+    """
+    bas = np.full(len(investissement), TRI_MIN)
+    haut = np.full(len(investissement), TRI_MAX)
+    with np.errstate(over='ignore', invalid='ignore'):
+        encadre = (_van(flux, bas, annees) > investissement) & (_van(flux, haut, annees) < investissement)
+        for _ in range(TRI_ITERATIONS):
+            milieu = (bas + haut) / 2
+            au_dessus = _van(flux, milieu, annees) > investissement
+            bas = np.where(au_dessus, milieu, bas)
+            haut = np.where(au_dessus, haut, milieu)
+    return np.where(encadre, (bas + haut) / 2, np.nan)
+
+
+def evaluer(investissement, consommation_kwh_jour, prix_kwh, redevance_an, maintenance_an, **options):
+    """
+    Indicateurs de n devis, à partir de tableaux (n,). Retourne un dict de
+    tableaux : cout_reseau_an, economies_an (première année), flux (n, années),
+    retour_annees (NaN si non remboursé), van, tri (fraction, NaN si indéfini).
+    """
+    h = hypotheses(**options)
+    investissement = np.asarray(investissement, dtype=float)
+    cout_reseau_an = np.asarray(consommation_kwh_jour, dtype=float) * JOURS_PAR_AN * np.asarray(prix_kwh, dtype=float)
+    cout_reseau_an = cout_reseau_an + np.asarray(redevance_an, dtype=float)
+    maintenance_an = np.asarray(maintenance_an, dtype=float)
+
+    annees = np.arange(1, int(h['duree_vie_ans']) + 1, dtype=float)
+    indexation = (1 + h['hausse_tarif_an']) ** (annees - 1)
+    flux = cout_reseau_an[:, None] * indexation - maintenance_an[:, None]
+
+    rembourse = np.cumsum(flux, axis=1) >= investissement[:, None]
+    retour = np.where(rembourse.any(axis=1), rembourse.argmax(axis=1) + 1, np.nan)
+    van = _van(flux, np.full(len(investissement), float(h['taux_actualisation'])), annees) - investissement
+
+    return {
+        'cout_reseau_an': cout_reseau_an,
+        'economies_an': flux[:, 0],
+        'flux': flux,
+        'retour_annees': retour,
+        'van': van,
+        'tri': _tri(flux, investissement, annees),
+    }
+
+
+def _decimal(valeur):
+    return None if math.isnan(valeur) else Decimal(repr(float(valeur))).quantize(CENTIME)
+
+
+def _valeurs_comparaison(resultats, i):
+    """Champs de ComparaisonEconomique pour la ligne i des résultats de `evaluer`."""
+    retour = resultats['retour_annees'][i]
+    return {
+        'cout_electricite_traditionnelle_estime_an': _decimal(resultats['cout_reseau_an'][i]),
+        'economies_potentielles_annuelles': _decimal(resultats['economies_an'][i]),
+        'duree_retour_investissement_annees': None if math.isnan(retour) else int(retour),
+        'valeur_actuelle_nette': _decimal(resultats['van'][i]),
+        'taux_rentabilite_interne_pourcent': _decimal(resultats['tri'][i] * 100),
+    }
+
+
+def recalculer_comparaisons(date=None, taille_lot=1000, devis=None, **options):
+    """
+    Recalcule la comparaison économique de chaque devis (ou de `devis`, un
+    queryset) avec les tarifs en vigueur à `date`, par lots : les comparaisons
+    existantes sont réécrites par bulk_update, les manquantes créées par
+    bulk_create. Les devis d'une province sans tarif (ni tarif national) sont
+    comptés dans 'sans_tarif'.
+    Retourne {'devis', 'modifiees', 'creees', 'sans_tarif'}.
+    """
+    tarifs = tarifs_en_vigueur(date)
+    if devis is None:
+        devis = Devis.objects.all()
+    devis = devis.order_by('pk')
+
+    compteurs = {'devis': 0, 'modifiees': 0, 'creees': 0, 'sans_tarif': 0}
+    dernier = 0
+    while True:
+        lot = list(
+            devis.filter(pk__gt=dernier).values_list(
+                'pk', 'montant_total', 'cout_maintenance_estime_an',
+                'installation__consommation_energetique', 'installation__province',
+            )[:taille_lot]
+        )
+        if not lot:
+            break
+        dernier = lot[-1][0]
+        compteurs['devis'] += len(lot)
+
+        avec_tarif = [(ligne, tarif_province(tarifs, ligne[4])) for ligne in lot]
+        avec_tarif = [(ligne, tarif) for ligne, tarif in avec_tarif if tarif is not None]
+        compteurs['sans_tarif'] += len(lot) - len(avec_tarif)
+        if not avec_tarif:
+            continue
+
+        resultats = evaluer(
+            investissement=[float(ligne[1]) for ligne, _ in avec_tarif],
+            consommation_kwh_jour=[float(ligne[3]) for ligne, _ in avec_tarif],
+            prix_kwh=[tarif[0] for _, tarif in avec_tarif],
+            redevance_an=[tarif[1] for _, tarif in avec_tarif],
+            maintenance_an=[float(ligne[2]) for ligne, _ in avec_tarif],
+            **options,
+        )
+        valeurs = {ligne[0]: _valeurs_comparaison(resultats, i) for i, (ligne, _) in enumerate(avec_tarif)}
+
+        existantes = list(ComparaisonEconomique.objects.filter(devis_id__in=valeurs).only('id', 'devis_id'))
+        for comparaison in existantes:
+            for champ, valeur in valeurs.pop(comparaison.devis_id).items():
+                setattr(comparaison, champ, valeur)
+        ComparaisonEconomique.objects.bulk_update(existantes, CHAMPS_COMPARAISON)
+        ComparaisonEconomique.objects.bulk_create(
+            ComparaisonEconomique(devis_id=devis_id, **champs) for devis_id, champs in valeurs.items()
+        )
+        compteurs['modifiees'] += len(existantes)
+        compteurs['creees'] += len(valeurs)
+    return compteurs
+
+
+def comparer(devis, installation, tarif, **options):
+    """
+    Comparaison à la volée d'un devis (enregistré ou non) de l'installation, au
+    tarif (prix_kwh, redevance_an) donné : la comparaison, non enregistrée, les
+    économies de chaque année et les hypothèses retenues.
+    """
+    resultats = evaluer(
+        investissement=[float(devis.montant_total)],
+        consommation_kwh_jour=[float(installation.consommation_energetique)],
+        prix_kwh=[tarif[0]],
+        redevance_an=[tarif[1]],
+        maintenance_an=[float(devis.cout_maintenance_estime_an)],
+        **options,
+    )
+    comparaison = ComparaisonEconomique(devis=devis, **_valeurs_comparaison(resultats, 0))
+    flux = [round(float(v), 2) for v in resultats['flux'][0]]
+    return comparaison, flux, {**hypotheses(**options), 'prix_kwh': tarif[0], 'redevance_an': tarif[1]}
@@ -0,0 +1,55 @@
+"""
+Écriture des lignes d'une installation (InstallationEquipement) par différence.
+
+Les lignes reçues sont comparées aux lignes existantes par équipement : les
+nouvelles sont insérées par bulk_create, les quantités modifiées réécrites par
+bulk_update et les lignes retirées supprimées en une requête, le tout dans une
+transaction. Une ligne inchangée n'est pas touchée et garde son id.
+"""
+from django.db import transaction
+
+from .models import InstallationEquipement
+
+
+def quantites_par_equipement(lignes):
+    """{equipement_id: quantité} ; un équipement répété voit ses quantités additionnées."""
+    quantites = {}
+    for ligne in lignes:
+        pk = ligne['equipement'].pk
+        quantites[pk] = quantites.get(pk, 0) + ligne.get('quantite', 1)
+    return quantites
+
+
+def ecrire_lignes(installation, lignes):
+    """
+    Aligne les lignes de `installation` sur `lignes` ([{'equipement', 'quantite'}]).
+    Retourne {'creees', 'modifiees', 'supprimees'}.
+    """
+    voulues = quantites_par_equipement(lignes)
+    with transaction.atomic():
+        existantes = {
+            ligne.equipement_id: ligne
+            for ligne in InstallationEquipement.objects.select_for_update()
+            .filter(installation=installation).only('id', 'equipement_id', 'quantite')
+        }
+
+        a_creer = [
+            InstallationEquipement(installation=installation, equipement_id=pk, quantite=quantite)
+            for pk, quantite in voulues.items() if pk not in existantes
+        ]
+        a_modifier = []
+        for pk, quantite in voulues.items():
+            ligne = existantes.get(pk)
+            if ligne is not None and ligne.quantite != quantite:
+                ligne.quantite = quantite
+                a_modifier.append(ligne)
+        a_supprimer = [ligne.pk for pk, ligne in existantes.items() if pk not in voulues]
+
+        if a_supprimer:
+            InstallationEquipement.objects.filter(pk__in=a_supprimer).delete()
+        if a_modifier:
+            InstallationEquipement.objects.bulk_update(a_modifier, ['quantite'])
+        if a_creer:
+            InstallationEquipement.objects.bulk_create(a_creer)
+
+    return {'creees': len(a_creer), 'modifiees': len(a_modifier), 'supprimees': len(a_supprimer)}
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from installation.meteo import DOSSIER, PROVINCES, generer_profils
+
+
+class Command(BaseCommand):
+    help = "Régénère les profils météo d'année type synthétiques livrés avec l'application"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dossier', default=str(DOSSIER),
+            help="Dossier où écrire les fichiers .npy (défaut: installation/profils_meteo)",
+        )
+
+    def handle(self, *args, **options):
+        dossier = generer_profils(options['dossier'])
+        self.stdout.write(self.style.SUCCESS(f"Profils de {len(PROVINCES)} provinces écrits dans {dossier}."))
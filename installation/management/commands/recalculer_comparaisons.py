@@ -0,0 +1,47 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from installation.economie import recalculer_comparaisons
+from installation.models import Devis
+
+
+class Command(BaseCommand):
+    help = "Recalcule les comparaisons économiques des devis avec les tarifs d'électricité en vigueur"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Date des tarifs appliqués, AAAA-MM-JJ (défaut: aujourd'hui)",
+        )
+        parser.add_argument(
+            '--province',
+            help="Ne recalcule que les devis des installations de cette province",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Nombre de devis calculés par lot (défaut: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        date = None
+        if options['date']:
+            try:
+                date = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Date invalide : '{options['date']}' (attendu AAAA-MM-JJ)")
+        devis = Devis.objects.all()
+        if options['province']:
+            devis = devis.filter(installation__province=options['province'])
+
+        debut = time.perf_counter()
+        compteurs = recalculer_comparaisons(date, taille_lot=options['batch_size'], devis=devis)
+        self.stdout.write(self.style.SUCCESS(
+            f"Comparaisons recalculées: {compteurs['devis']} devis, {compteurs['modifiees']} mises à jour, "
+            f"{compteurs['creees']} créées en {time.perf_counter() - debut:.2f} s."
+        ))
+        if compteurs['sans_tarif']:
+            self.stdout.write(self.style.WARNING(
+                f"{compteurs['sans_tarif']} devis ignorés : aucun tarif pour leur province ni tarif national."
+            ))
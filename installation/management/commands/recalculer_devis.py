@@ -0,0 +1,39 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from installation.devis import STATUTS_OUVERTS, recalculer_devis
+
+
+class Command(BaseCommand):
+    help = "Réapplique la grille de prix aux devis des installations ouvertes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Date des prix appliqués, AAAA-MM-JJ (défaut: aujourd'hui)",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Nombre de devis recalculés par lot (défaut: 500)",
+        )
+
+    def handle(self, *args, **options):
+        date = None
+        if options['date']:
+            try:
+                date = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Date invalide : '{options['date']}' (attendu AAAA-MM-JJ)")
+
+        debut = time.perf_counter()
+        compteurs = recalculer_devis(date, taille_lot=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Devis recalculés ({', '.join(STATUTS_OUVERTS)}): {compteurs['devis']} lus, "
+            f"{compteurs['modifies']} modifiés en {time.perf_counter() - debut:.2f} s."
+        ))
+        if compteurs['incomplets']:
+            self.stdout.write(self.style.WARNING(
+                f"{compteurs['incomplets']} devis laissés inchangés : équipements sans prix en vigueur."
+            ))
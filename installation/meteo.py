@@ -0,0 +1,238 @@
+"""
+Profils météo d'année type par province : irradiance globale horizontale (W/m²)
+et température de l'air (°C), heure par heure (8760 valeurs).
+
+Les profils sont livrés avec l'application (installation/profils_meteo/) sous
+forme de tableaux .npy (une ligne par province, dans l'ordre de PROVINCES),
+ouverts en mémoire projetée : seule la ligne de la province simulée est lue
+sur le disque, et aucun accès réseau n'est nécessaire. `PROFILS_METEO_DOSSIER`
+permet de les remplacer par des années types mesurées de même format.
+
+Les fichiers livrés sont synthétiques, produits par `generer_profils` (commande
+generer_profils_meteo) : géométrie solaire de chaque chef-lieu, ciel clair de
+Haurwitz ramené aux moyennes mensuelles d'ensoleillement et de température de
+la zone climatique (interpolées selon la latitude), variabilité journalière
+tirée d'une graine fixe.
+"""
+import os
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+HEURES = 8760
+JOURS_MOIS = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+DOSSIER = Path(__file__).resolve().parent / 'profils_meteo'
+FICHIER_IRRADIANCE = 'irradiance_Wm2.npy'
+FICHIER_TEMPERATURE = 'temperature_C.npy'
+# Province retenue quand celle de l'installation n'est pas reconnue
+PROVINCE_PAR_DEFAUT = 'Kadiogo'
+
+# (province, chef-lieu, latitude, longitude) ; l'ordre est celui des lignes des fichiers
+PROVINCES = [
+    ('Balé', 'Boromo', 11.75, -2.93),
+    ('Bam', 'Kongoussi', 13.33, -1.53),
+    ('Banwa', 'Solenzo', 12.18, -4.08),
+    ('Bazèga', 'Kombissiri', 12.07, -1.33),
+    ('Bougouriba', 'Diébougou', 10.97, -3.25),
+    ('Boulgou', 'Tenkodogo', 11.78, -0.37),
+    ('Boulkiemdé', 'Koudougou', 12.25, -2.37),
+    ('Comoé', 'Banfora', 10.63, -4.76),
+    ('Ganzourgou', 'Zorgho', 12.25, -0.62),
+    ('Gnagna', 'Bogandé', 12.98, -0.14),
+    ('Gourma', "Fada N'gourma", 12.06, 0.35),
+    ('Houet', 'Bobo-Dioulasso', 11.18, -4.30),
+    ('Ioba', 'Dano', 11.15, -3.06),
+    ('Kadiogo', 'Ouagadougou', 12.37, -1.52),
+    ('Kénédougou', 'Orodara', 10.98, -4.91),
+    ('Komondjari', 'Gayéri', 12.65, 0.48),
+    ('Kompienga', 'Pama', 11.25, 0.70),
+    ('Kossi', 'Nouna', 12.73, -3.86),
+    ('Koulpélogo', 'Ouargaye', 11.50, 0.05),
+    ('Kouritenga', 'Koupéla', 12.18, -0.35),
+    ('Kourwéogo', 'Boussé', 12.66, -1.89),
+    ('Léraba', 'Sindou', 10.67, -5.17),
+    ('Loroum', 'Titao', 13.77, -2.07),
+    ('Mouhoun', 'Dédougou', 12.46, -3.46),
+    ('Nahouri', 'Pô', 11.17, -1.15),
+    ('Namentenga', 'Boulsa', 12.65, -0.57),
+    ('Nayala', 'Toma', 12.76, -2.89),
+    ('Noumbiel', 'Batié', 9.88, -2.92),
+    ('Oubritenga', 'Ziniaré', 12.58, -1.30),
+    ('Oudalan', 'Gorom-Gorom', 14.44, -0.23),
+    ('Passoré', 'Yako', 12.96, -2.26),
+    ('Poni', 'Gaoua', 10.33, -3.18),
+    ('Sanguié', 'Réo', 12.32, -2.47),
+    ('Sanmatenga', 'Kaya', 13.09, -1.08),
+    ('Séno', 'Dori', 14.03, -0.03),
+    ('Sissili', 'Léo', 11.10, -2.10),
+    ('Soum', 'Djibo', 14.10, -1.63),
+    ('Sourou', 'Tougan', 13.07, -3.07),
+    ('Tapoa', 'Diapaga', 12.07, 1.79),
+    ('Tuy', 'Houndé', 11.50, -3.52),
+    ('Yagha', 'Sebba', 13.43, 0.53),
+    ('Yatenga', 'Ouahigouya', 13.58, -2.42),
+    ('Ziro', 'Sapouy', 11.55, -1.77),
+    ('Zondoma', 'Gourcy', 13.21, -2.36),
+    ('Zoundwéogo', 'Manga', 11.66, -1.07),
+]
+
+# Moyennes mensuelles par zone climatique, de janvier à décembre : irradiation
+# globale horizontale (kWh/m²/jour), température moyenne et amplitude diurne (°C)
+CLIMATS = [
+    {
+        'zone': 'soudanienne', 'latitude': 10.5,
+        'irradiation': [5.4, 5.9, 6.1, 6.0, 5.8, 5.3, 4.8, 4.6, 5.0, 5.5, 5.6, 5.3],
+        'temperature': [26.0, 28.5, 30.5, 30.5, 29.0, 27.0, 25.5, 25.0, 25.5, 26.5, 26.5, 25.5],
+        'amplitude': [14.0, 14.0, 12.0, 10.0, 9.0, 8.0, 6.5, 6.0, 7.0, 9.0, 12.0, 14.0],
+    },
+    {
+        'zone': 'soudano-sahélienne', 'latitude': 12.4,
+        'irradiation': [5.3, 6.0, 6.3, 6.4, 6.3, 5.9, 5.4, 5.0, 5.5, 5.8, 5.6, 5.1],
+        'temperature': [25.0, 28.0, 31.5, 33.0, 32.0, 29.0, 27.0, 26.0, 27.0, 28.5, 27.5, 25.5],
+        'amplitude': [14.0, 14.0, 13.0, 12.0, 11.0, 9.0, 7.0, 6.5, 7.5, 10.0, 13.0, 14.0],
+    },
+    {
+        'zone': 'sahélienne', 'latitude': 14.0,
+        'irradiation': [5.4, 6.1, 6.5, 6.7, 6.7, 6.4, 6.0, 5.6, 5.9, 6.0, 5.7, 5.2],
+        'temperature': [23.5, 26.5, 30.5, 33.5, 34.0, 32.0, 29.0, 27.5, 29.0, 30.0, 27.0, 24.0],
+        'amplitude': [15.0, 15.0, 14.0, 13.0, 12.0, 10.0, 8.0, 7.0, 8.0, 11.0, 14.0, 15.0],
+    },
+]
+# Écart-type relatif de l'irradiation journalière : faible en saison sèche, fort en hivernage
+VARIABILITE = [0.06, 0.06, 0.08, 0.10, 0.14, 0.20, 0.24, 0.24, 0.20, 0.12, 0.07, 0.06]
+GRAINE = 2024
+
+
+def cle_province(nom):
+    """'Kénédougou' -> 'kenedougou' : sans accents, casse ni séparateurs."""
+    decompose = unicodedata.normalize('NFKD', nom or '')
+    return ''.join(c for c in decompose if c.isalnum() and not unicodedata.combining(c)).lower()
+
+
+# Province ou chef-lieu -> ligne des fichiers
+INDEX_PROVINCES = {}
+for _i, (_province, _chef_lieu, _, _) in enumerate(PROVINCES):
+    INDEX_PROVINCES[cle_province(_chef_lieu)] = _i
+    INDEX_PROVINCES[cle_province(_province)] = _i
+
+
+def _jours():
+    """Jour de l'année (1 à 365) et heure du milieu de chaque heure, en heure légale (UTC)."""
+    heures = np.arange(HEURES) + 0.5
+    return heures // 24 + 1, heures % 24
+
+
+def _par_jour(mensuel):
+    """Valeurs mensuelles -> 365 valeurs journalières, interpolées entre les milieux de mois."""
+    milieux = np.cumsum(JOURS_MOIS) - np.array(JOURS_MOIS) / 2
+    jours = np.arange(365) + 0.5
+    return np.interp(jours, milieux, mensuel, period=365)
+
+
+def _cos_zenith(latitude, longitude):
+    jour, heure = _jours()
+    b = 2 * np.pi * (jour - 81) / 364
+    equation_temps = 9.87 * np.sin(2 * b) - 7.53 * np.cos(b) - 1.5 * np.sin(b)  # minutes
+    heure_solaire = heure + longitude / 15 + equation_temps / 60
+    declinaison = np.radians(23.45) * np.sin(2 * np.pi * (284 + jour) / 365)
+    phi = np.radians(latitude)
+    cos_z = np.sin(phi) * np.sin(declinaison) + np.cos(phi) * np.cos(declinaison) * np.cos(
+        np.radians(15 * (heure_solaire - 12))
+    )
+    return np.clip(cos_z, 0, None), heure_solaire
+
+
+def _ar1(generateur, ecarts, correlation):
+    """Bruit journalier autocorrélé, d'écart-type `ecarts` (365,)."""
+    bruit = generateur.standard_normal(365)
+    serie = np.empty(365)
+    serie[0] = bruit[0]
+    for jour in range(1, 365):
+        serie[jour] = correlation * serie[jour - 1] + np.sqrt(1 - correlation ** 2) * bruit[jour]
+    return serie * ecarts
+
+
+def climat(latitude):
+    """Moyennes mensuelles interpolées selon la latitude entre les zones de CLIMATS."""
+    latitudes = [zone['latitude'] for zone in CLIMATS]
+    return {
+        grandeur: np.array([
+            np.interp(latitude, latitudes, [zone[grandeur][mois] for zone in CLIMATS]) for mois in range(12)
+        ])
+        for grandeur in ('irradiation', 'temperature', 'amplitude')
+    }
+
+
+def profil_synthetique(indice):
+    """(irradiance, température) horaires d'année type de la province PROVINCES[indice]."""
+    _, _, latitude, longitude = PROVINCES[indice]
+    generateur = np.random.default_rng(GRAINE + indice)
+    moyennes = climat(latitude)
+
+    cos_z, heure_solaire = _cos_zenith(latitude, longitude)
+    ciel_clair = np.where(cos_z > 0, 1098 * cos_z * np.exp(-0.057 / np.where(cos_z > 0, cos_z, 1)), 0.0)
+    ciel_clair_jour = ciel_clair.reshape(365, 24).sum(axis=1)  # Wh/m²
+
+    # Irradiation de chaque jour : moyenne du mois, variabilité autocorrélée, moyenne mensuelle conservée
+    facteur = np.clip(1 + _ar1(generateur, _par_jour(VARIABILITE), 0.6), 0.3, 1.3)
+    mois = np.repeat(np.arange(12), JOURS_MOIS)
+    facteur /= np.bincount(mois, facteur)[mois] / np.array(JOURS_MOIS)[mois]
+    cible = np.minimum(moyennes['irradiation'][mois] * 1000 * facteur, ciel_clair_jour)
+    irradiance = ciel_clair * np.repeat(cible / ciel_clair_jour, 24)
+
+    # Température : moyenne du jour bruitée, maximum vers 15 h solaires
+    moyenne_jour = _par_jour(moyennes['temperature']) + _ar1(generateur, np.full(365, 1.2), 0.7)
+    amplitude = np.repeat(_par_jour(moyennes['amplitude']), 24)
+    temperature = np.repeat(moyenne_jour, 24) + amplitude / 2 * np.cos(2 * np.pi * (heure_solaire - 15) / 24)
+    return irradiance, temperature
+
+
+def generer_profils(dossier=DOSSIER):
+    """Écrit les fichiers de profils synthétiques de toutes les provinces dans `dossier`."""
+    dossier = Path(dossier)
+    dossier.mkdir(parents=True, exist_ok=True)
+    profils = [profil_synthetique(i) for i in range(len(PROVINCES))]
+    # float16 : une précision (0,5 W/m², 0,03 °C) bien meilleure que celle des données
+    np.save(dossier / FICHIER_IRRADIANCE, np.array([p[0] for p in profils], dtype=np.float16))
+    np.save(dossier / FICHIER_TEMPERATURE, np.array([p[1] for p in profils], dtype=np.float16))
+    return dossier
+
+
+class ProfilsMeteo:
+    """Fichiers de profils ouverts en mémoire projetée."""
+
+    def __init__(self, dossier):
+        dossier = Path(dossier)
+        self.irradiance = np.load(dossier / FICHIER_IRRADIANCE, mmap_mode='r')
+        self.temperature = np.load(dossier / FICHIER_TEMPERATURE, mmap_mode='r')
+        if self.irradiance.shape != (len(PROVINCES), HEURES) or self.temperature.shape != self.irradiance.shape:
+            raise ValueError(f"Profils météo de {dossier} : {len(PROVINCES)} lignes de {HEURES} heures attendues.")
+        # Change quand les fichiers sont régénérés : entre dans la clé des simulations mémorisées
+        self.version = tuple(
+            (os.stat(dossier / nom).st_mtime_ns, os.stat(dossier / nom).st_size)
+            for nom in (FICHIER_IRRADIANCE, FICHIER_TEMPERATURE)
+        )
+
+    def indice(self, province):
+        """Ligne de la province (ou de son chef-lieu) ; None si inconnue."""
+        return INDEX_PROVINCES.get(cle_province(province))
+
+    def profil(self, indice):
+        """(irradiance, température) de la ligne `indice`, en float64."""
+        return self.irradiance[indice].astype(float), self.temperature[indice].astype(float)
+
+
+_verrou = threading.Lock()
+_profils = None
+
+
+def profils_meteo():
+    global _profils
+    if _profils is None:
+        with _verrou:
+            if _profils is None:
+                _profils = ProfilsMeteo(getattr(settings, 'PROFILS_METEO_DOSSIER', DOSSIER))
+    return _profils
@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def fusionner_doublons(apps, schema_editor):
+    # Avant la contrainte d'unicité : les lignes d'un même équipement sont réunies
+    # dans la plus ancienne, quantités additionnées
+    InstallationEquipement = apps.get_model('installation', 'InstallationEquipement')
+    lignes = InstallationEquipement.objects.using(schema_editor.connection.alias)
+    doublons = (
+        lignes.values('installation_id', 'equipement_id')
+        .annotate(nombre=Count('id'))
+        .filter(nombre__gt=1)
+    )
+    for doublon in doublons:
+        groupe = list(
+            lignes.filter(installation_id=doublon['installation_id'], equipement_id=doublon['equipement_id'])
+            .order_by('pk')
+        )
+        conservee = groupe[0]
+        conservee.quantite = sum(ligne.quantite for ligne in groupe)
+        conservee.save(update_fields=['quantite'])
+        lignes.filter(pk__in=[ligne.pk for ligne in groupe[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installation', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionner_doublons, migrations.RunPython.noop),
+    ]
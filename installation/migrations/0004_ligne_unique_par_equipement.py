@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installation', '0003_fusion_lignes_doublons'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='installationequipement',
+            constraint=models.UniqueConstraint(fields=('installation', 'equipement'), name='installation_equipement_unique'),
+        ),
+    ]
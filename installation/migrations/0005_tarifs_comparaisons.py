@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installation', '0004_ligne_unique_par_equipement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comparaisoneconomique',
+            name='taux_rentabilite_interne_pourcent',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True),
+        ),
+        migrations.AddField(
+            model_name='comparaisoneconomique',
+            name='valeur_actuelle_nette',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AlterField(
+            model_name='comparaisoneconomique',
+            name='duree_retour_investissement_annees',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TarifElectricite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('province', models.CharField(blank=True, max_length=100)),
+                ('prix_kwh', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('redevance_an', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('date_effet', models.DateField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('province', 'date_effet'), name='tarif_province_date_unique')],
+            },
+        ),
+    ]
@@ -32,6 +32,12 @@ class InstallationEquipement(models.Model):
     equipement = models.ForeignKey(Equipement, on_delete=models.CASCADE)
     quantite = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # Une ligne par équipement : les quantités s'additionnent (voir installation/lignes.py)
+            models.UniqueConstraint(fields=['installation', 'equipement'], name='installation_equipement_unique'),
+        ]
+
     def __str__(self):
         return f"{self.quantite} x {self.equipement.nom} (Installation {self.installation.id})"
 
@@ -60,7 +66,30 @@ class ComparaisonEconomique(models.Model):
     devis = models.OneToOneField(Devis, on_delete=models.CASCADE, related_name='comparaison')
     cout_electricite_traditionnelle_estime_an = models.DecimalField(max_digits=12, decimal_places=2)
     economies_potentielles_annuelles = models.DecimalField(max_digits=12, decimal_places=2)
-    duree_retour_investissement_annees = models.PositiveIntegerField()
+    # Vide : investissement non remboursé sur la durée de vie du système
+    duree_retour_investissement_annees = models.PositiveIntegerField(null=True, blank=True)
+    # Calculés sur la durée de vie du système (installation/economie.py)
+    valeur_actuelle_nette = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    taux_rentabilite_interne_pourcent = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
 
     def __str__(self):
         return f"Comparaison Economique Devis {self.devis.id}"
+
+class TarifElectricite(models.Model):
+    """
+    Tarif du réseau électrique à partir de `date_effet`, valable jusqu'à l'entrée
+    suivante de la même province. Province vide : tarif national, remplacé par
+    celui de la province quand elle en a un.
+    """
+    province = models.CharField(max_length=100, blank=True)
+    prix_kwh = models.DecimalField(max_digits=8, decimal_places=2)  # FCFA/kWh
+    redevance_an = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # abonnement, location du compteur
+    date_effet = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['province', 'date_effet'], name='tarif_province_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"Tarif {self.province or 'national'} : {self.prix_kwh} FCFA/kWh ({self.date_effet})"
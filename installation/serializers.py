@@ -1,5 +1,10 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import Installation, InstallationEquipement, Devis, ComparaisonEconomique, SchemaInstallation
+from .dimensionnement import AUTONOMIE_JOURS, K_MAX, TRIS
+from .lignes import ecrire_lignes
+from .models import Installation, InstallationEquipement, Devis, ComparaisonEconomique, SchemaInstallation, TarifElectricite
 from product.serializers import EquipementSerializer
 from user.serializers import ProfilClientSerializer, ProfilTechnicienSerializer
 
@@ -11,6 +16,17 @@ class InstallationEquipementSerializer(serializers.ModelSerializer):
         model = InstallationEquipement
         fields = ['id', 'equipement', 'equipement_id', 'quantite']
 
+class InstallationEquipementCompactSerializer(serializers.ModelSerializer):
+    """Ligne d'installation sans la fiche complète de l'équipement (?lignes=compact)."""
+    equipement_id = serializers.IntegerField(read_only=True)
+    nom = serializers.CharField(source='equipement.nom', read_only=True)
+    categorie = serializers.CharField(source='equipement.categorie.nom', read_only=True)
+    marque = serializers.CharField(source='equipement.marque.nom', read_only=True, default=None)
+
+    class Meta:
+        model = InstallationEquipement
+        fields = ['id', 'equipement_id', 'nom', 'categorie', 'marque', 'quantite']
+
 class InstallationSerializer(serializers.ModelSerializer):
     client = ProfilClientSerializer(read_only=True)
     technicien = ProfilTechnicienSerializer(read_only=True)
@@ -28,27 +44,31 @@ class InstallationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['date_creation', 'date_derniere_mise_a_jour', 'equipements_proposes']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.context.get('lignes_compactes'):
+            self.fields['equipements_proposes'] = InstallationEquipementCompactSerializer(
+                many=True, source='installationequipement_set', read_only=True
+            )
+
     def create(self, validated_data):
         new_equipements_data = validated_data.pop('new_equipements', [])
-        installation = Installation.objects.create(**validated_data)
-
-        for equip_data in new_equipements_data:
-            InstallationEquipement.objects.create(installation=installation, **equip_data)
-
+        with transaction.atomic():
+            installation = Installation.objects.create(**validated_data)
+            ecrire_lignes(installation, new_equipements_data)
         return installation
 
     def update(self, instance, validated_data):
         new_equipements_data = validated_data.pop('new_equipements', None)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
-        if new_equipements_data is not None:
-            # Supprimez les anciens équipements liés si besoin ou adaptez la logique
-            instance.installationequipement_set.all().delete()
-            for equip_data in new_equipements_data:
-                InstallationEquipement.objects.create(installation=instance, **equip_data)
+            if new_equipements_data is not None:
+                # Lignes alignées par différence sur celles reçues (par équipement)
+                ecrire_lignes(instance, new_equipements_data)
 
         return instance
 
@@ -66,3 +86,44 @@ class ComparaisonEconomiqueSerializer(serializers.ModelSerializer):
     class Meta:
         model = ComparaisonEconomique
         fields = '__all__'
+
+class TarifElectriciteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TarifElectricite
+        fields = ['id', 'province', 'prix_kwh', 'redevance_an', 'date_effet']
+
+class DimensionnementParametresSerializer(serializers.Serializer):
+    """Paramètres de `installations/{id}/dimensionnement/` ; les besoins saisis sur l'installation par défaut."""
+    k = serializers.IntegerField(min_value=1, max_value=K_MAX, default=5)
+    tri = serializers.ChoiceField(choices=TRIS, default='cout')
+    autonomie_jours = serializers.FloatField(min_value=0.1, max_value=10, default=AUTONOMIE_JOURS)
+    puissance_pointe_W = serializers.FloatField(min_value=1, required=False)
+    consommation_kwh_jour = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    budget = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal(0), required=False)
+    surface_m2 = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal(0), required=False)
+
+class ChiffrageParametresSerializer(serializers.Serializer):
+    """Paramètres de `installations/{id}/chiffrage/` : date des prix appliqués (aujourd'hui par défaut)."""
+    date = serializers.DateField(required=False)
+
+class EconomieParametresSerializer(serializers.Serializer):
+    """
+    Paramètres de `installations/{id}/economie/` : date du tarif appliqué, tarif
+    imposé (prix_kwh) et hypothèses ; les valeurs de ECONOMIE_HYPOTHESES par défaut.
+    """
+    date = serializers.DateField(required=False)
+    prix_kwh = serializers.FloatField(min_value=0, required=False)
+    duree_vie_ans = serializers.IntegerField(min_value=1, max_value=50, required=False)
+    taux_actualisation = serializers.FloatField(min_value=0, max_value=1, required=False)
+    hausse_tarif_an = serializers.FloatField(min_value=-0.5, max_value=1, required=False)
+
+class SimulationParametresSerializer(serializers.Serializer):
+    """
+    Paramètres de `installations/{id}/simulation/` : surcharges de la configuration
+    tirée des équipements proposés (essais « et si ») et séries horaires en option.
+    """
+    puissance_crete_W = serializers.FloatField(min_value=0, required=False)
+    energie_batterie_Wh = serializers.FloatField(min_value=0, required=False)
+    coefficient_temperature = serializers.FloatField(min_value=-1, max_value=0, required=False)
+    consommation_kwh_jour = serializers.FloatField(min_value=0, required=False)
+    horaire = serializers.BooleanField(default=False)
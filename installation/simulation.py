@@ -0,0 +1,237 @@
+"""
+Simulation horaire sur une année type du productible d'un système solaire
+autonome, avec les profils météo de la province (installation/meteo.py).
+
+Chaque heure : production des panneaux corrigée de la température des cellules
+(modèle NOCT), consommation selon un profil journalier, puis échanges avec le
+parc de batteries. Tout est vectorisé sur les 8760 heures, y compris l'état de
+charge : la transition d'une heure, s -> min(max(s + flux, 0), capacité), est
+une fonction de la forme min(max(s + a, bas), haut), famille stable par
+composition ; les compositions cumulées sont obtenues par un balayage
+parallèle en log2(8760) passes. L'année est simulée deux fois, la seconde en
+partant de l'état de charge de fin de la première (régime établi).
+
+Les résultats sont mémorisés par empreinte de la configuration : refaire une
+simulation déjà faite (mêmes panneaux, batteries, consommation, province) est
+immédiat.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from product.compatibilite import familles_de
+from .dimensionnement import IRRADIANCE_STC, PROFONDEUR_DECHARGE, RENDEMENT_ONDULEUR
+from .meteo import HEURES, JOURS_MOIS, PROVINCE_PAR_DEFAUT, PROVINCES, profils_meteo
+
+# Pertes hors température : câblage, salissure, dispersion des modules, contrôleur
+PERTES_SYSTEME = 0.86
+COEFFICIENT_TEMPERATURE = -0.40  # %/°C de la puissance crête, modules cristallins courants
+NOCT = 45.0  # °C, température nominale des cellules sous 800 W/m²
+RENDEMENT_BATTERIE = {'lithium': 0.95, 'plomb': 0.85}  # par sens, charge ou décharge
+# Répartition horaire de la consommation journalière (0 h à 23 h) : pointe du soir
+PROFIL_CHARGE = np.array([
+    2, 2, 2, 2, 2, 3, 4, 5, 4, 3, 3, 4, 5, 4, 3, 3, 4, 5, 8, 9, 9, 7, 5, 3,
+], dtype=float)
+PROFIL_CHARGE /= PROFIL_CHARGE.sum()
+
+MOIS = np.repeat(np.arange(12), np.array(JOURS_MOIS) * 24)
+MEMO_MAX = 256
+
+
+def etat_charge(flux, capacite, initial):
+    """
+    États de charge successifs s_t = min(max(s_{t-1} + flux_t, 0), capacite),
+    sans boucle sur les heures. Chaque transition est représentée par (a, bas,
+    haut) ; composer (a1, b1, h1) puis (a2, b2, h2) donne
+    (a1 + a2, clip(b1 + a2, b2, h2), clip(h1 + a2, b2, h2)).
+    """
+    a = np.array(flux, dtype=float)
+    bas = np.zeros_like(a)
+    haut = np.full_like(a, capacite)
+    pas = 1
+    while pas < len(a):
+        a2, bas2, haut2 = a[pas:], bas[pas:], haut[pas:]
+        nouveau_bas = np.clip(bas[:-pas] + a2, bas2, haut2)
+        nouveau_haut = np.clip(haut[:-pas] + a2, bas2, haut2)
+        a[pas:] = a[:-pas] + a2
+        bas[pas:], haut[pas:] = nouveau_bas, nouveau_haut
+        pas *= 2
+    return np.clip(initial + a, bas, haut)
+
+
+def empreinte(configuration):
+    texte = json.dumps(configuration, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(texte.encode()).hexdigest()
+
+
+def _simuler(configuration, irradiance, temperature):
+    c = configuration
+    temperature_cellule = temperature + (NOCT - 20) / 800 * irradiance
+    production = (
+        c['puissance_crete_W'] * irradiance / 1000
+        * (1 + c['coefficient_temperature'] / 100 * (temperature_cellule - 25)) * PERTES_SYSTEME
+    )
+    production = np.maximum(production, 0)
+    consommation = np.tile(PROFIL_CHARGE * c['consommation_kwh_jour'] * 1000, HEURES // 24)
+    besoin = consommation / c['rendement_onduleur']  # côté continu
+
+    surplus = np.maximum(production - besoin, 0)
+    deficit = np.maximum(besoin - production, 0)
+    rendement = c['rendement_batterie']
+    flux = surplus * rendement - deficit / rendement
+
+    capacite = c['energie_batterie_Wh'] * c['profondeur_decharge']
+    initial = etat_charge(flux, capacite, capacite)[-1]
+    etat = etat_charge(flux, capacite, initial)
+    variation = np.diff(etat, prepend=initial)
+
+    fourni = np.maximum(-variation, 0) * rendement
+    non_servi = (deficit - fourni) * c['rendement_onduleur']
+    perdu = surplus - np.maximum(variation, 0) / rendement
+    # Part de l'énergie nominale du parc, réserve de décharge comprise
+    reserve = c['energie_batterie_Wh'] - capacite
+    etat_relatif = (reserve + etat) / c['energie_batterie_Wh'] if c['energie_batterie_Wh'] else np.zeros(HEURES)
+
+    resultat = {
+        'production_Wh': production,
+        'consommation_Wh': consommation,
+        'non_servi_Wh': np.maximum(non_servi, 0),
+        'perdu_Wh': np.maximum(perdu, 0),
+        'etat_charge': etat_relatif,
+    }
+    for valeurs in resultat.values():
+        valeurs.flags.writeable = False
+    return resultat
+
+
+_verrou = threading.Lock()
+_memo = OrderedDict()
+
+
+def simuler(configuration):
+    """
+    Séries horaires de la configuration, mémorisées par empreinte (profils météo
+    compris). `configuration` : province (indice de PROVINCES), puissance_crete_W,
+    coefficient_temperature, energie_batterie_Wh, profondeur_decharge,
+    rendement_batterie, rendement_onduleur, consommation_kwh_jour.
+    """
+    profils = profils_meteo()
+    cle = empreinte({**configuration, 'profils': profils.version})
+    with _verrou:
+        if cle in _memo:
+            _memo.move_to_end(cle)
+            return _memo[cle]
+    resultat = _simuler(configuration, *profils.profil(configuration['province']))
+    with _verrou:
+        _memo[cle] = resultat
+        while len(_memo) > MEMO_MAX:
+            _memo.popitem(last=False)
+    return resultat
+
+
+def resumer(resultat, horaire=False):
+    """Bilan annuel et mensuel (kWh) ; les séries horaires si `horaire`."""
+    consommation = resultat['consommation_Wh'].sum()
+    non_servi = resultat['non_servi_Wh'].sum()
+    mensuel = {
+        nom: np.bincount(MOIS, resultat[cle], minlength=12) / 1000
+        for nom, cle in (('production_kWh', 'production_Wh'), ('consommation_kWh', 'consommation_Wh'),
+                         ('non_servi_kWh', 'non_servi_Wh'))
+    }
+    bilan = {
+        'production_kWh_an': round(float(resultat['production_Wh'].sum()) / 1000, 1),
+        'consommation_kWh_an': round(float(consommation) / 1000, 1),
+        'non_servi_kWh_an': round(float(non_servi) / 1000, 1),
+        'perdu_kWh_an': round(float(resultat['perdu_Wh'].sum()) / 1000, 1),
+        'taux_couverture': round(1 - float(non_servi / consommation), 4) if consommation else 1.0,
+        'heures_delestage': int(np.count_nonzero(resultat['non_servi_Wh'] > 1)),
+        'etat_charge_min': round(float(resultat['etat_charge'].min()), 3),
+        'etat_charge_moyen': round(float(resultat['etat_charge'].mean()), 3),
+        'mensuel': [
+            {'mois': mois + 1, **{nom: round(float(valeurs[mois]), 1) for nom, valeurs in mensuel.items()}}
+            for mois in range(12)
+        ],
+    }
+    if horaire:
+        bilan['horaire'] = {
+            'production_Wh': np.round(resultat['production_Wh'], 1).tolist(),
+            'non_servi_Wh': np.round(resultat['non_servi_Wh'], 1).tolist(),
+            'etat_charge': np.round(resultat['etat_charge'], 3).tolist(),
+        }
+    return bilan
+
+
+def _puissance_crete(equipement):
+    """Puissance crête d'un module ; sans elle, surface × rendement sous 1000 W/m²."""
+    if equipement.puissance_W:
+        return float(equipement.puissance_W)
+    if equipement.surface_m2 and equipement.efficacite_module_pourcent:
+        return float(equipement.surface_m2) * float(equipement.efficacite_module_pourcent) / 100 * IRRADIANCE_STC
+    return 0.0
+
+
+def _coefficient_temperature(equipement):
+    caracteristiques = equipement.caracteristiques_additionnelles
+    if isinstance(caracteristiques, dict):
+        valeur = caracteristiques.get('coefficient_temperature_pmax')
+        if isinstance(valeur, (int, float)):
+            return float(valeur)
+    return COEFFICIENT_TEMPERATURE
+
+
+def configuration_installation(installation, **options):
+    """
+    Configuration simulée à partir des équipements proposés et de la consommation
+    de l'installation, surchargée par `options` (None ignorés).
+    """
+    lignes = list(installation.installationequipement_set.select_related('equipement'))
+    familles = familles_de([ligne.equipement_id for ligne in lignes])
+
+    puissance, coefficient_pondere = 0.0, 0.0
+    energie, energie_lithium = 0.0, 0.0
+    rendements_onduleur = []
+    for ligne in lignes:
+        equipement, famille = ligne.equipement, familles.get(ligne.equipement_id)
+        if famille == 'panneau':
+            crete = _puissance_crete(equipement) * ligne.quantite
+            puissance += crete
+            coefficient_pondere += crete * _coefficient_temperature(equipement)
+        elif famille == 'batterie':
+            wh = equipement.energie_Wh or (
+                equipement.capacite_Ah * equipement.tension_V if equipement.capacite_Ah and equipement.tension_V else 0
+            )
+            energie += float(wh) * ligne.quantite
+            texte = f"{equipement.type_equipement} {equipement.nom}".lower()
+            if 'lithium' in texte or 'lifepo4' in texte:
+                energie_lithium += float(wh) * ligne.quantite
+        elif famille == 'onduleur' and equipement.rendement_pourcent:
+            rendements_onduleur.append(float(equipement.rendement_pourcent) / 100)
+
+    technologie = 'lithium' if energie and energie_lithium * 2 >= energie else 'plomb'
+    province = profils_meteo().indice(installation.province)
+    configuration = {
+        'province': province if province is not None else profils_meteo().indice(PROVINCE_PAR_DEFAUT),
+        'puissance_crete_W': puissance,
+        'coefficient_temperature': coefficient_pondere / puissance if puissance else COEFFICIENT_TEMPERATURE,
+        'energie_batterie_Wh': energie,
+        'profondeur_decharge': PROFONDEUR_DECHARGE[technologie],
+        'rendement_batterie': RENDEMENT_BATTERIE[technologie],
+        'rendement_onduleur': min(rendements_onduleur) if rendements_onduleur else RENDEMENT_ONDULEUR,
+        'consommation_kwh_jour': float(installation.consommation_energetique),
+    }
+    configuration.update({cle: float(v) for cle, v in options.items() if v is not None})
+    return configuration, province is not None
+
+
+def simuler_installation(installation, horaire=False, **options):
+    configuration, province_reconnue = configuration_installation(installation, **options)
+    bilan = resumer(simuler(configuration), horaire)
+    return {
+        'province': PROVINCES[configuration['province']][0],
+        'province_reconnue': province_reconnue,
+        'configuration': {cle: v for cle, v in configuration.items() if cle != 'province'},
+        **bilan,
+    }
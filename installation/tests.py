@@ -1,3 +1,596 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from product.cache import marquer_modification
+from product.models import Categorie, Equipement, Marque, PrixEquipement
+from user.models import ProfilClient, ProfilTechnicien, User
+from . import dimensionnement
+from .devis import chiffrer_installation, couts_equipements, recalculer_devis
+from .dimensionnement import dimensionner, dimensionner_installation
+from .economie import evaluer, recalculer_comparaisons
+from .lignes import ecrire_lignes
+from .meteo import HEURES, PROVINCES, profils_meteo
+from .simulation import etat_charge, simuler
+from .models import (
+    ComparaisonEconomique, Devis, Installation, InstallationEquipement, SchemaInstallation, TarifElectricite,
+)
+
+
+class BudgetRequetesInstallationTests(TestCase):
+    """
+    Nombre de requêtes des lectures d'installations, indépendant du nombre
+    d'installations, de lignes et de nœuds de catégories de la page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        solaire = Categorie.objects.create(nom='Solaire')
+        panneaux = Categorie.objects.create(nom='Panneau Solaire', parent=solaire)
+        batteries = Categorie.objects.create(nom='Batterie', parent=solaire)
+        marque = Marque.objects.create(nom='Victron')
+        cls.equipements = [
+            Equipement.objects.create(nom=f'Panneau {i}', categorie=panneaux, marque=marque, puissance_W=100 * i)
+            for i in range(1, 4)
+        ] + [
+            Equipement.objects.create(nom=f'Batterie {i}', categorie=batteries, tension_V=12, capacite_Ah=100 * i)
+            for i in range(1, 3)
+        ]
+
+        cls.admin = User.objects.create_user('admin@example.com', 'motdepasse', role='admin')
+        cls.client_user = User.objects.create_user('client@example.com', 'motdepasse', role='client')
+        technicien = User.objects.create_user('tech@example.com', 'motdepasse', role='technicien')
+        cls.profil_client = ProfilClient.objects.create(user=cls.client_user)
+        cls.profil_technicien = ProfilTechnicien.objects.create(user=technicien)
+
+    def creer_installations(self, nombre):
+        for _ in range(nombre):
+            installation = Installation.objects.create(
+                client=self.profil_client, technicien=self.profil_technicien,
+                consommation_energetique=5, province='Kadiogo',
+            )
+            InstallationEquipement.objects.bulk_create(
+                InstallationEquipement(installation=installation, equipement=equipement, quantite=2)
+                for equipement in self.equipements
+            )
+        return installation
+
+    def lire(self, utilisateur, url, requetes):
+        client = APIClient()
+        client.force_authenticate(utilisateur)
+        with self.assertNumQueries(requetes):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_liste_nombre_constant_de_requetes(self):
+        # Page d'installations, lignes avec équipements, arbre des catégories
+        self.creer_installations(2)
+        self.lire(self.admin, '/installation/api/installations/', 3)
+        self.creer_installations(20)
+        donnees = self.lire(self.admin, '/installation/api/installations/', 3)
+        self.assertEqual(len(donnees['results']), 22)
+        ligne = donnees['results'][0]['equipements_proposes'][0]
+        self.assertEqual(ligne['equipement']['categorie']['nom'], 'Panneau Solaire')
+
+    def test_liste_client(self):
+        self.creer_installations(10)
+        donnees = self.lire(self.client_user, '/installation/api/installations/', 3)
+        self.assertEqual(len(donnees['results']), 10)
+
+    def test_detail(self):
+        installation = self.creer_installations(3)
+        donnees = self.lire(self.admin, f'/installation/api/installations/{installation.pk}/', 3)
+        self.assertEqual(len(donnees['equipements_proposes']), len(self.equipements))
+
+    def test_lignes_compactes(self):
+        # Sans fiche complète de l'équipement, l'arbre des catégories n'est pas lu
+        self.creer_installations(15)
+        donnees = self.lire(self.admin, '/installation/api/installations/?lignes=compact', 2)
+        ligne = donnees['results'][0]['equipements_proposes'][0]
+        self.assertEqual(
+            ligne, {
+                'id': ligne['id'], 'equipement_id': self.equipements[0].pk, 'nom': 'Panneau 1',
+                'categorie': 'Panneau Solaire', 'marque': 'Victron', 'quantite': 2,
+            }
+        )
+        sans_marque = donnees['results'][0]['equipements_proposes'][-1]
+        self.assertIsNone(sans_marque['marque'])
+
+
+class EcritureLignesTests(TestCase):
+    """Écriture des lignes d'installation par différence (installation/lignes.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categorie = Categorie.objects.create(nom='Panneau Solaire')
+        cls.equipements = Equipement.objects.bulk_create(
+            Equipement(nom=f'Panneau {i}', categorie=categorie) for i in range(80)
+        )
+        utilisateur = User.objects.create_user('client@example.com', 'motdepasse', role='client')
+        cls.installation = Installation.objects.create(
+            client=ProfilClient.objects.create(user=utilisateur), consommation_energetique=5, province='Kadiogo',
+        )
+
+    def lignes(self, equipements, quantite=1):
+        return [{'equipement': equipement, 'quantite': quantite} for equipement in equipements]
+
+    def etat(self):
+        return dict(self.installation.installationequipement_set.values_list('equipement_id', 'quantite'))
+
+    def test_difference(self):
+        ecrire_lignes(self.installation, self.lignes(self.equipements[:3]))
+        conservee = self.installation.installationequipement_set.get(equipement=self.equipements[0])
+
+        compteurs = ecrire_lignes(self.installation, [
+            {'equipement': self.equipements[0], 'quantite': 1},
+            {'equipement': self.equipements[1], 'quantite': 4},
+            {'equipement': self.equipements[3], 'quantite': 2},
+        ])
+        self.assertEqual(compteurs, {'creees': 1, 'modifiees': 1, 'supprimees': 1})
+        self.assertEqual(self.etat(), {
+            self.equipements[0].pk: 1, self.equipements[1].pk: 4, self.equipements[3].pk: 2,
+        })
+        # Ligne inchangée : ni supprimée ni réinsérée
+        self.assertTrue(InstallationEquipement.objects.filter(pk=conservee.pk).exists())
+
+    def test_equipement_repete(self):
+        ecrire_lignes(self.installation, self.lignes([self.equipements[0]] * 3, quantite=2))
+        self.assertEqual(self.etat(), {self.equipements[0].pk: 6})
+
+    def test_nombre_constant_de_requetes(self):
+        ecrire_lignes(self.installation, self.lignes(self.equipements[:60]))
+        # Savepoint, lecture des lignes, suppression, mise à jour, insertion, libération
+        # 20 lignes retirées, 40 quantités modifiées, 20 lignes ajoutées
+        nouvelles = self.lignes(self.equipements[20:60], quantite=3) + self.lignes(self.equipements[60:80])
+        with self.assertNumQueries(6):
+            compteurs = ecrire_lignes(self.installation, nouvelles)
+        self.assertEqual(compteurs, {'creees': 20, 'modifiees': 40, 'supprimees': 20})
+
+
+class ChiffrageDevisTests(TestCase):
+    """Devis calculés depuis la grille de prix datée (installation/devis.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categorie = Categorie.objects.create(nom='Panneau Solaire')
+        cls.panneau, cls.batterie = Equipement.objects.bulk_create([
+            Equipement(nom='Panneau', categorie=categorie), Equipement(nom='Batterie', categorie=categorie),
+        ])
+        cls.client_user = User.objects.create_user('client@example.com', 'motdepasse', role='client')
+        cls.profil_client = ProfilClient.objects.create(user=cls.client_user)
+        PrixEquipement.objects.bulk_create([
+            PrixEquipement(equipement=cls.panneau, prix=100000, date_effet=datetime.date(2026, 1, 1)),
+            PrixEquipement(equipement=cls.panneau, prix=110000, date_effet=datetime.date(2026, 6, 1)),
+            PrixEquipement(equipement=cls.panneau, province='Houet', prix=90000, date_effet=datetime.date(2026, 1, 1)),
+            PrixEquipement(equipement=cls.batterie, prix=200000, date_effet=datetime.date(2026, 3, 1)),
+        ])
+
+    def installation(self, province='Kadiogo', status='pending'):
+        installation = Installation.objects.create(
+            client=self.profil_client, consommation_energetique=5, province=province, status=status,
+        )
+        InstallationEquipement.objects.bulk_create([
+            InstallationEquipement(installation=installation, equipement=self.panneau, quantite=4),
+            InstallationEquipement(installation=installation, equipement=self.batterie, quantite=2),
+        ])
+        return installation
+
+    def test_prix_en_vigueur(self):
+        kadiogo, houet = self.installation(), self.installation('Houet')
+        with self.assertNumQueries(1):
+            couts = couts_equipements([kadiogo.pk, houet.pk], datetime.date(2026, 7, 1))
+        self.assertEqual(couts[kadiogo.pk], {'cout': Decimal('840000.00'), 'lignes': 2, 'sans_prix': 0})
+        # Le prix de la province l'emporte sur le prix national
+        self.assertEqual(couts[houet.pk]['cout'], Decimal('760000.00'))
+        # Avant le 1er mars, la batterie n'a pas encore de prix
+        avant = couts_equipements([kadiogo.pk], datetime.date(2026, 2, 1))[kadiogo.pk]
+        self.assertEqual((avant['cout'], avant['sans_prix']), (Decimal('400000.00'), 1))
+
+    def test_nouveau_devis(self):
+        devis, sans_prix = chiffrer_installation(self.installation(), datetime.date(2026, 7, 1))
+        self.assertEqual(sans_prix, [])
+        self.assertEqual(devis.cout_achat_equipements, Decimal('840000.00'))
+        self.assertEqual(devis.cout_installation_main_oeuvre, Decimal('126000.00'))
+        self.assertEqual(devis.montant_total, Decimal('966000.00'))
+
+    def test_recalcul_par_lots(self):
+        ouvertes = [self.installation() for _ in range(5)]
+        acceptee = self.installation(status='accepted')
+        for installation in ouvertes + [acceptee]:
+            Devis.objects.create(
+                installation=installation, cout_achat_equipements=1, cout_installation_main_oeuvre=50000, montant_total=1,
+            )
+        sans_prix = ouvertes[0]
+        sans_prix.installationequipement_set.filter(equipement=self.batterie).update(quantite=1)
+        PrixEquipement.objects.filter(equipement=self.batterie).update(date_effet=datetime.date(2026, 8, 1))
+
+        compteurs = recalculer_devis(datetime.date(2026, 7, 1), taille_lot=2)
+        self.assertEqual(compteurs, {'devis': 5, 'modifies': 0, 'incomplets': 5})
+
+        compteurs = recalculer_devis(datetime.date(2026, 9, 1), taille_lot=2)
+        self.assertEqual(compteurs, {'devis': 5, 'modifies': 5, 'incomplets': 0})
+        devis = Devis.objects.get(installation=ouvertes[1])
+        self.assertEqual((devis.cout_achat_equipements, devis.montant_total), (Decimal('840000.00'), Decimal('890000.00')))
+        self.assertEqual(Devis.objects.get(installation=sans_prix).cout_achat_equipements, Decimal('640000.00'))
+        # Installation acceptée : devis figé
+        self.assertEqual(Devis.objects.get(installation=acceptee).montant_total, 1)
+        # Rien n'a changé depuis : aucune écriture
+        self.assertEqual(recalculer_devis(datetime.date(2026, 9, 1))['modifies'], 0)
+
+    def test_enregistrement_refuse_sans_prix(self):
+        installation = self.installation()
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        url = f'/installation/api/installations/{installation.pk}/chiffrage/'
+
+        response = client.post(url + '?date=2026-02-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'equipements_sans_prix': [self.batterie.pk]})
+        self.assertFalse(Devis.objects.exists())
+
+        response = client.post(url + '?date=2026-07-01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['montant_total'], '966000.00')
+        self.assertTrue(Devis.objects.filter(installation=installation).exists())
+
+    def test_devis_enregistre_presente(self):
+        installation = self.installation()
+        devis = Devis.objects.create(
+            installation=installation, cout_achat_equipements=1, cout_installation_main_oeuvre=50000, montant_total=50001,
+        )
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        response = client.get(f'/installation/api/installations/{installation.pk}/chiffrage/?date=2026-07-01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['id'], response.json()['montant_total']), (devis.pk, '50001.00'))
+
+    def test_devis_fige_apres_acceptation(self):
+        installation = self.installation(status='accepted')
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        response = client.post(f'/installation/api/installations/{installation.pk}/chiffrage/?date=2026-07-01')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Devis.objects.exists())
+
+
+class ComparaisonEconomiqueTests(TestCase):
+    """Comparaisons économiques avec le réseau (installation/economie.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client@example.com', 'motdepasse', role='client')
+        cls.profil_client = ProfilClient.objects.create(user=cls.client_user)
+        TarifElectricite.objects.bulk_create([
+            TarifElectricite(prix_kwh=100, date_effet=datetime.date(2026, 1, 1)),
+            TarifElectricite(province='Houet', prix_kwh=120, redevance_an=6000, date_effet=datetime.date(2026, 1, 1)),
+        ])
+
+    def devis(self, province='Kadiogo', montant_total=1000000, maintenance=10000, consommation=10):
+        installation = Installation.objects.create(
+            client=self.profil_client, consommation_energetique=consommation, province=province,
+        )
+        return Devis.objects.create(
+            installation=installation, cout_achat_equipements=montant_total, cout_installation_main_oeuvre=0,
+            cout_maintenance_estime_an=maintenance, montant_total=montant_total,
+        )
+
+    def test_indicateurs(self):
+        resultats = evaluer(
+            [1000000, 1000000, 50000000], [10, 10, 10], [100, 100, 100], [0, 0, 0], [10000, 10000, 10000],
+            duree_vie_ans=20, taux_actualisation=0.08, hausse_tarif_an=0,
+        )
+        # 10 kWh/j x 365 x 100 FCFA = 365 000 FCFA/an, moins 10 000 de maintenance
+        self.assertEqual(list(resultats['economies_an']), [355000, 355000, 355000])
+        self.assertEqual(resultats['retour_annees'][0], 3)
+        self.assertTrue(np.isnan(resultats['retour_annees'][2]))
+        annuite = (1 - 1.08 ** -20) / 0.08
+        self.assertAlmostEqual(resultats['van'][0], 355000 * annuite - 1000000, places=4)
+        # La VAN au TRI est nulle
+        tri = resultats['tri'][0]
+        self.assertAlmostEqual(355000 * (1 - (1 + tri) ** -20) / tri, 1000000, places=2)
+        # Jamais remboursé : TRI négatif
+        self.assertLess(resultats['tri'][2], 0)
+
+    def test_recalcul_par_lots(self):
+        kadiogo = [self.devis() for _ in range(4)]
+        houet = self.devis('Houet')
+        perdant = self.devis(montant_total=50000000)
+        ComparaisonEconomique.objects.create(
+            devis=kadiogo[0], cout_electricite_traditionnelle_estime_an=1,
+            economies_potentielles_annuelles=1, duree_retour_investissement_annees=1,
+        )
+
+        compteurs = recalculer_comparaisons(datetime.date(2026, 6, 1), taille_lot=2, hausse_tarif_an=0)
+        self.assertEqual(compteurs, {'devis': 6, 'modifiees': 1, 'creees': 5, 'sans_tarif': 0})
+        comparaison = ComparaisonEconomique.objects.get(devis=kadiogo[0])
+        self.assertEqual(comparaison.cout_electricite_traditionnelle_estime_an, Decimal('365000.00'))
+        self.assertEqual(comparaison.duree_retour_investissement_annees, 3)
+        # Tarif de la province et sa redevance : 10 x 365 x 120 + 6 000
+        self.assertEqual(
+            ComparaisonEconomique.objects.get(devis=houet).cout_electricite_traditionnelle_estime_an, Decimal('444000.00'),
+        )
+        perte = ComparaisonEconomique.objects.get(devis=perdant)
+        self.assertIsNone(perte.duree_retour_investissement_annees)
+        self.assertLess(perte.taux_rentabilite_interne_pourcent, 0)
+        self.assertLess(perte.valeur_actuelle_nette, 0)
+
+        # Avant tout tarif : rien n'est calculé
+        compteurs = recalculer_comparaisons(datetime.date(2025, 6, 1))
+        self.assertEqual(compteurs['sans_tarif'], 6)
+
+    def test_comparaison_a_la_volee(self):
+        devis = self.devis('Houet')
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        url = f'/installation/api/installations/{devis.installation_id}/economie/'
+
+        response = client.get(url + '?date=2026-06-01&hausse_tarif_an=0&duree_vie_ans=10')
+        self.assertEqual(response.status_code, 200)
+        donnees = response.json()
+        self.assertEqual(donnees['devis']['id'], devis.pk)
+        self.assertEqual(donnees['comparaison']['cout_electricite_traditionnelle_estime_an'], '444000.00')
+        self.assertEqual(len(donnees['flux_annuels']), 10)
+        self.assertFalse(ComparaisonEconomique.objects.exists())
+
+        response = client.get(url + '?date=2026-06-01&prix_kwh=200')
+        self.assertEqual(response.json()['comparaison']['cout_electricite_traditionnelle_estime_an'], '736000.00')
+        response = client.get(url + '?date=2025-06-01')
+        self.assertEqual(response.status_code, 400)
+
+    def test_tarifs_modifiables_par_les_admins_seulement(self):
+        donnees = {'province': 'Kadiogo', 'prix_kwh': '110', 'date_effet': '2026-06-01'}
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        self.assertEqual(len(client.get('/installation/api/tarifs/').json()['results']), 2)
+        self.assertEqual(client.post('/installation/api/tarifs/', donnees).status_code, 403)
+        tarif = TarifElectricite.objects.get(province='Houet')
+        self.assertEqual(client.delete(f'/installation/api/tarifs/{tarif.pk}/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user('admin@example.com', 'motdepasse', role='admin'))
+        self.assertEqual(client.post('/installation/api/tarifs/', donnees).status_code, 201)
+
+
+class SimulationHoraireTests(TestCase):
+    """Simulation horaire sur les profils météo livrés (installation/simulation.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        solaire = Categorie.objects.create(nom='Solaire')
+        panneaux = Categorie.objects.create(nom='Panneau Solaire', parent=solaire)
+        batteries = Categorie.objects.create(nom='Batterie', parent=solaire)
+        cls.panneau = Equipement.objects.create(nom='Module 300 W', categorie=panneaux, puissance_W=300)
+        cls.batterie = Equipement.objects.create(nom='Batterie gel', categorie=batteries, tension_V=12, capacite_Ah=200)
+        cls.client_user = User.objects.create_user('client@example.com', 'motdepasse', role='client')
+        cls.installation = Installation.objects.create(
+            client=ProfilClient.objects.create(user=cls.client_user), consommation_energetique=3, province='Kénédougou',
+        )
+        InstallationEquipement.objects.bulk_create([
+            InstallationEquipement(installation=cls.installation, equipement=cls.panneau, quantite=4),
+            InstallationEquipement(installation=cls.installation, equipement=cls.batterie, quantite=2),
+        ])
+
+    def test_etat_charge_vectorise(self):
+        flux = np.random.default_rng(0).normal(0, 300, HEURES)
+        etat, attendu = 500.0, []
+        for valeur in flux:
+            etat = min(max(etat + valeur, 0), 2000)
+            attendu.append(etat)
+        np.testing.assert_allclose(etat_charge(flux, 2000, 500), attendu, atol=1e-6)
+
+    def test_profils(self):
+        profils = profils_meteo()
+        self.assertEqual(profils.irradiance.shape, (len(PROVINCES), HEURES))
+        self.assertEqual(profils.indice('kenedougou'), profils.indice('Orodara'))
+        irradiance, temperature = profils.profil(profils.indice('Kadiogo'))
+        # Ensoleillement annuel du Burkina Faso : environ 2 MWh/m²
+        self.assertTrue(1800 < irradiance.sum() / 1000 < 2400)
+        self.assertEqual(irradiance[:6].max(), 0)
+
+    def test_simulation(self):
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        url = f'/installation/api/installations/{self.installation.pk}/simulation/'
+        donnees = client.get(url).json()
+        self.assertEqual(donnees['province'], 'Kénédougou')
+        self.assertEqual(donnees['configuration']['puissance_crete_W'], 1200)
+        self.assertEqual(donnees['configuration']['energie_batterie_Wh'], 4800)
+        self.assertEqual(donnees['consommation_kWh_an'], 1095)
+        self.assertGreaterEqual(donnees['etat_charge_min'], 0.5)  # plomb : décharge limitée à 50 %
+        self.assertEqual(len(donnees['mensuel']), 12)
+
+        # Parc de batteries plus grand : moins de consommation non servie
+        grand = client.get(url + '?energie_batterie_Wh=20000&horaire=true').json()
+        self.assertLess(grand['non_servi_kWh_an'], donnees['non_servi_kWh_an'])
+        self.assertEqual(len(grand['horaire']['etat_charge']), HEURES)
+
+    def test_memorisation(self):
+        configuration = {
+            'province': 0, 'puissance_crete_W': 600.0, 'coefficient_temperature': -0.4,
+            'energie_batterie_Wh': 2400.0, 'profondeur_decharge': 0.5, 'rendement_batterie': 0.85,
+            'rendement_onduleur': 0.9, 'consommation_kwh_jour': 1.5,
+        }
+        self.assertIs(simuler(configuration), simuler(dict(configuration)))
+        plus_sensible = simuler({**configuration, 'coefficient_temperature': -0.5})
+        self.assertLess(plus_sensible['production_Wh'].sum(), simuler(configuration)['production_Wh'].sum())
+
+
+class DimensionnementTests(TestCase):
+    """Configurations réalisables tirées du catalogue, classées et bornées."""
+
+    @classmethod
+    def setUpTestData(cls):
+        solaire = Categorie.objects.create(nom='Solaire')
+        panneaux = Categorie.objects.create(nom='Panneau Solaire', parent=solaire)
+        batteries = Categorie.objects.create(nom='Batterie', parent=solaire)
+        onduleurs = Categorie.objects.create(nom='Onduleur', parent=solaire)
+        for puissance in (300, 500):
+            Equipement.objects.create(
+                nom=f'Panneau {puissance}', categorie=panneaux, puissance_W=puissance,
+                taille_mm=f'1000x{puissance * 5}x35',
+            )
+        Equipement.objects.create(nom='Batterie Gel', categorie=batteries, tension_V=12, capacite_Ah=100)
+        Equipement.objects.create(
+            nom='Batterie Lithium', type_equipement='Lithium', categorie=batteries, tension_V=12, capacite_Ah=100,
+        )
+        Equipement.objects.create(
+            nom='Onduleur 3kW', type_equipement='Hybride', categorie=onduleurs, puissance_W=3000, tension_entree_DC_V=24,
+        )
+        # Trop faible pour la pointe demandée
+        Equipement.objects.create(
+            nom='Onduleur 300W', type_equipement='Hybride', categorie=onduleurs, puissance_W=300, tension_entree_DC_V=12,
+        )
+
+        client_user = User.objects.create_user('client@example.com', 'motdepasse', role='client')
+        cls.client_user = client_user
+        cls.installation = Installation.objects.create(
+            client=ProfilClient.objects.create(user=client_user), consommation_energetique=2, province='Kadiogo',
+        )
+
+    def setUp(self):
+        dimensionnement._catalogue = None
+
+    def test_classement_par_cout(self):
+        resultat = dimensionner(2, k=10)
+        configurations = resultat['configurations']
+        self.assertEqual(resultat['combinaisons'], 2 * 2 * 2)
+        self.assertEqual(len(configurations), 4)
+        couts = [c['cout_estime'] for c in configurations]
+        self.assertEqual(couts, sorted(couts))
+        self.assertTrue(all(c['onduleur']['nom'] == 'Onduleur 3kW' for c in configurations))
+        meilleure = configurations[0]
+        self.assertEqual(meilleure['panneau'], {'id': meilleure['panneau']['id'], 'nom': 'Panneau 500', 'quantite': 1})
+        # Parc 24 V : batteries 12 V deux par deux
+        self.assertEqual(meilleure['batterie']['quantite'] % 2, 0)
+        self.assertIsNone(meilleure['regulateur'])
+
+    def test_k_et_budget(self):
+        self.assertEqual(len(dimensionner(2, k=1)['configurations']), 1)
+        tout = dimensionner(2, k=10)['configurations']
+        budget = tout[1]['cout_estime']
+        retenues = dimensionner(2, k=10, budget=budget)['configurations']
+        self.assertEqual(retenues, tout[:2])
+        self.assertEqual(dimensionner(2, budget=1)['configurations'], [])
+
+    def test_surface(self):
+        # Deux panneaux de 300 W occupent 3 m², un panneau de 500 W 2,5 m²
+        configurations = dimensionner(2, k=10, surface_m2=2.6)['configurations']
+        self.assertEqual(len(configurations), 2)
+        self.assertTrue(all(c['panneau']['nom'] == 'Panneau 500' for c in configurations))
+
+    def test_regulateur_le_moins_cher(self):
+        solaire = Categorie.objects.get(nom='Solaire')
+        Equipement.objects.create(
+            nom='Onduleur 2kW', type_equipement='Pur sinus', categorie=Categorie.objects.get(nom='Onduleur'),
+            puissance_W=2000, tension_entree_DC_V=24,
+        )
+        regulateurs = Categorie.objects.create(nom='Contrôleur de Charge', parent=solaire)
+        for courant in (20, 60):
+            Equipement.objects.create(
+                nom=f'Contrôleur {courant}A', categorie=regulateurs, courant_charge_A=courant,
+                tension_max_PV_V=100, tension_systeme_V='12/24',
+            )
+        toutes = dimensionner(2, k=20)['configurations']
+        configurations = [c for c in toutes if c['onduleur']['nom'] == 'Onduleur 2kW']
+        # 500 Wc sur un parc 24 V : 21 A, deux contrôleurs de 20 A coûtent moins qu'un de 60 A
+        self.assertEqual(
+            {(c['panneau']['nom'], c['regulateur']['nom'], c['regulateur']['quantite']) for c in configurations},
+            {('Panneau 500', 'Contrôleur 20A', 2), ('Panneau 300', 'Contrôleur 20A', 2)},
+        )
+        # Choix par blocs de panneaux : même résultat
+        with mock.patch.object(dimensionnement, 'TAILLE_BLOC', 1):
+            self.assertEqual(dimensionner(2, k=20)['configurations'], toutes)
+
+    def test_besoins_installation(self):
+        self.installation.budget_client = 1
+        self.assertEqual(dimensionner_installation(self.installation)['configurations'], [])
+        self.assertTrue(dimensionner_installation(self.installation, budget=10 ** 9)['configurations'])
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        url = f'/installation/api/installations/{self.installation.pk}/dimensionnement/'
+        response = client.get(url, {'k': 2, 'tri': 'autonomie'})
+        self.assertEqual(response.status_code, 200)
+        configurations = response.json()['configurations']
+        self.assertEqual(len(configurations), 2)
+        self.assertGreaterEqual(configurations[0]['autonomie_jours'], configurations[1]['autonomie_jours'])
+        self.assertEqual(client.get(url, {'k': 0}).status_code, 400)
+
+    def test_catalogue_recharge(self):
+        catalogue = dimensionnement.catalogue_dimensionnement()
+        self.assertIs(dimensionnement.catalogue_dimensionnement(), catalogue)
+        self.assertEqual(catalogue.taille(), {'panneau': 2, 'batterie': 2, 'onduleur': 2, 'regulateur': 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            panneau = Equipement.objects.get(nom='Panneau 300')
+            panneau.actif = False
+            panneau.save()
+        self.assertEqual(dimensionnement.catalogue_dimensionnement().taille()['panneau'], 1)
+
+    def test_catalogue_recharge_apres_ecriture_ailleurs(self):
+        dimensionnement.catalogue_dimensionnement()
+        # Écriture bulk d'un autre processus : seul le marqueur en base change
+        Equipement.objects.filter(nom='Panneau 300').update(actif=False)
+        marquer_modification('equipement')
+        self.assertEqual(dimensionnement.catalogue_dimensionnement().taille()['panneau'], 1)
+
+
+class PorteeUtilisateurTests(TestCase):
+    """Schémas, devis et comparaisons limités aux installations de l'utilisateur."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'motdepasse', role='client')
+        cls.bob = User.objects.create_user('bob@example.com', 'motdepasse', role='client')
+        cls.technicien = User.objects.create_user('tech@example.com', 'motdepasse', role='technicien')
+        cls.admin = User.objects.create_user('admin@example.com', 'motdepasse', role='admin')
+        profil_technicien = ProfilTechnicien.objects.create(user=cls.technicien)
+        cls.installation_alice = Installation.objects.create(
+            client=ProfilClient.objects.create(user=cls.alice), technicien=profil_technicien,
+            consommation_energetique=5, province='Kadiogo',
+        )
+        cls.installation_bob = Installation.objects.create(
+            client=ProfilClient.objects.create(user=cls.bob), consommation_energetique=5, province='Houet',
+        )
+        cls.devis_bob = Devis.objects.create(
+            installation=cls.installation_bob, cout_achat_equipements=800, cout_installation_main_oeuvre=200,
+            montant_total=1000,
+        )
+        SchemaInstallation.objects.create(installation=cls.installation_alice)
+
+    def client_pour(self, utilisateur):
+        client = APIClient()
+        client.force_authenticate(utilisateur)
+        return client
+
+    def test_liste(self):
+        self.assertEqual(self.client_pour(self.alice).get('/installation/api/devis/').json()['results'], [])
+        self.assertEqual(len(self.client_pour(self.bob).get('/installation/api/devis/').json()['results']), 1)
+        self.assertEqual(len(self.client_pour(self.admin).get('/installation/api/devis/').json()['results']), 1)
+        schemas = self.client_pour(self.technicien).get('/installation/api/schemas/').json()['results']
+        self.assertEqual(len(schemas), 1)
+        self.assertEqual(self.client_pour(self.bob).get('/installation/api/schemas/').json()['results'], [])
+
+    def test_modification_refusee(self):
+        url = f'/installation/api/devis/{self.devis_bob.pk}/'
+        response = self.client_pour(self.alice).patch(url, {'montant_total': 1}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.devis_bob.refresh_from_db()
+        self.assertEqual(self.devis_bob.montant_total, 1000)
 
-# Create your tests here.
+    def test_creation_sur_installation_d_un_autre(self):
+        donnees = {
+            'installation': self.installation_bob.pk, 'cout_achat_equipements': 8,
+            'cout_installation_main_oeuvre': 2, 'montant_total': 10,
+        }
+        response = self.client_pour(self.alice).post('/installation/api/devis/', donnees, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('installation', response.json())
+        self.assertFalse(Devis.objects.filter(montant_total=10).exists())
+        donnees['installation'] = self.installation_alice.pk
+        response = self.client_pour(self.alice).post('/installation/api/devis/', donnees, format='json')
+        self.assertEqual(response.status_code, 201)
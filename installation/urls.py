@@ -1,10 +1,16 @@
+from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import InstallationViewSet, SchemaInstallationViewSet, DevisViewSet, ComparaisonEconomiqueViewSet
+from .views import (
+    InstallationViewSet, SchemaInstallationViewSet, DevisViewSet, ComparaisonEconomiqueViewSet, TarifElectriciteViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'installations', InstallationViewSet, basename='installation')
 router.register(r'schemas', SchemaInstallationViewSet, basename='schemainstallation')
 router.register(r'devis', DevisViewSet, basename='devis')
 router.register(r'comparaisons', ComparaisonEconomiqueViewSet, basename='comparaisoneconomique')
+router.register(r'tarifs', TarifElectriciteViewSet, basename='tarifelectricite')
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('api/', include(router.urls)),
+]
@@ -1,11 +1,72 @@
-from rest_framework import viewsets, permissions
-from .models import Installation, SchemaInstallation, Devis, ComparaisonEconomique
-from .serializers import InstallationSerializer, SchemaInstallationSerializer, DevisSerializer, ComparaisonEconomiqueSerializer
+from django.db.models import Prefetch
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from idav.permissions import IsAdminOrReadOnly
+from product.compatibilite import alternatives, verifier
+from .devis import STATUTS_OUVERTS, chiffrer_installation
+from .dimensionnement import dimensionner_installation
+from .economie import comparer, tarif_province, tarifs_en_vigueur
+from .simulation import simuler_installation
+from .models import Installation, InstallationEquipement, SchemaInstallation, Devis, ComparaisonEconomique, TarifElectricite
+from .serializers import (
+    InstallationSerializer, SchemaInstallationSerializer, DevisSerializer, ComparaisonEconomiqueSerializer,
+    TarifElectriciteSerializer, DimensionnementParametresSerializer, ChiffrageParametresSerializer,
+    EconomieParametresSerializer, SimulationParametresSerializer,
+)
+
+def filtrer_par_utilisateur(queryset, user, chemin=''):
+    """
+    Restreint `queryset` aux installations que voit l'utilisateur, ou aux objets qui
+    y sont rattachés par `chemin` ('installation', 'devis__installation').
+    """
+    prefixe = f'{chemin}__' if chemin else ''
+    # Filtre sur l'utilisateur par jointure : pas de requête pour lire son profil
+    if user.role == 'client':
+        return queryset.filter(**{f'{prefixe}client__user': user})
+    elif user.role == 'technicien':
+        return queryset.filter(**{f'{prefixe}technicien__user': user})
+    # admin et autres roles voient tout
+    return queryset
+
+
+class RattacheInstallationMixin:
+    """
+    Objets rattachés à une installation (schéma, devis, comparaison) : chacun ne
+    lit, ne crée et ne modifie que ceux des installations qu'il voit lui-même.
+    """
+    chemin_installation = 'installation'
+
+    def get_queryset(self):
+        return filtrer_par_utilisateur(super().get_queryset(), self.request.user, self.chemin_installation)
+
+    def perform_create(self, serializer):
+        self.verifier_rattachement(serializer)
+        serializer.save()
+
+    def perform_update(self, serializer):
+        self.verifier_rattachement(serializer)
+        serializer.save()
+
+    def verifier_rattachement(self, serializer):
+        # Le rattachement demandé doit viser une installation (ou un devis) visible
+        lien, _, reste = self.chemin_installation.partition('__')
+        cible = serializer.validated_data.get(lien)
+        if cible is None:
+            return
+        visibles = filtrer_par_utilisateur(type(cible).objects.filter(pk=cible.pk), self.request.user, reste)
+        if not visibles.exists():
+            raise ValidationError({lien: [f"Clé primaire « {cible.pk} » non valide - l'objet n'existe pas."]})
+
 
 class InstallationViewSet(viewsets.ModelViewSet):
     queryset = Installation.objects.all()
     serializer_class = InstallationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    alternatives_max = 10
+    # Actions qui renvoient la représentation complète : elles seules suivent le plan de lecture
+    actions_representation = ('list', 'retrieve', 'update', 'partial_update')
 
     def perform_create(self, serializer):
         # Assigner automatiquement le client connecté s’il est client - à adapter selon votre logique
@@ -15,29 +76,156 @@ class InstallationViewSet(viewsets.ModelViewSet):
         else:
             serializer.save()
 
+    def lignes_compactes(self):
+        return self.request is not None and self.request.query_params.get('lignes') == 'compact'
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['lignes_compactes'] = self.lignes_compactes()
+        return context
+
+    def plan_lecture(self, queryset):
+        """
+        Jointures et préchargements de la représentation : profils en jointure, lignes
+        et équipements (catégorie, marque) en une requête pour toute la page. L'arbre
+        des catégories imbriqué est lu une fois par CategorieSerializer.
+        """
+        lignes = InstallationEquipement.objects.select_related(
+            'equipement__categorie', 'equipement__marque'
+        ).order_by('pk')
+        if self.lignes_compactes():
+            lignes = lignes.only(
+                'id', 'installation_id', 'quantite', 'equipement__id', 'equipement__nom',
+                'equipement__categorie__nom', 'equipement__marque__nom',
+            )
+        return queryset.select_related('client', 'technicien').prefetch_related(
+            Prefetch('installationequipement_set', queryset=lignes)
+        )
+
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'client':
-            return Installation.objects.filter(client=user.profil_client)
-        elif user.role == 'technicien':
-            return Installation.objects.filter(technicien=user.profil_technicien)
-        # admin et autres roles voient tout
-        return Installation.objects.all()
+        queryset = Installation.objects.all()
+        if self.action in self.actions_representation:
+            queryset = self.plan_lecture(queryset)
+        return filtrer_par_utilisateur(queryset, self.request.user)
+
+    @action(detail=True, methods=['get'])
+    def dimensionnement(self, request, pk=None):
+        """Meilleures configurations panneaux/batteries/onduleur du catalogue pour cette installation."""
+        installation = self.get_object()
+        parametres = DimensionnementParametresSerializer(data=request.query_params)
+        parametres.is_valid(raise_exception=True)
+        return Response(dimensionner_installation(installation, **parametres.validated_data))
+
+    @action(detail=True, methods=['get'])
+    def compatibilite(self, request, pk=None):
+        """
+        Vérifie deux à deux la compatibilité électrique des équipements proposés,
+        depuis la table des paires précalculées, et propose pour chaque équipement
+        en cause des alternatives compatibles avec le reste de l'installation.
+        """
+        installation = self.get_object()
+        ids = list(installation.installationequipement_set.values_list('equipement_id', flat=True))
+        resultat = verifier(ids)
+        en_cause = dict.fromkeys(pk for i in resultat['incompatibilites'] for pk in i['equipements'])
+        resultat['alternatives'] = {
+            pk: list(alternatives(pk, [autre for autre in ids if autre != pk])[:self.alternatives_max])
+            for pk in en_cause
+        }
+        return Response(resultat)
+
+    @action(detail=True, methods=['get', 'post'])
+    def chiffrage(self, request, pk=None):
+        """
+        Devis de l'installation. GET présente le devis enregistré, ou à défaut celui
+        calculé depuis la grille de prix ; POST le recalcule et l'enregistre.
+        L'enregistrement est refusé tant qu'un équipement n'a pas de prix en vigueur,
+        et pour une installation qui n'est plus ouverte (devis figé).
+        """
+        installation = self.get_object()
+        parametres = ChiffrageParametresSerializer(data=request.query_params)
+        parametres.is_valid(raise_exception=True)
+        if request.method == 'GET':
+            devis = Devis.objects.filter(installation=installation).first()
+            if devis is not None:
+                return Response({**DevisSerializer(devis).data, 'equipements_sans_prix': []})
+        elif installation.status not in STATUTS_OUVERTS:
+            return Response(
+                {'detail': f"Installation au statut '{installation.status}' : son devis n'est plus recalculé."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        devis, sans_prix = chiffrer_installation(installation, parametres.validated_data.get('date'))
+        if request.method == 'POST':
+            if sans_prix:
+                return Response({'equipements_sans_prix': sans_prix}, status=status.HTTP_400_BAD_REQUEST)
+            devis.save()
+        return Response({**DevisSerializer(devis).data, 'equipements_sans_prix': sans_prix})
+
+    @action(detail=True, methods=['get'])
+    def economie(self, request, pk=None):
+        """
+        Comparaison avec le réseau calculée à la volée, sans rien enregistrer : sur le
+        devis de l'installation, ou à défaut sur le devis chiffré depuis la grille de prix.
+        """
+        installation = self.get_object()
+        parametres = EconomieParametresSerializer(data=request.query_params)
+        parametres.is_valid(raise_exception=True)
+        options = dict(parametres.validated_data)
+        date = options.pop('date', None)
+        prix_kwh = options.pop('prix_kwh', None)
 
+        devis = Devis.objects.filter(installation=installation).first()
+        if devis is None:
+            devis, sans_prix = chiffrer_installation(installation, date)
+            if sans_prix:
+                return Response({'equipements_sans_prix': sans_prix}, status=status.HTTP_400_BAD_REQUEST)
 
-class SchemaInstallationViewSet(viewsets.ModelViewSet):
+        tarif = tarif_province(tarifs_en_vigueur(date), installation.province)
+        if prix_kwh is not None:
+            tarif = (prix_kwh, tarif[1] if tarif else 0.0)
+        if tarif is None:
+            raise ValidationError({'province': f"Aucun tarif d'électricité pour '{installation.province}' ni tarif national."})
+        comparaison, flux, hypotheses = comparer(devis, installation, tarif, **options)
+        return Response({
+            'devis': DevisSerializer(devis).data,
+            'comparaison': ComparaisonEconomiqueSerializer(comparaison).data,
+            'flux_annuels': flux,
+            'hypotheses': hypotheses,
+        })
+
+    @action(detail=True, methods=['get'])
+    def simulation(self, request, pk=None):
+        """
+        Simulation horaire sur une année type de la province : production, état de
+        charge des batteries et consommation non servie des équipements proposés.
+        """
+        installation = self.get_object()
+        parametres = SimulationParametresSerializer(data=request.query_params)
+        parametres.is_valid(raise_exception=True)
+        return Response(simuler_installation(installation, **parametres.validated_data))
+
+
+class SchemaInstallationViewSet(RattacheInstallationMixin, viewsets.ModelViewSet):
     queryset = SchemaInstallation.objects.all()
     serializer_class = SchemaInstallationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class DevisViewSet(viewsets.ModelViewSet):
+class DevisViewSet(RattacheInstallationMixin, viewsets.ModelViewSet):
     queryset = Devis.objects.all()
     serializer_class = DevisSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class ComparaisonEconomiqueViewSet(viewsets.ModelViewSet):
+class ComparaisonEconomiqueViewSet(RattacheInstallationMixin, viewsets.ModelViewSet):
     queryset = ComparaisonEconomique.objects.all()
     serializer_class = ComparaisonEconomiqueSerializer
     permission_classes = [permissions.IsAuthenticated]
+    chemin_installation = 'devis__installation'
+
+
+class TarifElectriciteViewSet(viewsets.ModelViewSet):
+    queryset = TarifElectricite.objects.order_by('province', '-date_effet')
+    serializer_class = TarifElectriciteSerializer
+    # Les tarifs alimentent toutes les comparaisons : écriture réservée aux admins
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
@@ -0,0 +1,63 @@
+"""
+Table clé/valeur AttributEquipement, dérivée de `caracteristiques_additionnelles`.
+
+Le JSON fournisseur est soit un objet ({"garantie_ans": 10, ...}), soit une
+liste de phrases ; les deux sont aplatis en lignes (clé, valeur, valeur_nombre).
+La table est resynchronisée par le signal post_save d'Equipement et, par lots,
+par l'import.
+"""
+import json
+
+from .models import AttributEquipement, Equipement
+
+
+CLE_LISTE = 'caracteristique'
+LONGUEUR_VALEUR = 255
+TAILLE_LOT = 500
+
+
+def _nombre(valeur):
+    if isinstance(valeur, bool):
+        return None
+    if isinstance(valeur, (int, float)):
+        return float(valeur)
+    try:
+        return float(str(valeur).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def lignes_attributs(caracteristiques):
+    """[(clé, valeur texte, valeur numérique ou None)] d'un contenu JSON."""
+    if isinstance(caracteristiques, dict):
+        elements = caracteristiques.items()
+    elif isinstance(caracteristiques, list):
+        elements = ((CLE_LISTE, element) for element in caracteristiques)
+    else:
+        return []
+
+    lignes = []
+    for cle, valeur in elements:
+        valeurs = valeur if isinstance(valeur, list) else [valeur]
+        for v in valeurs:
+            if v is None or v == '':
+                continue
+            texte = v if isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+            lignes.append((str(cle)[:100], texte[:LONGUEUR_VALEUR], _nombre(v)))
+    return list(dict.fromkeys(lignes))
+
+
+def synchroniser(ids, modele=Equipement, modele_attribut=AttributEquipement, alias='default'):
+    """Recalcule les attributs des équipements donnés."""
+    ids = list(ids)
+    for i in range(0, len(ids), TAILLE_LOT):
+        tranche = ids[i:i + TAILLE_LOT]
+        modele_attribut.objects.using(alias).filter(equipement_id__in=tranche).delete()
+        nouveaux = [
+            modele_attribut(equipement_id=pk, cle=cle, valeur=valeur, valeur_nombre=nombre)
+            for pk, caracteristiques in modele.objects.using(alias).filter(pk__in=tranche).values_list(
+                'pk', 'caracteristiques_additionnelles'
+            )
+            for cle, valeur, nombre in lignes_attributs(caracteristiques)
+        ]
+        modele_attribut.objects.using(alias).bulk_create(nouveaux, batch_size=TAILLE_LOT)
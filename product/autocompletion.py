@@ -0,0 +1,179 @@
+"""
+Autocomplétion des noms du catalogue (équipements, marques, catégories), servie
+depuis un index en mémoire du processus ; seule la version du catalogue est lue
+en base.
+
+Chaque nom est rangé, normalisé comme pour la recherche plein texte, sous
+chacun de ses débuts de mot : "Onduleur Hybride 5kW" est trouvé par "ond", "hyb"
+ou "5k". Un tableau trié de (clé, id) par type et `bisect` donnent les candidats
+d'un préfixe sans parcourir le catalogue.
+
+L'index est construit au premier appel, tenu à jour par les signaux du
+catalogue pour les écritures de ce processus, et reconstruit en entier quand
+la version du catalogue (marqueurs en base) a changé ailleurs : import en
+masse, autre processus.
+"""
+import threading
+from bisect import bisect_left, insort
+
+from .cache import version_marqueurs
+from .models import Categorie, Marque, Equipement
+from .recherche import mots
+
+
+# Poids de chaque type dans le classement : une marque ou une catégorie qui
+# correspond est plus utile qu'un équipement parmi des centaines
+POIDS_TYPES = {
+    'marque': 3.0,
+    'categorie': 2.0,
+    'equipement': 1.0,
+}
+
+# Bonus quand le préfixe correspond au début du nom plutôt qu'à un mot suivant
+BONUS_DEBUT = 1.0
+
+# Nombre maximal de clés parcourues par type pour un préfixe
+PARCOURS_MAX = 2000
+
+
+def formes(texte):
+    """
+    Formes normalisées d'un texte, mots composés séparés puis collés :
+    "Panneau mono-cristallin" -> ["panneau mono cristallin", "panneau monocristallin"].
+    """
+    termes = mots(texte)
+    separes = ' '.join(termes).replace('-', ' ')
+    colles = ' '.join(terme.replace('-', '') for terme in termes)
+    return [separes] if colles == separes else [separes, colles]
+
+
+def cles_nom(libelle):
+    """Clés d'un nom : chacune de ses formes depuis chacun de ses mots."""
+    cles = []
+    for forme in formes(libelle):
+        termes = forme.split()
+        cles.extend(' '.join(termes[i:]) for i in range(len(termes)))
+    return list(dict.fromkeys(cles))
+
+
+def sources():
+    """(type, queryset de (id, nom)) indexés."""
+    return [
+        ('equipement', Equipement.objects.filter(actif=True).values_list('id', 'nom')),
+        ('marque', Marque.objects.values_list('id', 'nom')),
+        ('categorie', Categorie.objects.values_list('id', 'nom')),
+    ]
+
+
+class IndexPrefixes:
+
+    def __init__(self, version=None):
+        self.version = version
+        self.cles = {type_: [] for type_ in POIDS_TYPES}
+        self.libelles = {type_: {} for type_ in POIDS_TYPES}
+
+    @classmethod
+    def construire(cls, version=None):
+        index = cls(version)
+        for type_, lignes in sources():
+            cles = index.cles[type_]
+            for pk, libelle in lignes.iterator(chunk_size=2000):
+                index.libelles[type_][pk] = libelle
+                cles.extend((cle, pk) for cle in cles_nom(libelle))
+            cles.sort()
+        return index
+
+    def __len__(self):
+        return sum(len(libelles) for libelles in self.libelles.values())
+
+    def ajouter(self, type_, pk, libelle):
+        self.retirer(type_, pk)
+        self.libelles[type_][pk] = libelle
+        for cle in cles_nom(libelle):
+            insort(self.cles[type_], (cle, pk))
+
+    def retirer(self, type_, pk):
+        ancien = self.libelles[type_].pop(pk, None)
+        if ancien is None:
+            return
+        cles = self.cles[type_]
+        for cle in cles_nom(ancien):
+            i = bisect_left(cles, (cle, pk))
+            if i < len(cles) and cles[i] == (cle, pk):
+                del cles[i]
+
+    def chercher(self, texte, limite=10, types=None):
+        """[(type, id, libellé)] des meilleurs noms commençant par les mots de `texte`."""
+        prefixes = [forme for forme in formes(texte) if forme]
+        if not prefixes:
+            return []
+
+        candidats = []
+        for type_ in types or POIDS_TYPES:
+            cles = self.cles[type_]
+            libelles = self.libelles[type_]
+            vus = set()
+            for prefixe in prefixes:
+                i = bisect_left(cles, (prefixe,))
+                fin = min(len(cles), i + PARCOURS_MAX)
+                while i < fin and len(vus) < limite:
+                    cle, pk = cles[i]
+                    i += 1
+                    if not cle.startswith(prefixe):
+                        break
+                    if pk in vus:
+                        continue
+                    vus.add(pk)
+                    libelle = libelles[pk]
+                    score = POIDS_TYPES[type_]
+                    if any(forme.startswith(prefixe) for forme in formes(libelle)):
+                        score += BONUS_DEBUT
+                    candidats.append((-score, len(libelle), libelle, type_, pk))
+
+        candidats.sort()
+        return [(type_, pk, libelle) for _, _, libelle, type_, pk in candidats[:limite]]
+
+
+_verrou = threading.Lock()
+_index = None
+
+
+def index_autocompletion():
+    """Index courant, (re)construit si absent ou en retard sur la version du catalogue."""
+    global _index
+    version = version_marqueurs()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _verrou:
+        if _index is None or _index.version != version:
+            _index = IndexPrefixes.construire(version)
+        return _index
+
+
+def completer(texte, limite=10, types=None):
+    index = index_autocompletion()
+    # Les mises à jour incrémentales décalent les tableaux : lecture sous le verrou
+    with _verrou:
+        return index.chercher(texte, limite, types)
+
+
+def appliquer(type_, pk, libelle=None):
+    """
+    Reporte une écriture du catalogue sur l'index déjà construit (libellé None :
+    suppression), appelé après l'incrément de version de cette même écriture.
+    Si la version a bougé entre-temps ailleurs, l'index est laissé en retard et
+    sera reconstruit à la prochaine lecture.
+    """
+    index = _index
+    if index is None:
+        return
+    with _verrou:
+        version = version_marqueurs()
+        if index.version != version - 1:
+            return
+        if libelle is None:
+            index.retirer(type_, pk)
+        else:
+            index.ajouter(type_, pk, libelle)
+        index.version = version
@@ -0,0 +1,139 @@
+"""
+Cache des lectures du catalogue (catégories, marques, équipements).
+
+Chaque écriture (signaux post_save/post_delete, commande d'import) incrémente un
+marqueur par table (MarqueurCatalogue), en base. Les réponses des vues sont
+rangées sous les versions de ces marqueurs : les anciennes entrées ne sont plus
+jamais lues et expirent d'elles-mêmes, et une écriture faite par un autre
+processus est vue dès la requête suivante. On en dérive aussi ETag et
+Last-Modified : un client qui renvoie le bon If-None-Match reçoit un 304 sans
+lecture du catalogue ni sérialisation.
+
+Les index gardés en mémoire du processus (autocomplétion, similarité,
+dimensionnement) et les facettes suivent la somme de ces marqueurs
+(`version_marqueurs`).
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .models import MarqueurCatalogue
+
+
+# Tables dont les marqueurs font la version du catalogue (MarqueurCatalogue.table)
+TABLES_CATALOGUE = ('categorie', 'marque', 'equipement')
+
+
+def cache_catalogue():
+    return caches[getattr(settings, 'CATALOGUE_CACHE_ALIAS', 'default')]
+
+
+def version_marqueurs(tables=TABLES_CATALOGUE):
+    """
+    Version du catalogue lue en base : somme des marqueurs des tables données.
+    Chaque écriture incrémente un marqueur de 1, la somme ne fait donc que croître,
+    et tous les processus lisent la même.
+    """
+    return MarqueurCatalogue.objects.filter(table__in=tables).aggregate(total=Sum('version'))['total'] or 0
+
+
+def marquer_modification(*tables):
+    """Incrémente le marqueur de modification des tables du catalogue données."""
+    maintenant = timezone.now()
+    for table in tables:
+        mis_a_jour = MarqueurCatalogue.objects.filter(table=table).update(
+            version=F('version') + 1, modifie_le=maintenant
+        )
+        if not mis_a_jour:
+            MarqueurCatalogue.objects.get_or_create(
+                table=table, defaults={'version': 1, 'modifie_le': maintenant}
+            )
+
+
+def requete_normalisee(request):
+    parametres = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return f"{request.path}?{parametres}"
+
+
+def marqueurs_catalogue(tables):
+    """[(table, version, modifie_le)] des tables données, triés, lus en base."""
+    return sorted(
+        MarqueurCatalogue.objects.filter(table__in=tables).values_list('table', 'version', 'modifie_le')
+    )
+
+
+def versions_marqueurs(marqueurs):
+    return ','.join(f"{table}:{version}" for table, version, _ in marqueurs)
+
+
+def cle_requete(request, versions, prefixe='vue'):
+    """
+    Clé de cache d'une requête GET : chemin et paramètres triés, sous les versions
+    des marqueurs (`versions_marqueurs`) des tables dont dépend la réponse.
+    """
+    empreinte = hashlib.md5(requete_normalisee(request).encode('utf-8')).hexdigest()
+    return f"catalogue:{versions}:{prefixe}:{empreinte}"
+
+
+class CacheCatalogueMixin:
+    """
+    Réponses `list` et `retrieve` d'un ViewSet du catalogue : requêtes
+    conditionnelles (ETag / Last-Modified) puis cache versionné.
+    Les permissions sont vérifiées avant (dans `initial`), seule la lecture
+    en base et la sérialisation sont évitées.
+
+    `tables_catalogue` liste les tables dont dépend la représentation. Leurs
+    marqueurs, lus une fois par requête, donnent à la fois l'ETag et la clé de
+    cache : une écriture faite par n'importe quel processus change les deux.
+    """
+    tables_catalogue = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.reponse_catalogue(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.reponse_catalogue(request, super().retrieve, *args, **kwargs)
+
+    def validateurs(self, request, marqueurs=None):
+        """(ETag fort, date de dernière modification) de la requête, depuis les marqueurs."""
+        if marqueurs is None:
+            marqueurs = marqueurs_catalogue(self.tables_catalogue)
+        source = f"{versions_marqueurs(marqueurs)}|{request.accepted_media_type}|{requete_normalisee(request)}"
+        etag = quote_etag(hashlib.md5(source.encode('utf-8')).hexdigest())
+        dates = [modifie_le for _, _, modifie_le in marqueurs if modifie_le]
+        return etag, max(dates) if dates else None
+
+    def reponse_catalogue(self, request, calcul, *args, **kwargs):
+        marqueurs = marqueurs_catalogue(self.tables_catalogue)
+        etag, modifie_le = self.validateurs(request, marqueurs)
+        horodatage = int(modifie_le.timestamp()) if modifie_le else None
+
+        non_modifie = get_conditional_response(request._request, etag=etag, last_modified=horodatage)
+        if non_modifie is not None:
+            return non_modifie
+
+        response = self.reponse_en_cache(request, versions_marqueurs(marqueurs), calcul, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if horodatage:
+                response['Last-Modified'] = http_date(horodatage)
+        return response
+
+    def reponse_en_cache(self, request, versions, calcul, *args, **kwargs):
+        cache = cache_catalogue()
+        cle = cle_requete(request, versions)
+        data = cache.get(cle)
+        if data is not None:
+            return Response(data)
+
+        response = calcul(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(cle, response.data, getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 3600))
+        return response
@@ -0,0 +1,385 @@
+"""
+Compatibilité électrique entre équipements du catalogue (IncompatibiliteEquipement).
+
+Les règles portent sur des paires de familles (panneau/contrôleur, onduleur/
+batterie...) et sont évaluées sur des tableaux NumPy des colonnes utiles : une
+matrice de booléens par paire de familles, par blocs de lignes. Seules les
+paires incompatibles sont rangées, une fois, dans le sens de la règle ; toute
+autre paire est compatible. Une caractéristique non renseignée ne rend jamais
+une paire incompatible ; deux équipements qui ne se branchent pas l'un sur
+l'autre (appareil en courant continu et onduleur...) sont compatibles.
+
+La table est recalculée en entier par `calculer_compatibilites`, et pour les
+seuls équipements écrits (leur ligne et leur colonne de chaque matrice) après
+un import ou un enregistrement. La vérification d'un ensemble d'équipements et
+la recherche d'alternatives ne font plus que lire des paires.
+"""
+from itertools import islice
+
+import numpy as np
+from django.db.models import Q
+
+from .models import Categorie, Equipement, IncompatibiliteEquipement
+
+
+# Familles d'équipements : catégorie du catalogue (et ses sous-catégories) de chacune
+FAMILLES = {
+    'panneau': 'Panneau Solaire',
+    'batterie': 'Batterie',
+    'onduleur': 'Onduleur',
+    'regulateur': 'Contrôleur de Charge',
+    'appareil': 'Appareils',
+}
+
+# Marge sur la tension de circuit ouvert par temps froid
+MARGE_VOC = 1.15
+# Écart toléré entre deux tensions nominales (batterie 12,8 V sur un parc 12 V)
+TOLERANCE_TENSION = 0.1
+FACTEUR_PUISSANCE = 0.8  # W = VA × cos φ quand seule la puissance apparente est connue
+
+TAILLE_LOT = 2000
+# Nombre maximal de paires évaluées ensemble par une règle
+TAILLE_BLOC = 1_000_000
+
+CHAMPS = [
+    'id', 'nom', 'type_equipement', 'mode', 'puissance_W', 'puissance_VA', 'tension_V',
+    'tension_entree_DC_V', 'tension_circuit_ouvert_VOC', 'courant_court_circuit_ISC',
+    'tension_max_PV_V', 'courant_charge_A', 'tensions_systeme_V',
+]
+# Colonnes dont dépendent les paires d'un équipement : famille, présence au catalogue et CHAMPS
+CHAMPS_REGLES = ['categorie_id', 'actif', *CHAMPS[1:]]
+NUMERIQUES = [
+    'puissance_W', 'puissance_VA', 'tension_V', 'tension_entree_DC_V', 'tension_circuit_ouvert_VOC',
+    'courant_court_circuit_ISC', 'tension_max_PV_V', 'courant_charge_A',
+]
+
+
+def _flottants(valeurs):
+    return np.array([np.nan if v is None else float(v) for v in valeurs], dtype=float)
+
+
+class Famille:
+    """Colonnes d'une famille d'équipements actifs, en tableaux alignés sur `ids`."""
+
+    def __init__(self, nom, lignes):
+        self.nom = nom
+        self.ids = np.array([ligne['id'] for ligne in lignes], dtype=np.int64)
+        for champ in NUMERIQUES:
+            setattr(self, champ, _flottants(ligne[champ] for ligne in lignes))
+        textes = [f"{ligne['type_equipement']} {ligne['nom']}".lower() for ligne in lignes]
+        self.hybride = np.array(['hybride' in t for t in textes], dtype=bool)
+        self.reseau = np.array(['on-grid' in t or 'réseau' in t for t in textes], dtype=bool)
+        self.continu = np.array([ligne['mode'] == 'DC' for ligne in lignes], dtype=bool)
+        # Tensions de système supportées ("/12/24/48/"), complétées par NaN
+        listes = [[float(v) for v in ligne['tensions_systeme_V'].strip('/').split('/') if v] for ligne in lignes]
+        largeur = max((len(l) for l in listes), default=0) or 1
+        self.tensions = np.full((len(lignes), largeur), np.nan)
+        for i, liste in enumerate(listes):
+            self.tensions[i, :len(liste)] = liste
+
+    def __len__(self):
+        return len(self.ids)
+
+    def extraire(self, selection):
+        """Famille restreinte aux équipements `selection` (masque ou tranche)."""
+        partie = object.__new__(Famille)
+        for attribut, valeur in vars(self).items():
+            setattr(partie, attribut, valeur[selection] if isinstance(valeur, np.ndarray) else valeur)
+        return partie
+
+    def puissance_active(self):
+        return np.where(np.isnan(self.puissance_W), self.puissance_VA * FACTEUR_PUISSANCE, self.puissance_W)
+
+
+def chemins_familles(modele_categorie=Categorie, alias='default'):
+    """[(chemin, famille)] des catégories racines de chaque famille."""
+    noms = {nom: famille for famille, nom in FAMILLES.items()}
+    categories = modele_categorie.objects.using(alias).filter(nom__in=noms)
+    return [(chemin, noms[nom]) for chemin, nom in categories.values_list('chemin', 'nom')]
+
+
+def famille_de_chemin(chemin, chemins):
+    for racine, famille in chemins:
+        if chemin.startswith(racine):
+            return famille
+    return None
+
+
+def familles_de(ids, modele=Equipement, modele_categorie=Categorie, alias='default'):
+    """{id: famille} des équipements donnés (None hors familles)."""
+    chemins = chemins_familles(modele_categorie, alias)
+    lignes = modele.objects.using(alias).filter(pk__in=ids).values_list('pk', 'categorie__chemin')
+    return {pk: famille_de_chemin(chemin, chemins) for pk, chemin in lignes}
+
+
+def partenaires(famille):
+    """Familles liées à `famille` par une règle."""
+    return {b if a == famille else a for a, b in REGLES if famille in (a, b)}
+
+
+def charger(modele=Equipement, modele_categorie=Categorie, alias='default', noms=None):
+    """{famille: Famille} des équipements actifs du catalogue (des familles `noms`)."""
+    familles = {famille: [] for famille in FAMILLES if noms is None or famille in noms}
+    for chemin, famille in chemins_familles(modele_categorie, alias):
+        if famille not in familles:
+            continue
+        filtre = Categorie.filtre_descendants(chemin, 'categorie__chemin')
+        familles[famille].extend(
+            modele.objects.using(alias).filter(filtre, actif=True).order_by('pk').values(*CHAMPS)
+        )
+    return {famille: Famille(famille, lignes) for famille, lignes in familles.items()}
+
+
+def _tension_acceptee(listes, tensions):
+    """(M, N) : la tension n est-elle (à la tolérance près) dans la liste m ? Inconnue : oui."""
+    proches = np.abs(listes[:, None, :] - tensions[None, :, None]) <= TOLERANCE_TENSION * listes[:, None, :]
+    inconnue = np.isnan(listes).all(axis=1)[:, None] | np.isnan(tensions)[None, :]
+    return proches.any(axis=2) | inconnue
+
+
+# Règles : matrice des paires (a, b) compatibles des deux familles.
+# Les comparaisons sont écrites « pas de dépassement » : NaN (inconnu) ne viole rien.
+
+def _panneau_regulateur(panneaux, regulateurs):
+    # Une chaîne d'au moins un module sous la tension PV maximale, par temps froid
+    modules = np.floor(
+        regulateurs.tension_max_PV_V[None, :] / (panneaux.tension_circuit_ouvert_VOC[:, None] * MARGE_VOC)
+    )
+    courant_ok = ~(panneaux.courant_court_circuit_ISC[:, None] > regulateurs.courant_charge_A[None, :])
+    return ~(modules < 1) & courant_ok
+
+
+def _panneau_onduleur(panneaux, onduleurs):
+    # Seuls les onduleurs à entrée PV (hybrides, réseau) reçoivent directement les panneaux
+    entree_pv = (onduleurs.hybride | onduleurs.reseau)[None, :]
+    depasse = panneaux.tension_circuit_ouvert_VOC[:, None] * MARGE_VOC > onduleurs.tension_max_PV_V[None, :]
+    return ~entree_pv | ~depasse
+
+
+def _regulateur_batterie(regulateurs, batteries):
+    return _tension_acceptee(regulateurs.tensions, batteries.tension_V)
+
+
+def _regulateur_onduleur(regulateurs, onduleurs):
+    # Un onduleur réseau n'a pas de bus batterie où brancher un contrôleur
+    return _tension_acceptee(regulateurs.tensions, onduleurs.tension_entree_DC_V) & ~onduleurs.reseau[None, :]
+
+
+def _onduleur_batterie(onduleurs, batteries):
+    entree = onduleurs.tension_entree_DC_V[:, None]
+    tension = batteries.tension_V[None, :]
+    en_serie = np.rint(entree / tension)
+    ecart = np.abs(en_serie * tension - entree)
+    inconnue = np.isnan(entree) | np.isnan(tension)
+    compatible = ((en_serie >= 1) & (ecart <= TOLERANCE_TENSION * entree)) | inconnue
+    return compatible & ~onduleurs.reseau[:, None]
+
+
+def _appareil_onduleur(appareils, onduleurs):
+    # Appareil alternatif (mode vide : alternatif) : l'onduleur doit tenir sa puissance
+    depasse = appareils.puissance_active()[:, None] > onduleurs.puissance_active()[None, :]
+    return appareils.continu[:, None] | ~depasse
+
+
+def _appareil_batterie(appareils, batteries):
+    # Appareil continu : branché sur le parc, à la même tension
+    return ~appareils.continu[:, None] | _tension_acceptee(appareils.tension_V[:, None], batteries.tension_V)
+
+
+REGLES = {
+    ('panneau', 'regulateur'): (
+        _panneau_regulateur, "VOC des modules sous la tension PV maximale et ISC sous le courant de charge",
+    ),
+    ('panneau', 'onduleur'): (_panneau_onduleur, "VOC des modules sous la tension PV maximale de l'onduleur"),
+    ('regulateur', 'batterie'): (_regulateur_batterie, "Tension de la batterie parmi les tensions du contrôleur"),
+    ('regulateur', 'onduleur'): (_regulateur_onduleur, "Tension d'entrée DC parmi les tensions du contrôleur"),
+    ('onduleur', 'batterie'): (_onduleur_batterie, "Entrée DC multiple de la tension de la batterie"),
+    ('appareil', 'onduleur'): (_appareil_onduleur, "Puissance de l'appareil alternatif sous celle de l'onduleur"),
+    ('appareil', 'batterie'): (_appareil_batterie, "Tension de l'appareil continu égale à celle de la batterie"),
+}
+
+
+def regle_entre(famille_a, famille_b):
+    """(nom, description) de la règle entre deux familles, ou None."""
+    for a, b in ((famille_a, famille_b), (famille_b, famille_a)):
+        if (a, b) in REGLES:
+            return f"{a}_{b}", REGLES[(a, b)][1]
+    return None
+
+
+def regle_applicable(famille_a, famille_b, familles_ensemble):
+    """La règle s'applique-t-elle dans un ensemble contenant ces familles ?"""
+    # Avec un contrôleur de charge, les panneaux passent par lui et non par l'onduleur
+    if {famille_a, famille_b} == {'panneau', 'onduleur'} and 'regulateur' in familles_ensemble:
+        return False
+    return regle_entre(famille_a, famille_b) is not None
+
+
+def _incompatibles(regle, a, b):
+    """Paires (id a, id b) incompatibles, règle évaluée par blocs de lignes de `a`."""
+    if not len(a) or not len(b):
+        return
+    pas = max(1, TAILLE_BLOC // len(b))
+    for debut in range(0, len(a), pas):
+        bloc = a.extraire(slice(debut, debut + pas))
+        i, j = np.nonzero(~regle(bloc, b))
+        yield from zip(bloc.ids[i].tolist(), b.ids[j].tolist())
+
+
+def paires_incompatibles(familles, cibles=None):
+    """
+    Paires incompatibles de toutes les règles ; avec `cibles` (tableau d'ids),
+    seulement la ligne et la colonne de ces équipements dans chaque matrice.
+    """
+    for (nom_a, nom_b), (regle, _) in REGLES.items():
+        if nom_a not in familles or nom_b not in familles:
+            continue
+        a, b = familles[nom_a], familles[nom_b]
+        if cibles is None:
+            yield from _incompatibles(regle, a, b)
+            continue
+        dans_a, dans_b = np.isin(a.ids, cibles), np.isin(b.ids, cibles)
+        yield from _incompatibles(regle, a.extraire(dans_a), b)
+        yield from _incompatibles(regle, a.extraire(~dans_a), b.extraire(dans_b))
+
+
+def a_recalculer(equipement):
+    """
+    Une colonne lue par les règles a-t-elle changé depuis la lecture de
+    l'équipement en base ? Oui pour un équipement qui n'a pas été lu en base.
+    """
+    chargees = getattr(equipement, '_valeurs_chargees', None)
+    if chargees is None:
+        return True
+    valeurs = equipement.__dict__
+    for champ in CHAMPS_REGLES:
+        if champ not in valeurs:
+            continue  # différé et jamais lu : inchangé
+        if champ not in chargees:
+            return True
+        # Même valeur sous un autre type ('24' pour Decimal('24.00')) : inchangée
+        if equipement._meta.get_field(champ).to_python(valeurs[champ]) != chargees[champ]:
+            return True
+    return False
+
+
+def recalculer(ids=None, modele=Equipement, modele_incompatibilite=IncompatibiliteEquipement,
+               modele_categorie=Categorie, alias='default'):
+    """
+    Recalcule les paires incompatibles : toutes, ou celles qui concernent les
+    équipements `ids` (seules leurs familles et les familles liées sont
+    chargées). Retourne le nombre de paires écrites.
+    """
+    existantes = modele_incompatibilite.objects.using(alias)
+    if ids is None:
+        familles = charger(modele, modele_categorie, alias)
+        cibles = None
+        existantes.all().delete()
+    else:
+        cibles = np.array(list(ids), dtype=np.int64)
+        noms = set()
+        for tranche in _tranches(cibles):
+            for famille in set(familles_de(tranche, modele, modele_categorie, alias).values()) - {None}:
+                noms |= {famille, *partenaires(famille)}
+        familles = charger(modele, modele_categorie, alias, noms)
+        for tranche in _tranches(cibles):
+            existantes.filter(Q(equipement_id__in=tranche) | Q(incompatible_id__in=tranche)).delete()
+
+    # Écriture par lots au fil de l'évaluation, sans liste de toute la table
+    lignes = (
+        modele_incompatibilite(equipement_id=pk_a, incompatible_id=pk_b)
+        for pk_a, pk_b in paires_incompatibles(familles, cibles)
+    )
+    nombre = 0
+    while lot := list(islice(lignes, TAILLE_LOT)):
+        existantes.bulk_create(lot)
+        nombre += len(lot)
+    return nombre
+
+
+def _tranches(cibles):
+    for i in range(0, len(cibles), TAILLE_LOT):
+        yield cibles[i:i + TAILLE_LOT].tolist()
+
+
+def verifier(ids):
+    """
+    Vérifie deux à deux un ensemble d'équipements (ids) :
+    {'valide', 'familles': {id: famille}, 'incompatibilites': [...], 'verifications'}.
+    """
+    ids = list(dict.fromkeys(ids))
+    familles = familles_de(ids)
+    presentes = set(familles.values())
+    paires = set(
+        IncompatibiliteEquipement.objects.filter(equipement_id__in=ids, incompatible_id__in=ids)
+        .values_list('equipement_id', 'incompatible_id')
+    )
+
+    incompatibilites = []
+    verifications = 0
+    for n, a in enumerate(ids):
+        for b in ids[n + 1:]:
+            famille_a, famille_b = familles.get(a), familles.get(b)
+            if not regle_applicable(famille_a, famille_b, presentes):
+                continue
+            verifications += 1
+            if (a, b) in paires or (b, a) in paires:
+                nom, description = regle_entre(famille_a, famille_b)
+                incompatibilites.append({'equipements': [a, b], 'regle': nom, 'description': description})
+    return {
+        'valide': not incompatibilites,
+        'familles': familles,
+        'incompatibilites': incompatibilites,
+        'verifications': verifications,
+    }
+
+
+def _equipements_familles(familles):
+    """Équipements actifs des familles données."""
+    filtre = Q()
+    for chemin, famille in chemins_familles():
+        if famille in familles:
+            filtre |= Categorie.filtre_descendants(chemin, 'categorie__chemin')
+    if not filtre:
+        return Equipement.objects.none()
+    return Equipement.objects.filter(filtre, actif=True)
+
+
+def _sans_incompatibles(equipements, avec):
+    """`equipements` privés de ceux qu'une paire rangée rend incompatibles avec l'un de `avec`."""
+    paires = IncompatibiliteEquipement.objects
+    return equipements.exclude(
+        pk__in=paires.filter(equipement_id__in=avec).values('incompatible_id')
+    ).exclude(
+        pk__in=paires.filter(incompatible_id__in=avec).values('equipement_id')
+    )
+
+
+def compatibles(equipement_id, famille=None):
+    """
+    Ids des équipements compatibles avec `equipement_id` : ceux des familles
+    liées par une règle (ou de `famille`), hors paires incompatibles
+    (utilisable en sous-requête).
+    """
+    liees = partenaires(familles_de([equipement_id]).get(equipement_id))
+    if famille:
+        liees &= {famille}
+    equipements = _sans_incompatibles(_equipements_familles(liees), [equipement_id])
+    return equipements.values_list('pk', flat=True)
+
+
+def alternatives(equipement_id, avec=()):
+    """
+    Ids des équipements de la même famille que `equipement_id`, compatibles avec
+    chacun des équipements `avec` auxquels une règle les lie (utilisable en sous-requête).
+    """
+    avec = [pk for pk in dict.fromkeys(avec) if pk != equipement_id]
+    familles = familles_de([equipement_id, *avec])
+    famille = familles.get(equipement_id)
+    if famille is None:
+        return Equipement.objects.none().values_list('pk', flat=True)
+
+    presentes = {familles.get(pk) for pk in avec}
+    lies = [pk for pk in avec if regle_applicable(famille, familles.get(pk), presentes)]
+    equipements = _sans_incompatibles(_equipements_familles({famille}), lies)
+    return equipements.exclude(pk=equipement_id).values_list('pk', flat=True)
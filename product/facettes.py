@@ -0,0 +1,94 @@
+"""
+Comptes d'équipements par catégorie, marque, mode et attribut promu (facettes
+de navigation).
+
+Les GROUP BY sont réunis par UNION ALL en une seule requête, sur le
+queryset déjà filtré (filtres, recherche) de la liste. Les facettes du
+catalogue complet sont rangées dans le cache sous la version des marqueurs du
+catalogue en base, commune à tous les processus, et recalculées par la
+commande d'import juste après avoir marqué ses écritures.
+"""
+from django.conf import settings
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast
+
+from .cache import cache_catalogue, version_marqueurs
+from .models import ATTRIBUTS_PROMUS, AttributEquipement, Equipement
+
+
+FACETTES = [
+    # (nom, champ regroupé, champ libellé)
+    ('categorie', 'categorie_id', 'categorie__nom'),
+    ('marque', 'marque_id', 'marque__nom'),
+    ('mode', 'mode', 'mode'),
+]
+
+
+def _groupe(queryset, nom, champ, libelle):
+    # Clé convertie en texte : les colonnes d'un UNION doivent être du même type (PostgreSQL)
+    return (
+        queryset.annotate(
+            facette=Value(nom, output_field=CharField()),
+            cle=Cast(champ, CharField()),
+            libelle=F(libelle),
+        )
+        .values('facette', 'cle', 'libelle')
+        .annotate(nombre=Count('pk'))
+        .values_list('facette', 'cle', 'libelle', 'nombre')
+    )
+
+
+def _groupe_attributs(queryset):
+    # Attributs promus lus dans la table clé/valeur, pas dans le JSON
+    return (
+        AttributEquipement.objects.filter(cle__in=list(ATTRIBUTS_PROMUS), equipement__in=queryset.values('pk'))
+        .annotate(facette=Value('attribut', output_field=CharField()), libelle=F('valeur'))
+        .values('facette', 'cle', 'libelle')
+        .annotate(nombre=Count('equipement_id', distinct=True))
+        .values_list('facette', 'cle', 'libelle', 'nombre')
+    )
+
+
+def calculer_facettes(queryset):
+    """{'total', 'categorie', 'marque', 'mode', 'attributs': {clé: [...]}} pour `queryset`."""
+    base = queryset.order_by()
+    groupes = [_groupe(base, *facette) for facette in FACETTES]
+    lignes = groupes[0].union(*groupes[1:], _groupe_attributs(base), all=True)
+
+    resultat = {nom: [] for nom, _, _ in FACETTES}
+    attributs = {}
+    for facette, cle, libelle, nombre in lignes:
+        if facette == 'attribut':
+            attributs.setdefault(cle, []).append({'valeur': libelle, 'nombre': nombre})
+        elif facette == 'mode':
+            resultat['mode'].append({'valeur': cle or None, 'nombre': nombre})
+        else:
+            resultat[facette].append({
+                'id': int(cle) if cle is not None else None,
+                'nom': libelle,
+                'nombre': nombre,
+            })
+    for valeurs in [*resultat.values(), *attributs.values()]:
+        valeurs.sort(key=lambda v: (-v['nombre'], str(v.get('nom') or v.get('valeur') or '')))
+    # Chaque équipement a exactement une catégorie
+    return {'total': sum(v['nombre'] for v in resultat['categorie']), **resultat, 'attributs': attributs}
+
+
+def cle_facettes(version=None):
+    return f"catalogue:{version or version_marqueurs()}:facettes"
+
+
+def facettes_catalogue():
+    """Facettes de tout le catalogue actif, depuis le cache de la version courante."""
+    cache = cache_catalogue()
+    cle = cle_facettes()
+    resultat = cache.get(cle)
+    if resultat is None:
+        resultat = precalculer_facettes(cle)
+    return resultat
+
+
+def precalculer_facettes(cle=None):
+    resultat = calculer_facettes(Equipement.objects.filter(actif=True))
+    cache_catalogue().set(cle or cle_facettes(), resultat, getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 3600))
+    return resultat
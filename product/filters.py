@@ -0,0 +1,145 @@
+import django_filters
+from django_filters.constants import EMPTY_VALUES
+from rest_framework.filters import SearchFilter
+
+from . import recherche
+from .models import ATTRIBUTS_PROMUS, AttributEquipement, Categorie, Equipement, expression_attribut
+from .specs import encoder_liste
+
+
+# Caractéristiques numériques filtrables par valeur exacte, intervalle ou liste :
+# ?capacite_Ah__gte=100&capacite_Ah__lte=200&tension_V=12, ?puissance_VA__range=3000,6000
+CHAMPS_NUMERIQUES = [
+    'puissance_W',
+    'puissance_VA',
+    'puissance_nominale_W',
+    'tension_V',
+    'tension_entree_DC_V',
+    'tension_sortie_AC_V',
+    'frequence_Hz',
+    'capacite_Ah',
+    'energie_Wh',
+    'efficacite_module_pourcent',
+    'tension_puissance_max_VMP',
+    'courant_puissance_max_Imp',
+    'tension_circuit_ouvert_VOC',
+    'courant_court_circuit_ISC',
+    'tension_maximale_systeme_V',
+    'rendement_pourcent',
+    'courant_charge_A',
+    'tension_max_PV_V',
+    'poids_kg',
+    # Colonnes dérivées du texte libre (product/specs.py)
+    'cycle_vie_min',
+    'cycle_vie_max',
+    'tension_systeme_min_V',
+    'tension_systeme_max_V',
+    'longueur_mm',
+    'largeur_mm',
+    'epaisseur_mm',
+    'surface_m2',
+    'temperature_min_C',
+    'temperature_max_C',
+    'tolerance_puissance_min_W',
+    'tolerance_puissance_max_W',
+]
+
+LOOKUPS_NUMERIQUES = ['exact', 'lt', 'lte', 'gt', 'gte', 'range', 'in']
+
+LOOKUPS_ATTRIBUTS = {
+    'nombre': ['exact', 'lt', 'lte', 'gt', 'gte'],
+    'texte': ['exact'],
+}
+
+
+class AttributPromuFilter(django_filters.Filter):
+    """
+    Filtre sur une clé promue de caracteristiques_additionnelles : compare
+    l'expression de son index (models.expression_attribut), pas le JSON brut.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        alias = f'attribut_{self.field_name}'
+        return qs.alias(**{alias: expression_attribut(self.field_name)}).filter(
+            **{f'{alias}__{self.lookup_expr}': value}
+        )
+
+
+class AttributPromuNombreFilter(AttributPromuFilter, django_filters.NumberFilter):
+    pass
+
+
+class AttributPromuTexteFilter(AttributPromuFilter, django_filters.CharFilter):
+    pass
+
+
+class EquipementFilter(django_filters.FilterSet):
+    # ?categorie=<id> : la catégorie et toutes ses sous-catégories (chemin matérialisé)
+    categorie = django_filters.ModelChoiceFilter(
+        queryset=Categorie.objects.all(), method='filtrer_categorie'
+    )
+    # ?tension_systeme_supportee=24 : régulateurs et onduleurs acceptant un parc de 24 V
+    tension_systeme_supportee = django_filters.NumberFilter(method='filtrer_tension_systeme')
+    # Table AttributEquipement : ?caracteristique=<phrase exacte>, ?attribut=<clé>:<valeur>
+    caracteristique = django_filters.CharFilter(method='filtrer_caracteristique')
+    attribut = django_filters.CharFilter(method='filtrer_attribut')
+
+    class Meta:
+        model = Equipement
+        fields = {
+            **{champ: LOOKUPS_NUMERIQUES for champ in CHAMPS_NUMERIQUES},
+            'mode': ['exact', 'in'],
+            'marque': ['exact', 'in'],
+            'marque__nom': ['exact', 'iexact'],
+            'type_equipement': ['exact', 'iexact'],
+        }
+
+    @classmethod
+    def get_filters(cls):
+        # ?attribut_<clé>= (et __gte, __lte... pour les nombres) par clé promue
+        filters = super().get_filters()
+        for cle, type_ in ATTRIBUTS_PROMUS.items():
+            classe = AttributPromuNombreFilter if type_ == 'nombre' else AttributPromuTexteFilter
+            for lookup in LOOKUPS_ATTRIBUTS[type_]:
+                nom = f'attribut_{cle}' if lookup == 'exact' else f'attribut_{cle}__{lookup}'
+                filters[nom] = classe(field_name=cle, lookup_expr=lookup)
+        return filters
+
+    def filtrer_categorie(self, queryset, name, value):
+        return queryset.filter(Categorie.filtre_descendants(value.chemin, 'categorie__chemin'))
+
+    def filtrer_tension_systeme(self, queryset, name, value):
+        # Bornes min/max indexées d'abord, puis appartenance à la liste encodée "/12/24/48/"
+        return queryset.filter(
+            tension_systeme_min_V__lte=value,
+            tension_systeme_max_V__gte=value,
+            tensions_systeme_V__contains=encoder_liste([value]),
+        )
+
+    def filtrer_caracteristique(self, queryset, name, value):
+        return self.filtrer_attribut(queryset, name, f'caracteristique:{value}')
+
+    def filtrer_attribut(self, queryset, name, value):
+        cle, _, valeur = value.partition(':')
+        attributs = AttributEquipement.objects.filter(cle=cle)
+        if valeur:
+            attributs = attributs.filter(valeur=valeur)
+        return queryset.filter(pk__in=attributs.values('equipement_id'))
+
+
+class RechercheEquipementFilter(SearchFilter):
+    """
+    ?search= sur l'index plein texte (voir product.recherche) : résultats annotés
+    `pertinence` et triés par pertinence décroissante, sauf ?ordering= explicite.
+    Sur un moteur sans index, comportement de SearchFilter (LIKE sur search_fields).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        texte = ' '.join(self.get_search_terms(request))
+        if not texte:
+            return queryset
+        if not recherche.disponible():
+            return super().filter_queryset(request, queryset, view)
+        return recherche.rechercher(queryset, texte)
@@ -0,0 +1,262 @@
+"""
+Lecture et normalisation des flux fournisseurs.
+
+Ce module ne dépend pas des modèles Django : il est importé tel quel par les
+processus d'analyse de `import_p --workers`.
+"""
+import hashlib
+import itertools
+import json
+import multiprocessing
+import queue
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from .specs import deriver
+
+
+# Clés JSON qui servent à résoudre les relations et ne sont pas des champs du modèle
+CLES_RELATIONS = {'categorie', 'marque', 'sous_categorie', 'type', 'modele_marque'}
+
+# Taille des blocs lus sur disque par le lecteur en flux
+TAILLE_BLOC_LECTURE = 64 * 1024
+# Taille maximale d'un produit (caractères) : au-delà, le tampon n'est plus agrandi
+TAILLE_MAX_PRODUIT = 8 * 1024 * 1024
+# Un élément tronqué échoue au plus à quelques caractères de la fin du tampon
+# ("fals", "\u00e"), sauf une chaîne non terminée ; une erreur plus tôt est définitive
+MARGE_TRONCATURE = 16
+
+# Attente maximale d'un message des analyseurs avant de vérifier qu'ils sont encore en vie (s)
+DELAI_ATTENTE = 1.0
+
+
+def as_decimal(value):
+    """Convertit en Decimal si possible, sinon retourne None."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            return None
+    if isinstance(value, str):
+        match = re.search(r'[\d.]+', value)
+        if match:
+            try:
+                return Decimal(match.group())
+            except InvalidOperation:
+                return None
+        return None
+    return None
+
+
+def normaliser_item(item, champs, decimaux):
+    """
+    Transforme un produit JSON fournisseur en enregistrement prêt à écrire.
+    Retourne None pour les lignes de titre ; ValueError si ce n'est pas un objet.
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"Produit invalide : objet JSON attendu, reçu {type(item).__name__} ({item!r:.80})")
+    if 'titre' in item:
+        return None
+
+    valeurs = {}
+    for field in champs:
+        val = item.get(field)
+        if val is not None:
+            if field in decimaux:
+                val = as_decimal(val)
+            valeurs[field] = val
+    # Colonnes numériques tirées des caractéristiques en texte libre (product/specs.py)
+    valeurs.update(deriver(valeurs))
+
+    non_importes = set(item.keys()) - {'titre'} - set(valeurs.keys()) - CLES_RELATIONS
+
+    enregistrement = {
+        'categorie': item.get('categorie', 'Inconnue'),
+        'sous_categorie': item.get('sous_categorie') or item.get('type'),
+        'marque': item.get('marque') or item.get('modele_marque'),
+        'champs': valeurs,
+        'non_importes': sorted(non_importes),
+    }
+    enregistrement['empreinte'] = empreinte(enregistrement)
+    return enregistrement
+
+
+def empreinte(enregistrement):
+    """Hash SHA-256 du contenu normalisé d'un enregistrement (relations comprises)."""
+    contenu = [
+        enregistrement['categorie'],
+        enregistrement['sous_categorie'],
+        enregistrement['marque'],
+        enregistrement['champs'],
+    ]
+    brut = json.dumps(contenu, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(brut.encode('utf-8')).hexdigest()
+
+
+def lire_produits(chemin, taille_bloc=TAILLE_BLOC_LECTURE, taille_max=TAILLE_MAX_PRODUIT):
+    """
+    Lit un fichier fournisseur produit par produit, sans le charger en entier.
+    Accepte un tableau JSON de premier niveau ou du NDJSON (un objet par ligne).
+    Lève ValueError sur un produit invalide ou de plus de `taille_max` caractères.
+    """
+    decodeur = json.JSONDecoder()
+    with open(chemin, encoding='utf-8') as f:
+        tampon = f.read(taille_bloc)
+        fin_fichier = not tampon
+        tampon = tampon.lstrip('\ufeff')  # un bloc peut ne contenir que le BOM
+
+        debut = len(tampon) - len(tampon.lstrip())
+        while debut == len(tampon) and not fin_fichier:
+            bloc = f.read(taille_bloc)
+            fin_fichier = not bloc
+            tampon += bloc
+            debut = len(tampon) - len(tampon.lstrip())
+        if debut == len(tampon):
+            return
+
+        # NDJSON : pas de crochet ouvrant, chaque ligne non vide est un produit
+        if tampon[debut] != '[':
+            reste = ''
+            for bloc in itertools.chain([tampon], iter(lambda: f.read(taille_bloc), '')):
+                *lignes, reste = (reste + bloc).split('\n')
+                for ligne in lignes:
+                    if ligne.strip():
+                        yield json.loads(ligne)
+                if len(reste) > taille_max:
+                    raise ValueError(f"{chemin}: ligne de plus de {taille_max} caractères")
+            if reste.strip():
+                yield json.loads(reste)
+            return
+
+        position = debut + 1
+        while True:
+            # Ignore les blancs et les virgules entre deux éléments
+            while True:
+                while position < len(tampon) and tampon[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(tampon) or fin_fichier:
+                    break
+                bloc = f.read(taille_bloc)
+                fin_fichier = not bloc
+                tampon = tampon[position:] + bloc
+                position = 0
+
+            if position >= len(tampon):
+                raise ValueError(f"{chemin}: tableau JSON non terminé")
+            if tampon[position] == ']':
+                return
+
+            try:
+                item, fin = decodeur.raw_decode(tampon, position)
+            except json.JSONDecodeError as exc:
+                if exc.pos < len(tampon) - MARGE_TRONCATURE and not exc.msg.startswith('Unterminated string'):
+                    raise ValueError(f"{chemin}: JSON invalide vers la position {position} ({exc.msg})")
+                item, fin = None, None
+            # Un élément qui touche la fin du tampon peut être tronqué : on relit un bloc
+            if fin is None or (fin == len(tampon) and not fin_fichier):
+                if fin_fichier:
+                    raise ValueError(f"{chemin}: JSON invalide vers la position {position}")
+                if len(tampon) - position > taille_max:
+                    raise ValueError(f"{chemin}: produit de plus de {taille_max} caractères vers la position {position}")
+                bloc = f.read(taille_bloc)
+                fin_fichier = not bloc
+                tampon = tampon[position:] + bloc
+                position = 0
+                continue
+
+            yield item
+            position = fin
+
+
+def analyser_fichier(chemin, champs, decimaux, file_attente, taille_lot):
+    """
+    Tâche exécutée dans un processus d'analyse : lit et normalise un fichier,
+    puis envoie les enregistrements par lots à l'écrivain via `file_attente`.
+    """
+    debut = time.perf_counter()
+    nombre = 0
+    lot = []
+    try:
+        for item in lire_produits(chemin):
+            enregistrement = normaliser_item(item, champs, decimaux)
+            if enregistrement is None:
+                continue
+            lot.append(enregistrement)
+            nombre += 1
+            if len(lot) >= taille_lot:
+                file_attente.put(('lot', chemin, lot))
+                lot = []
+        if lot:
+            file_attente.put(('lot', chemin, lot))
+    except (OSError, ValueError) as exc:
+        file_attente.put(('erreur', chemin, str(exc)))
+        return
+    except Exception as exc:
+        # Toute autre erreur doit aussi parvenir à l'écrivain, qui attend sinon un 'fin'
+        file_attente.put(('erreur', chemin, f"{type(exc).__name__}: {exc}"))
+        return
+    file_attente.put(('fin', chemin, nombre, time.perf_counter() - debut))
+
+
+def analyser_en_parallele(fichiers, champs, decimaux, travailleurs, taille_lot, progression=None):
+    """
+    Analyse `fichiers` dans un pool de `travailleurs` processus et produit les
+    couples (chemin, enregistrement normalisé) au fil de l'eau, dans le processus
+    appelant qui reste le seul à écrire en base.
+
+    `progression(evenement, chemin, *details)` est appelé à chaque lot reçu
+    ('lot', chemin, nombre) et à la fin de chaque fichier ('fin', chemin, nombre, duree).
+    """
+    progression = progression or (lambda *args: None)
+    manager = multiprocessing.Manager()
+    # File bornée : les analyseurs attendent si l'écrivain prend du retard
+    file_attente = manager.Queue(maxsize=travailleurs * 4)
+    pool = ProcessPoolExecutor(max_workers=travailleurs)
+    taches = []
+    termine = False
+    try:
+        taches = [
+            pool.submit(analyser_fichier, chemin, champs, decimaux, file_attente, taille_lot)
+            for chemin in fichiers
+        ]
+        restants = len(taches)
+        recus = {chemin: 0 for chemin in fichiers}
+        while restants:
+            try:
+                message = file_attente.get(timeout=DELAI_ATTENTE)
+            except queue.Empty:
+                # Un analyseur mort (processus tué, pool cassé) n'enverra jamais son 'fin'
+                for tache in taches:
+                    if tache.done() and tache.exception() is not None:
+                        exc = tache.exception()
+                        raise ValueError(f"Processus d'analyse arrêté : {type(exc).__name__}: {exc}")
+                continue
+            evenement, chemin = message[0], message[1]
+            if evenement == 'lot':
+                recus[chemin] += len(message[2])
+                progression('lot', chemin, recus[chemin])
+                for enregistrement in message[2]:
+                    yield chemin, enregistrement
+            elif evenement == 'fin':
+                restants -= 1
+                progression('fin', chemin, message[2], message[3])
+            else:
+                raise ValueError(message[2])
+        for tache in taches:
+            tache.result()
+        termine = True
+    finally:
+        if termine:
+            pool.shutdown(wait=True)
+            manager.shutdown()
+        else:
+            # Arrêt anticipé (erreur d'analyse ou d'écriture) : couper la file débloque
+            # les analyseurs en attente sur put() avant d'attendre la fin du pool.
+            for tache in taches:
+                tache.cancel()
+            manager.shutdown()
+            pool.shutdown(wait=True)
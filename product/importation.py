@@ -0,0 +1,224 @@
+import time
+
+from django.db import models, transaction
+
+from . import attributs, compatibilite, lecture, recherche
+from .models import Categorie, Marque, Equipement, EquipementLecture
+from .specs import CHAMPS_DERIVES
+
+
+# Limite du nombre de paramètres par requête `IN (...)` (SQLite en accepte 999 sur les anciennes versions)
+TAILLE_REQUETE_IN = 500
+
+# Champs tenus par l'import lui-même, jamais lus depuis le flux fournisseur
+CHAMPS_INTERNES = {'empreinte_source', 'source_import', 'actif'}
+
+
+def champs_importables():
+    """Retourne (noms des champs importables, noms des champs décimaux) d'Equipement."""
+    champs = []
+    decimaux = set()
+    for field in Equipement._meta.get_fields():
+        if not field.concrete or field.auto_created or field.name == 'id':
+            continue
+        if field.name in ('categorie', 'marque') or field.name in CHAMPS_INTERNES or field.name in CHAMPS_DERIVES:
+            continue
+        champs.append(field.name)
+        if isinstance(field, (models.DecimalField, models.FloatField)):
+            decimaux.add(field.name)
+    return champs, decimaux
+
+
+def par_tranches(valeurs, taille=TAILLE_REQUETE_IN):
+    valeurs = list(valeurs)
+    for i in range(0, len(valeurs), taille):
+        yield valeurs[i:i + taille]
+
+
+class ImportateurCatalogue:
+    """
+    Écrit des enregistrements normalisés (voir `normaliser_item`) par lots :
+    catégories et marques sont chargées une seule fois en mémoire, les équipements
+    existants sont retrouvés par leur clé naturelle (nom, categorie, marque) et
+    l'écriture passe par bulk_create / bulk_update, le tout dans une transaction.
+
+    Les lignes dont l'empreinte n'a pas changé depuis le dernier import ne sont
+    pas réécrites (ni réindexées pour la recherche plein texte). Chaque ligne écrite
+    retient le flux d'origine (`source`) ; avec `retirer_absents`, les équipements
+    importés précédemment depuis ce même flux mais absents du passage sont
+    désactivés (actif=False) plutôt que supprimés.
+    """
+
+    def __init__(self, taille_lot=500, simulation=False, retirer_absents=False, journal=None, source=''):
+        self.taille_lot = taille_lot
+        self.source = source
+        self.simulation = simulation
+        self.retirer_absents = retirer_absents
+        self.journal = journal or (lambda message: None)
+        self.categories = {}
+        self.marques = {}
+        self.vus = set()
+        self.ecrits = set()  # créés, mis à jour ou retirés par ce passage
+        self.compteurs = {
+            'crees': 0,
+            'mis_a_jour': 0,
+            'inchanges': 0,
+            'retires': 0,
+            'ignores': 0,
+            'categories_creees': 0,
+            'marques_creees': 0,
+            'paires_incompatibles': None,  # None : table de compatibilité non recalculée
+        }
+        self.duree = 0.0
+
+    def executer(self, enregistrements):
+        debut = time.perf_counter()
+        with transaction.atomic():
+            self.categories = {c.nom: c for c in Categorie.objects.all()}
+            self.marques = {m.nom: m for m in Marque.objects.all()}
+
+            lot = []
+            for enregistrement in enregistrements:
+                lot.append(enregistrement)
+                if len(lot) >= self.taille_lot:
+                    self._ecrire_lot(lot)
+                    lot = []
+            if lot:
+                self._ecrire_lot(lot)
+
+            if self.retirer_absents:
+                self._retirer_absents()
+
+            # Paires incompatibles recalculées en une passe, pour les seuls équipements écrits
+            if self.ecrits:
+                self.compteurs['paires_incompatibles'] = compatibilite.recalculer(self.ecrits)
+
+            if self.simulation:
+                transaction.set_rollback(True)
+        self.duree = time.perf_counter() - debut
+        return self.compteurs
+
+    def _resoudre_categories(self, lot):
+        racines = {e['categorie'] for e in lot} - set(self.categories)
+        if racines:
+            nouvelles = Categorie.objects.bulk_create([Categorie(nom=nom) for nom in sorted(racines)])
+            self._fixer_chemins(nouvelles)
+
+        sous = {}
+        for e in lot:
+            nom = e['sous_categorie']
+            if nom and nom not in self.categories:
+                sous.setdefault(nom, self.categories[e['categorie']])
+        if sous:
+            nouvelles = Categorie.objects.bulk_create(
+                [Categorie(nom=nom, parent=parent) for nom, parent in sous.items()]
+            )
+            self._fixer_chemins(nouvelles)
+
+    def _fixer_chemins(self, nouvelles):
+        # bulk_create ne passe pas par Categorie.save() : le chemin matérialisé est posé ici
+        for categorie in nouvelles:
+            categorie.chemin = Categorie.chemin_pour(categorie.pk, categorie.parent.chemin if categorie.parent else None)
+            categorie.profondeur = categorie.chemin.count('/') - 2
+        Categorie.objects.bulk_update(nouvelles, ['chemin', 'profondeur'])
+        self.categories.update({c.nom: c for c in nouvelles})
+        self.compteurs['categories_creees'] += len(nouvelles)
+
+    def _resoudre_marques(self, lot):
+        noms = {e['marque'] for e in lot if e['marque']} - set(self.marques)
+        if noms:
+            nouvelles = Marque.objects.bulk_create([Marque(nom=nom) for nom in sorted(noms)])
+            self.marques.update({m.nom: m for m in nouvelles})
+            self.compteurs['marques_creees'] += len(nouvelles)
+
+    def _ecrire_lot(self, lot):
+        valides = []
+        for e in lot:
+            if not e['champs'].get('nom'):
+                self.compteurs['ignores'] += 1
+                continue
+            valides.append(e)
+        if not valides:
+            return
+
+        self._resoudre_categories(valides)
+        self._resoudre_marques(valides)
+
+        # Clé naturelle -> enregistrement ; en cas de doublon dans le lot, le dernier l'emporte
+        par_cle = {}
+        for e in valides:
+            categorie = self.categories[e['sous_categorie'] or e['categorie']]
+            marque = self.marques.get(e['marque']) if e['marque'] else None
+            cle = (e['champs']['nom'], categorie.pk, marque.pk if marque else None)
+            par_cle[cle] = e
+
+        # Première passe légère : identifiant, empreinte et statut des lignes existantes
+        existants = {}
+        for noms in par_tranches({cle[0] for cle in par_cle}):
+            lignes = Equipement.objects.filter(nom__in=noms).values_list(
+                'id', 'nom', 'categorie_id', 'marque_id', 'empreinte_source', 'source_import', 'actif'
+            )
+            for pk, nom, categorie_id, marque_id, empreinte_source, source_import, actif in lignes:
+                existants.setdefault((nom, categorie_id, marque_id), (pk, empreinte_source, source_import, actif))
+
+        a_creer = []
+        modifies = {}
+        for cle, e in par_cle.items():
+            nom, categorie_id, marque_id = cle
+            existant = existants.get(cle)
+            if existant is None:
+                a_creer.append(Equipement(
+                    categorie_id=categorie_id, marque_id=marque_id,
+                    empreinte_source=e['empreinte'], source_import=self.source, **e['champs']
+                ))
+                self.journal(f"Créé équipement: {nom}")
+                continue
+
+            pk, empreinte_source, source_import, actif = existant
+            self.vus.add(pk)
+            if empreinte_source == e['empreinte'] and source_import == self.source and actif:
+                self.compteurs['inchanges'] += 1
+            else:
+                modifies[pk] = e
+
+        # Seconde passe : chargement complet des seules lignes qui ont changé
+        a_mettre_a_jour = []
+        champs_modifies = {'empreinte_source', 'source_import', 'actif'}
+        for pks in par_tranches(modifies):
+            for equip in Equipement.objects.filter(pk__in=pks):
+                e = modifies[equip.pk]
+                for field, val in e['champs'].items():
+                    setattr(equip, field, val)
+                equip.empreinte_source = e['empreinte']
+                equip.source_import = self.source
+                equip.actif = True
+                champs_modifies.update(e['champs'])
+                a_mettre_a_jour.append(equip)
+                self.journal(f"Mis à jour équipement: {equip.nom}")
+
+        if a_creer:
+            Equipement.objects.bulk_create(a_creer, batch_size=self.taille_lot)
+            self.vus.update(equip.pk for equip in a_creer)
+        if a_mettre_a_jour:
+            Equipement.objects.bulk_update(a_mettre_a_jour, sorted(champs_modifies), batch_size=self.taille_lot)
+        # bulk_create / bulk_update n'émettent pas de signaux : index plein texte,
+        # attributs et modèle de lecture suivent ici
+        ecrits = [equip.pk for equip in a_creer + a_mettre_a_jour]
+        self.ecrits.update(ecrits)
+        recherche.indexer(ecrits)
+        attributs.synchroniser(ecrits)
+        lecture.rafraichir(ecrits)
+
+        self.compteurs['crees'] += len(a_creer)
+        self.compteurs['mis_a_jour'] += len(a_mettre_a_jour)
+
+    def _retirer_absents(self):
+        # Seuls les équipements issus d'un import (empreinte renseignée) depuis le même
+        # flux sont concernés : les fiches saisies à la main dans l'admin et celles des
+        # autres fournisseurs ne sont jamais retirées.
+        importes = Equipement.objects.filter(actif=True, source_import=self.source).exclude(empreinte_source='')
+        absents = set(importes.values_list('id', flat=True)) - self.vus
+        self.ecrits.update(absents)
+        for pks in par_tranches(absents):
+            self.compteurs['retires'] += Equipement.objects.filter(pk__in=pks).update(actif=False)
+            EquipementLecture.objects.filter(equipement_id__in=pks).update(actif=False)
@@ -0,0 +1,102 @@
+"""
+Modèle de lecture dénormalisé du catalogue (EquipementLecture).
+
+Chaque équipement y a une ligne avec son chemin de catégorie, sa marque, son nom
+d'affichage et son document JSON compact (champs vides omis), rendu une fois à
+l'écriture. La liste en flux (`/equipements/flux/`) ne fait plus que concaténer
+ces documents.
+
+Rafraîchi dans la transaction de l'écriture : par les signaux du catalogue
+(équipement, renommage ou déplacement de catégorie, marque) et par lots par
+l'import. `reconstruire()` (commande `rafraichir_lecture`) repart de zéro.
+"""
+from rest_framework.renderers import JSONRenderer
+
+from .models import Categorie, Equipement, EquipementLecture
+from .serializers import EquipementSerializer
+
+
+TAILLE_LOT = 500
+
+# Taille des paquets de documents lus en base par la liste en flux
+TAILLE_LOT_FLUX = 2000
+# Documents envoyés ensemble dans un même morceau de la réponse
+TAILLE_PAQUET_FLUX = 200
+
+SEPARATEUR_CHEMIN = ' > '
+
+
+def chemin_affiche(chemin, noms):
+    """"/1/5/" -> "Solaire > Batterie" à partir d'un dict id -> nom."""
+    ids = [int(i) for i in chemin.strip('/').split('/') if i]
+    return SEPARATEUR_CHEMIN.join(noms.get(pk, '?') for pk in ids)
+
+
+def compacter(valeur):
+    """Retire récursivement les valeurs None et les chaînes vides."""
+    if isinstance(valeur, dict):
+        return {cle: compacter(v) for cle, v in valeur.items() if v is not None and v != ''}
+    if isinstance(valeur, list):
+        return [compacter(v) for v in valeur]
+    return valeur
+
+
+def lignes_lecture(equipements, noms_categories):
+    rendu = JSONRenderer()
+    # La catégorie imbriquée est réduite à id/nom/chemin : son sous-arbre (`enfants`)
+    # changerait à chaque ajout de catégorie et n'a pas sa place dans un document figé.
+    donnees = EquipementSerializer(equipements, many=True, exclus=['categorie']).data
+    for equip, donnee in zip(equipements, donnees):
+        chemin = chemin_affiche(equip.categorie.chemin, noms_categories)
+        document = compacter(dict(donnee))
+        document['categorie'] = {
+            'id': equip.categorie_id,
+            'nom': equip.categorie.nom,
+            'chemin': equip.categorie.chemin,
+        }
+        document['chemin_categorie'] = chemin
+        marque = equip.marque.nom if equip.marque else ''
+        yield EquipementLecture(
+            equipement_id=equip.pk,
+            categorie_chemin=equip.categorie.chemin,
+            chemin_categorie=chemin,
+            marque_nom=marque,
+            nom_affiche=f"{equip.nom} ({marque})" if marque else equip.nom,
+            actif=equip.actif,
+            document=rendu.render(document).decode('utf-8'),
+        )
+
+
+def rafraichir(ids):
+    """Réécrit les lignes de lecture des équipements donnés (celles des supprimés disparaissent)."""
+    ids = list(ids)
+    if not ids:
+        return
+    noms_categories = dict(Categorie.objects.values_list('id', 'nom'))
+    for i in range(0, len(ids), TAILLE_LOT):
+        tranche = ids[i:i + TAILLE_LOT]
+        EquipementLecture.objects.filter(equipement_id__in=tranche).delete()
+        equipements = list(Equipement.objects.select_related('categorie', 'marque').filter(pk__in=tranche))
+        EquipementLecture.objects.bulk_create(lignes_lecture(equipements, noms_categories), batch_size=TAILLE_LOT)
+
+
+def reconstruire():
+    EquipementLecture.objects.all().delete()
+    ids = list(Equipement.objects.order_by('pk').values_list('pk', flat=True))
+    rafraichir(ids)
+    return len(ids)
+
+
+def flux_json(queryset):
+    """Tableau JSON des documents de `queryset` (EquipementLecture), produit par morceaux."""
+    yield '['
+    paquet = []
+    separateur = ''
+    for document in queryset.values_list('document', flat=True).iterator(chunk_size=TAILLE_LOT_FLUX):
+        paquet.append(document)
+        if len(paquet) >= TAILLE_PAQUET_FLUX:
+            yield separateur + ','.join(paquet)
+            paquet, separateur = [], ','
+    if paquet:
+        yield separateur + ','.join(paquet)
+    yield ']'
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product import compatibilite
+
+
+class Command(BaseCommand):
+    help = "Recalcule la table des paires d'équipements électriquement incompatibles"
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        with transaction.atomic():
+            nombre = compatibilite.recalculer()
+        self.stdout.write(self.style.SUCCESS(
+            f"Compatibilités recalculées: {nombre} paires incompatibles en {time.perf_counter() - debut:.2f} s."
+        ))
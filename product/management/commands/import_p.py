@@ -1,130 +1,155 @@
-import json
+import glob
 import os
-import re
-from decimal import Decimal, InvalidOperation
-from django.core.management.base import BaseCommand
-from django.apps import apps
-from django.db import models
-
-
-def as_decimal(value):
-    """Convertit en Decimal si possible, sinon retourne None."""
-    if value is None:
-        return None
-    if isinstance(value, (int, float, Decimal)):
-        try:
-            return Decimal(value)
-        except InvalidOperation:
-            return None
-    if isinstance(value, str):
-        match = re.search(r'[\d.]+', value)
-        if match:
-            try:
-                return Decimal(match.group())
-            except InvalidOperation:
-                return None
-        return None
-    return None
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+from product.cache import marquer_modification
+from product.facettes import precalculer_facettes
+from product.flux import analyser_en_parallele, lire_produits, normaliser_item
+from product.importation import ImportateurCatalogue, champs_importables
+
+# Fichiers livrés avec la commande, importés quand aucun fichier n'est donné
+FICHIERS_PAR_DEFAUT = [
+    "produits_solaire.json",
+    "produits_appareils.json",
+]
 
 
 class Command(BaseCommand):
-    help = "Importe les équipements depuis fichiers JSON dans le répertoire de la commande"
+    help = "Importe les équipements depuis des fichiers JSON ou NDJSON (par défaut ceux du répertoire de la commande)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fichiers', nargs='*',
+            help="Fichiers ou motifs glob à importer (ex: 'flux/*.ndjson')",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Nombre d'équipements écrits par requête bulk (défaut: 500)",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Exécute l'import puis annule la transaction, sans rien écrire",
+        )
+        parser.add_argument(
+            '--retire-missing', action='store_true',
+            help="Désactive (actif=False) les équipements importés depuis le même --source absents des fichiers fournis",
+        )
+        parser.add_argument(
+            '--source', default='',
+            help="Nom du flux fournisseur, retenu sur chaque équipement écrit (défaut: aucun)",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Nombre de processus d'analyse des fichiers ; l'écriture reste dans un seul processus (défaut: 1)",
+        )
 
     def handle(self, *args, **options):
+        if len(options['source']) > 100:
+            raise CommandError("--source : 100 caractères au plus")
         self.stdout.write("Début d'import des produits JSON...")
 
         base_dir = os.path.dirname(os.path.abspath(__file__))
 
-        fichiers = [
-            "produits_solaire.json",
-            "produits_appareils.json",
-        ]
-
-        Equipement = apps.get_model('product', 'Equipement')
-        Categorie = apps.get_model('product', 'Categorie')
-        Marque = apps.get_model('product', 'Marque')
-
-        model_fields = [
-            f.name for f in Equipement._meta.get_fields()
-            if f.concrete and not f.auto_created and f.name != 'id'
-        ]
-
-        def importer_fichier(nom_fichier):
-            chemin = os.path.join(base_dir, nom_fichier)
-            self.stdout.write(f"Import depuis {nom_fichier}...")
-
-            with open(chemin, encoding='utf-8') as f:
-                data = json.load(f)
-
-            count_created = 0
-            count_updated = 0
-
-            for item in data:
-                if 'titre' in item:
-                    continue
-
-                root_cat, _ = Categorie.objects.get_or_create(nom=item.get('categorie', 'Inconnue'), parent=None)
-                sub_cat_nom = item.get('sous_categorie') or item.get('type')
-                if sub_cat_nom:
-                    sub_cat, _ = Categorie.objects.get_or_create(nom=sub_cat_nom, parent=root_cat)
-                else:
-                    sub_cat = root_cat
-
-                marque_nom = item.get('marque') or item.get('modele_marque')
-                marque_obj = None
-                if marque_nom:
-                    marque_obj, _ = Marque.objects.get_or_create(nom=marque_nom)
-
-                equip_data = {
-                    'categorie': sub_cat,
-                    'marque': marque_obj,
-                }
-
-                for field in model_fields:
-                    if field in ['categorie', 'marque']:
-                        continue
-                    val = item.get(field)
-                    if val is not None:
-                        db_field = Equipement._meta.get_field(field)
-                        if isinstance(db_field, (models.DecimalField, models.FloatField)):
-                            val = as_decimal(val)
-                        equip_data[field] = val
-
-                json_fields = set(item.keys()) - {'titre'}
-                unmapped_fields = json_fields - set(equip_data.keys()) - {'categorie', 'marque', 'sous_categorie', 'type', 'modele_marque'}
-                if unmapped_fields:
+        fichiers = []
+        if options['fichiers']:
+            for motif in options['fichiers']:
+                correspondances = sorted(glob.glob(motif, recursive=True))
+                if not correspondances:
+                    raise CommandError(f"Aucun fichier ne correspond à '{motif}'")
+                fichiers.extend(c for c in correspondances if c not in fichiers)
+        else:
+            fichiers = [os.path.join(base_dir, nom) for nom in FICHIERS_PAR_DEFAUT]
+
+        champs, decimaux = champs_importables()
+        verbeux = options['verbosity'] >= 2
+
+        def afficher_debit(chemin, nombre, duree):
+            debit = nombre / duree if duree else 0
+            self.stdout.write(
+                f"{os.path.basename(chemin)}: {nombre} produits analysés en {duree:.2f} s ({debit:.0f} produits/s)."
+            )
+
+        def progression(evenement, chemin, nombre, duree=None):
+            if evenement == 'fin':
+                afficher_debit(chemin, nombre, duree)
+            elif verbeux:
+                self.stdout.write(f"{os.path.basename(chemin)}: {nombre} produits reçus...")
+
+        def lire_fichiers():
+            for chemin in fichiers:
+                self.stdout.write(f"Import depuis {os.path.basename(chemin)}...")
+                debut = time.perf_counter()
+                nombre = 0
+                for item in lire_produits(chemin):
+                    enregistrement = normaliser_item(item, champs, decimaux)
+                    if enregistrement is not None:
+                        nombre += 1
+                        yield chemin, enregistrement
+                afficher_debit(chemin, nombre, time.perf_counter() - debut)
+
+        def enregistrements(source):
+            for chemin, enregistrement in source:
+                nom = enregistrement['champs'].get('nom')
+                if enregistrement['non_importes']:
                     self.stdout.write(self.style.WARNING(
-                        f"Champs JSON non importés pour '{equip_data.get('nom', 'Sans nom')}': {', '.join(unmapped_fields)}"
+                        f"Champs JSON non importés pour '{nom or 'Sans nom'}': {', '.join(enregistrement['non_importes'])}"
                     ))
 
-                if 'nom' not in equip_data or not equip_data['nom']:
-                    self.stdout.write(self.style.ERROR(f"Équipement sans 'nom' ignoré dans {nom_fichier}"))
+                if not nom:
+                    self.stdout.write(self.style.ERROR(
+                        f"Équipement sans 'nom' ignoré dans {os.path.basename(chemin)}"
+                    ))
                     continue
 
-                equip, created = Equipement.objects.update_or_create(
-                    nom=equip_data['nom'],
-                    categorie=equip_data['categorie'],
-                    marque=equip_data.get('marque'),
-                    defaults=equip_data
-                )
-
-                if created:
-                    count_created += 1
-                    self.stdout.write(self.style.SUCCESS(f"Créé équipement: {equip.nom}"))
-                else:
-                    count_updated += 1
-                    self.stdout.write(f"Mis à jour équipement: {equip.nom}")
-
-            return count_created, count_updated
-
-        total_created = 0
-        total_updated = 0
-
-        for f in fichiers:
-            c, u = importer_fichier(f)
-            total_created += c
-            total_updated += u
-
+                yield enregistrement
+
+        if options['workers'] > 1:
+            self.stdout.write(f"Analyse de {len(fichiers)} fichier(s) avec {options['workers']} processus...")
+            source = analyser_en_parallele(
+                fichiers, champs, decimaux, options['workers'], options['batch_size'], progression
+            )
+        else:
+            source = lire_fichiers()
+
+        importateur = ImportateurCatalogue(
+            taille_lot=options['batch_size'],
+            simulation=options['dry_run'],
+            retirer_absents=options['retire_missing'],
+            source=options['source'],
+            journal=self.stdout.write if verbeux else None,
+        )
+        try:
+            compteurs = importateur.executer(enregistrements(source))
+        except ValueError as exc:
+            raise CommandError(f"Import annulé : {exc}")
+
+        # Les écritures bulk ne déclenchent pas les signaux : invalidation explicite
+        if not options['dry_run']:
+            tables = []
+            if compteurs['crees'] or compteurs['mis_a_jour'] or compteurs['retires']:
+                tables.append('equipement')
+            if compteurs['categories_creees']:
+                tables.append('categorie')
+            if compteurs['marques_creees']:
+                tables.append('marque')
+            if tables:
+                marquer_modification(*tables)
+                # La page d'accueil du catalogue lit ces facettes : calculées une fois ici
+                precalculer_facettes()
+
+        duree = importateur.duree
+        total = compteurs['crees'] + compteurs['mis_a_jour'] + compteurs['inchanges']
+        debit = total / duree if duree else 0
+        self.stdout.write(
+            f"Catégories créées: {compteurs['categories_creees']}, marques créées: {compteurs['marques_creees']}."
+        )
+        if compteurs['paires_incompatibles'] is not None:
+            self.stdout.write(f"Paires incompatibles recalculées: {compteurs['paires_incompatibles']}.")
+        self.stdout.write(f"Durée: {duree:.2f} s ({debit:.0f} équipements/s).")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Mode --dry-run : transaction annulée, aucune donnée écrite."))
         self.stdout.write(self.style.SUCCESS(
-            f"Import terminé. Équipements créés: {total_created}, mis à jour: {total_updated}."
+            f"Import terminé. Équipements créés: {compteurs['crees']}, mis à jour: {compteurs['mis_a_jour']}, "
+            f"inchangés: {compteurs['inchanges']}, retirés: {compteurs['retires']}."
         ))
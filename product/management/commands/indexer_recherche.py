@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from product import recherche
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index plein texte des équipements"
+
+    def handle(self, *args, **options):
+        if not recherche.disponible():
+            self.stdout.write(self.style.WARNING("Moteur de base sans index plein texte : rien à faire."))
+            return
+        nombre = recherche.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"Index plein texte reconstruit: {nombre} équipements."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product import lecture
+from product.cache import marquer_modification
+from product.models import Equipement
+from product.specs import CHAMPS_DERIVES
+
+
+class Command(BaseCommand):
+    help = "Recalcule les colonnes numériques dérivées des caractéristiques en texte libre (cycles, tensions, dimensions...)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Nombre d'équipements relus et écrits par lot (défaut: 500)",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Compte les équipements à corriger sans rien écrire",
+        )
+
+    def handle(self, *args, **options):
+        taille_lot = options['batch_size']
+        corriges = 0
+        total = 0
+        with transaction.atomic():
+            a_ecrire = []
+            for equip in Equipement.objects.order_by('pk').iterator(chunk_size=taille_lot):
+                total += 1
+                if equip.normaliser_specs():
+                    a_ecrire.append(equip)
+                if len(a_ecrire) >= taille_lot:
+                    corriges += self.ecrire(a_ecrire, options['dry_run'])
+                    a_ecrire = []
+            corriges += self.ecrire(a_ecrire, options['dry_run'])
+
+        if corriges and not options['dry_run']:
+            marquer_modification('equipement')
+
+        message = f"Spécifications normalisées: {corriges} équipements corrigés sur {total}."
+        if options['dry_run']:
+            message += " (--dry-run : rien n'a été écrit)"
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def ecrire(self, equipements, simulation):
+        if equipements and not simulation:
+            Equipement.objects.bulk_update(equipements, CHAMPS_DERIVES)
+            lecture.rafraichir([equip.pk for equip in equipements])
+        return len(equipements)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product import lecture
+
+
+class Command(BaseCommand):
+    help = "Reconstruit le modèle de lecture dénormalisé des équipements (liste en flux)"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            nombre = lecture.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"Modèle de lecture reconstruit: {nombre} équipements."))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipement',
+            name='actif',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='empreinte_source',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='source_import',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
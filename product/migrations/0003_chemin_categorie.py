@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+def remplir_chemins(apps, schema_editor):
+    Categorie = apps.get_model('product', 'Categorie')
+    categories = list(Categorie.objects.all())
+    par_parent = {}
+    for categorie in categories:
+        par_parent.setdefault(categorie.parent_id, []).append(categorie)
+
+    a_traiter = [(categorie, '/') for categorie in par_parent.get(None, [])]
+    while a_traiter:
+        categorie, prefixe = a_traiter.pop()
+        categorie.chemin = f"{prefixe}{categorie.pk}/"
+        categorie.profondeur = categorie.chemin.count('/') - 2
+        a_traiter.extend((enfant, categorie.chemin) for enfant in par_parent.get(categorie.pk, []))
+
+    Categorie.objects.bulk_update(categories, ['chemin', 'profondeur'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_suivi_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorie',
+            name='chemin',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='categorie',
+            name='profondeur',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(remplir_chemins, migrations.RunPython.noop),
+    ]
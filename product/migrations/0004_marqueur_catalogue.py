@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_chemin_categorie'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarqueurCatalogue',
+            fields=[
+                ('table', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('modifie_le', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
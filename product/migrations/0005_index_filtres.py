@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_marqueur_catalogue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['categorie', 'tension_V', 'capacite_Ah'], name='equip_cat_tension_capa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['categorie', 'mode', 'puissance_VA'], name='equip_cat_mode_va_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['categorie', 'puissance_W'], name='equip_cat_puissance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['tension_V', 'capacite_Ah'], name='equip_tension_capa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['mode', 'puissance_VA'], name='equip_mode_va_idx'),
+        ),
+    ]
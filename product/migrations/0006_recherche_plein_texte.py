@@ -0,0 +1,97 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Copie figée de product/recherche.py à la date de la migration
+TABLE_INDEX = 'product_equipement_fts'
+COLONNES = [
+    ('nom', 'nom'),
+    ('type_equipement', 'type_equipement'),
+    ('marque', 'marque__nom'),
+    ('categorie', 'categorie__nom'),
+    ('description', 'description'),
+]
+POIDS_TSVECTOR = ('A', 'B', 'B', 'C', 'D')
+MOTEURS = ('sqlite', 'postgresql')
+TAILLE_LOT_INDEX = 500
+
+_MOT = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def tokens_document(texte):
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    sans_accents = ''.join(c for c in decompose if not unicodedata.combining(c))
+    tokens = []
+    for mot in _MOT.findall(sans_accents.lower().replace('_', '-')):
+        morceaux = mot.split('-')
+        if len(morceaux) > 1:
+            tokens.append(''.join(morceaux))
+        tokens.extend(morceaux)
+    return ' '.join(tokens)
+
+
+def remplir_index(schema_editor, Equipement):
+    connexion = schema_editor.connection
+    if connexion.vendor == 'sqlite':
+        colonnes = ', '.join(nom for nom, _ in COLONNES)
+        marques = ', '.join(['%s'] * (len(COLONNES) + 1))
+        insertion = f"INSERT INTO {TABLE_INDEX} (rowid, {colonnes}) VALUES ({marques})"
+    else:
+        vecteur = ' || '.join(f"setweight(to_tsvector('simple', %s), '{lettre}')" for lettre in POIDS_TSVECTOR)
+        insertion = f"INSERT INTO {TABLE_INDEX} (equipement_id, document) VALUES (%s, {vecteur})"
+
+    lignes = (
+        Equipement.objects.using(connexion.alias).order_by('pk')
+        .values_list('id', *[source for _, source in COLONNES])
+    )
+    lot = []
+    with connexion.cursor() as cursor:
+        for ligne in lignes.iterator(chunk_size=TAILLE_LOT_INDEX):
+            lot.append([ligne[0], *[tokens_document(valeur) for valeur in ligne[1:]]])
+            if len(lot) >= TAILLE_LOT_INDEX:
+                cursor.executemany(insertion, lot)
+                lot = []
+        if lot:
+            cursor.executemany(insertion, lot)
+
+
+def creer_index(apps, schema_editor):
+    connexion = schema_editor.connection
+    if connexion.vendor == 'sqlite':
+        colonnes = ', '.join(nom for nom, _ in COLONNES)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE_INDEX} "
+            f"USING fts5({colonnes}, tokenize='unicode61 remove_diacritics 2')"
+        )
+    elif connexion.vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE_INDEX} ("
+            "equipement_id bigint PRIMARY KEY REFERENCES product_equipement (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TABLE_INDEX}_document_idx "
+            f"ON {TABLE_INDEX} USING gin (document)"
+        )
+    else:
+        return
+    schema_editor.execute(f"DELETE FROM {TABLE_INDEX}")
+    remplir_index(schema_editor, apps.get_model('product', 'Equipement'))
+
+
+def supprimer_index(apps, schema_editor):
+    if schema_editor.connection.vendor in MOTEURS:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_index_filtres'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_recherche_plein_texte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipement',
+            name='cycle_vie_max',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='cycle_vie_min',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='epaisseur_mm',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='largeur_mm',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='longueur_mm',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='surface_m2',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='temperature_max_C',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='temperature_min_C',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='tension_systeme_max_V',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='tension_systeme_min_V',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='tensions_systeme_V',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='tolerance_puissance_max_W',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipement',
+            name='tolerance_puissance_min_W',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['categorie', 'cycle_vie_min'], name='equip_cat_cycles_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['tension_systeme_min_V', 'tension_systeme_max_V'], name='equip_tension_sys_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['categorie', 'surface_m2'], name='equip_cat_surface_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(fields=['temperature_min_C', 'temperature_max_C'], name='equip_temperature_idx'),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.2 on 2026-10-18 15:35
+
+import json
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+import product.models
+from django.db import migrations, models
+
+
+# Copie figée de product/attributs.py à la date de la migration
+CLE_LISTE = 'caracteristique'
+LONGUEUR_VALEUR = 255
+TAILLE_LOT = 500
+
+
+def _nombre(valeur):
+    if isinstance(valeur, bool):
+        return None
+    if isinstance(valeur, (int, float)):
+        return float(valeur)
+    try:
+        return float(str(valeur).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def lignes_attributs(caracteristiques):
+    if isinstance(caracteristiques, dict):
+        elements = caracteristiques.items()
+    elif isinstance(caracteristiques, list):
+        elements = ((CLE_LISTE, element) for element in caracteristiques)
+    else:
+        return []
+
+    lignes = []
+    for cle, valeur in elements:
+        for v in valeur if isinstance(valeur, list) else [valeur]:
+            if v is None or v == '':
+                continue
+            texte = v if isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+            lignes.append((str(cle)[:100], texte[:LONGUEUR_VALEUR], _nombre(v)))
+    return list(dict.fromkeys(lignes))
+
+
+def remplir_attributs(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Equipement = apps.get_model('product', 'Equipement')
+    AttributEquipement = apps.get_model('product', 'AttributEquipement')
+
+    lignes = (
+        Equipement.objects.using(alias).exclude(caracteristiques_additionnelles=None)
+        .order_by('pk').values_list('pk', 'caracteristiques_additionnelles')
+    )
+    lot = []
+    for pk, caracteristiques in lignes.iterator(chunk_size=TAILLE_LOT):
+        lot.extend(
+            AttributEquipement(equipement_id=pk, cle=cle, valeur=valeur, valeur_nombre=nombre)
+            for cle, valeur, nombre in lignes_attributs(caracteristiques)
+        )
+        if len(lot) >= TAILLE_LOT:
+            AttributEquipement.objects.using(alias).bulk_create(lot)
+            lot = []
+    AttributEquipement.objects.using(alias).bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_specs_normalisees'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributEquipement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=100)),
+                ('valeur', models.CharField(max_length=255)),
+                ('valeur_nombre', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(product.models.NombreJSON('garantie_ans'), name='eq_attr_garantie_ans_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(product.models.NombreJSON('nombre_mppt'), name='eq_attr_nombre_mppt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(django.db.models.functions.comparison.Cast(product.models.AttributJSON('indice_protection'), models.CharField()), name='eq_attr_indice_protection_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(django.db.models.functions.comparison.Cast(product.models.AttributJSON('communication'), models.CharField()), name='eq_attr_communication_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipement',
+            index=models.Index(django.db.models.functions.comparison.Cast(product.models.AttributJSON('technologie_batterie'), models.CharField()), name='eq_attr_technologie_batter_idx'),
+        ),
+        migrations.AddField(
+            model_name='attributequipement',
+            name='equipement',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attributs', to='product.equipement'),
+        ),
+        migrations.AddIndex(
+            model_name='attributequipement',
+            index=models.Index(fields=['cle', 'valeur'], name='attr_cle_valeur_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attributequipement',
+            index=models.Index(fields=['cle', 'valeur_nombre'], name='attr_cle_nombre_idx'),
+        ),
+        migrations.RunPython(remplir_attributs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2 on 2026-10-18 15:36
+
+import json
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copie figée du document de product/lecture.py (EquipementSerializer sans la catégorie)
+CHAMPS_DOCUMENT = [
+    'id', 'nom', 'description', 'marque', 'puissance_W', 'puissance_VA', 'puissance_nominale_W', 'tension_V',
+    'tension_entree_DC_V', 'tension_sortie_AC_V', 'frequence_Hz', 'capacite_Ah', 'energie_Wh', 'taille',
+    'type_equipement', 'mode', 'efficacite_module_pourcent', 'tension_puissance_max_VMP',
+    'courant_puissance_max_Imp', 'tension_circuit_ouvert_VOC', 'courant_court_circuit_ISC',
+    'tolerance_puissance_W', 'tension_maximale_systeme_V', 'temperature_module_fonctionnement_C',
+    'calibre_max_fusibles_serie_A', 'cycle_vie_cycles', 'ir_initiale_mOhm', 'poids_kg', 'forme_onde',
+    'rendement_pourcent', 'courant_charge_A', 'tension_systeme_V', 'tension_max_PV_V', 'puissance_PV_max_12V',
+    'puissance_PV_max_24V', 'puissance_PV_max_48V', 'caracteristiques_additionnelles', 'conditions_test',
+    'type_stockage', 'cycle_vie_min', 'cycle_vie_max', 'tension_systeme_min_V', 'tension_systeme_max_V',
+    'tensions_systeme_V', 'longueur_mm', 'largeur_mm', 'epaisseur_mm', 'surface_m2', 'temperature_min_C',
+    'temperature_max_C', 'tolerance_puissance_min_W', 'tolerance_puissance_max_W',
+]
+DECIMALES = {'surface_m2': 4}  # 2 pour les autres décimaux
+TAILLE_LOT = 500
+
+
+def _compacter(valeur):
+    if isinstance(valeur, dict):
+        return {cle: _compacter(v) for cle, v in valeur.items() if v is not None and v != ''}
+    if isinstance(valeur, list):
+        return [_compacter(v) for v in valeur]
+    return valeur
+
+
+def _document(equip, chemin_affiche):
+    document = {}
+    for champ in CHAMPS_DOCUMENT:
+        if champ == 'marque':
+            valeur = {'id': equip.marque_id, 'nom': equip.marque.nom} if equip.marque else None
+        else:
+            valeur = getattr(equip, champ)
+        if isinstance(valeur, Decimal):
+            valeur = str(valeur.quantize(Decimal(1).scaleb(-DECIMALES.get(champ, 2))))
+        document[champ] = valeur
+    document = _compacter(document)
+    document['categorie'] = {'id': equip.categorie_id, 'nom': equip.categorie.nom, 'chemin': equip.categorie.chemin}
+    document['chemin_categorie'] = chemin_affiche
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+
+
+def remplir_lecture(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Categorie = apps.get_model('product', 'Categorie')
+    Equipement = apps.get_model('product', 'Equipement')
+    EquipementLecture = apps.get_model('product', 'EquipementLecture')
+
+    noms = dict(Categorie.objects.using(alias).values_list('id', 'nom'))
+    equipements = Equipement.objects.using(alias).select_related('categorie', 'marque').order_by('pk')
+    lot = []
+    for equip in equipements.iterator(chunk_size=TAILLE_LOT):
+        ids = [int(i) for i in equip.categorie.chemin.strip('/').split('/') if i]
+        chemin = ' > '.join(noms.get(pk, '?') for pk in ids)
+        marque = equip.marque.nom if equip.marque else ''
+        lot.append(EquipementLecture(
+            equipement_id=equip.pk,
+            categorie_chemin=equip.categorie.chemin,
+            chemin_categorie=chemin,
+            marque_nom=marque,
+            nom_affiche=f"{equip.nom} ({marque})" if marque else equip.nom,
+            actif=equip.actif,
+            document=_document(equip, chemin),
+        ))
+        if len(lot) >= TAILLE_LOT:
+            EquipementLecture.objects.using(alias).bulk_create(lot)
+            lot = []
+    EquipementLecture.objects.using(alias).bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_attributs_equipement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipementLecture',
+            fields=[
+                ('equipement', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='lecture', serialize=False, to='product.equipement')),
+                ('categorie_chemin', models.CharField(max_length=255)),
+                ('chemin_categorie', models.CharField(max_length=500)),
+                ('marque_nom', models.CharField(blank=True, max_length=150)),
+                ('nom_affiche', models.CharField(max_length=500)),
+                ('actif', models.BooleanField(default=True)),
+                ('document', models.TextField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['actif', 'categorie_chemin'], name='lecture_actif_chemin_idx', opclasses=['bool_ops', 'varchar_pattern_ops'])],
+            },
+        ),
+        migrations.RunPython(remplir_lecture, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 5.2 on 2026-10-18 15:44
+
+from itertools import islice
+
+import django.db.models.deletion
+import numpy as np
+from django.db import migrations, models
+
+# Copie figée des règles de product/compatibilite.py à la date de la migration
+
+FAMILLES = {
+    'panneau': 'Panneau Solaire',
+    'batterie': 'Batterie',
+    'onduleur': 'Onduleur',
+    'regulateur': 'Contrôleur de Charge',
+    'appareil': 'Appareils',
+}
+MARGE_VOC = 1.15
+TOLERANCE_TENSION = 0.1
+FACTEUR_PUISSANCE = 0.8
+TAILLE_LOT = 2000
+NUMERIQUES = [
+    'puissance_W', 'puissance_VA', 'tension_V', 'tension_entree_DC_V', 'tension_circuit_ouvert_VOC',
+    'courant_court_circuit_ISC', 'tension_max_PV_V', 'courant_charge_A',
+]
+
+
+class Famille:
+    def __init__(self, lignes):
+        self.ids = np.array([ligne['id'] for ligne in lignes], dtype=np.int64)
+        for champ in NUMERIQUES:
+            setattr(self, champ, np.array([np.nan if l[champ] is None else float(l[champ]) for l in lignes]))
+        textes = [f"{ligne['type_equipement']} {ligne['nom']}".lower() for ligne in lignes]
+        self.hybride = np.array(['hybride' in t for t in textes], dtype=bool)
+        self.reseau = np.array(['on-grid' in t or 'réseau' in t for t in textes], dtype=bool)
+        self.continu = np.array([ligne['mode'] == 'DC' for ligne in lignes], dtype=bool)
+        listes = [[float(v) for v in ligne['tensions_systeme_V'].strip('/').split('/') if v] for ligne in lignes]
+        largeur = max((len(l) for l in listes), default=0) or 1
+        self.tensions = np.full((len(lignes), largeur), np.nan)
+        for i, liste in enumerate(listes):
+            self.tensions[i, :len(liste)] = liste
+
+    def puissance_active(self):
+        return np.where(np.isnan(self.puissance_W), self.puissance_VA * FACTEUR_PUISSANCE, self.puissance_W)
+
+
+def _tension_acceptee(listes, tensions):
+    proches = np.abs(listes[:, None, :] - tensions[None, :, None]) <= TOLERANCE_TENSION * listes[:, None, :]
+    inconnue = np.isnan(listes).all(axis=1)[:, None] | np.isnan(tensions)[None, :]
+    return proches.any(axis=2) | inconnue
+
+
+def _panneau_regulateur(p, r):
+    modules = np.floor(r.tension_max_PV_V[None, :] / (p.tension_circuit_ouvert_VOC[:, None] * MARGE_VOC))
+    return ~(modules < 1) & ~(p.courant_court_circuit_ISC[:, None] > r.courant_charge_A[None, :])
+
+
+def _panneau_onduleur(p, o):
+    depasse = p.tension_circuit_ouvert_VOC[:, None] * MARGE_VOC > o.tension_max_PV_V[None, :]
+    return ~(o.hybride | o.reseau)[None, :] | ~depasse
+
+
+def _regulateur_batterie(r, b):
+    return _tension_acceptee(r.tensions, b.tension_V)
+
+
+def _regulateur_onduleur(r, o):
+    return _tension_acceptee(r.tensions, o.tension_entree_DC_V) & ~o.reseau[None, :]
+
+
+def _onduleur_batterie(o, b):
+    entree, tension = o.tension_entree_DC_V[:, None], b.tension_V[None, :]
+    en_serie = np.rint(entree / tension)
+    ecart = np.abs(en_serie * tension - entree)
+    inconnue = np.isnan(entree) | np.isnan(tension)
+    return (((en_serie >= 1) & (ecart <= TOLERANCE_TENSION * entree)) | inconnue) & ~o.reseau[:, None]
+
+
+def _appareil_onduleur(a, o):
+    return a.continu[:, None] | ~(a.puissance_active()[:, None] > o.puissance_active()[None, :])
+
+
+def _appareil_batterie(a, b):
+    return ~a.continu[:, None] | _tension_acceptee(a.tension_V[:, None], b.tension_V)
+
+
+REGLES = {
+    ('panneau', 'regulateur'): _panneau_regulateur,
+    ('panneau', 'onduleur'): _panneau_onduleur,
+    ('regulateur', 'batterie'): _regulateur_batterie,
+    ('regulateur', 'onduleur'): _regulateur_onduleur,
+    ('onduleur', 'batterie'): _onduleur_batterie,
+    ('appareil', 'onduleur'): _appareil_onduleur,
+    ('appareil', 'batterie'): _appareil_batterie,
+}
+
+
+def calculer_incompatibilites(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Categorie = apps.get_model('product', 'Categorie')
+    Equipement = apps.get_model('product', 'Equipement')
+    Incompatibilite = apps.get_model('product', 'IncompatibiliteEquipement')
+
+    lignes = {famille: [] for famille in FAMILLES}
+    noms = {nom: famille for famille, nom in FAMILLES.items()}
+    champs = ['id', 'nom', 'type_equipement', 'mode', 'tensions_systeme_V', *NUMERIQUES]
+    for chemin, nom in Categorie.objects.using(alias).filter(nom__in=noms).values_list('chemin', 'nom'):
+        lignes[noms[nom]].extend(
+            Equipement.objects.using(alias).filter(categorie__chemin__startswith=chemin, actif=True)
+            .order_by('pk').values(*champs)
+        )
+    familles = {famille: Famille(l) for famille, l in lignes.items()}
+
+    def paires():
+        for (nom_a, nom_b), regle in REGLES.items():
+            a, b = familles[nom_a], familles[nom_b]
+            if len(a.ids) and len(b.ids):
+                i, j = np.nonzero(~regle(a, b))
+                yield from zip(a.ids[i].tolist(), b.ids[j].tolist())
+
+    objets = (Incompatibilite(equipement_id=pk_a, incompatible_id=pk_b) for pk_a, pk_b in paires())
+    while lot := list(islice(objets, TAILLE_LOT)):
+        Incompatibilite.objects.using(alias).bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_lecture_equipement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncompatibiliteEquipement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incompatibilites', to='product.equipement')),
+                ('incompatible', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product.equipement')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('equipement', 'incompatible'), name='incompat_paire_unique')],
+            },
+        ),
+        migrations.RunPython(calculer_incompatibilites, migrations.RunPython.noop),
+    ]
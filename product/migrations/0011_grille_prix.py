@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 15:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0010_incompatibilites_equipements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrixEquipement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('province', models.CharField(blank=True, max_length=100)),
+                ('prix', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('date_effet', models.DateField()),
+                ('equipement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prix', to='product.equipement')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('equipement', 'province', 'date_effet'), name='prix_equip_province_date_unique')],
+            },
+        ),
+    ]
@@ -1,4 +1,10 @@
+import re
+
 from django.db import models
+from django.db.models import CharField, F, FloatField, Func, TextField, Value
+from django.db.models.functions import Cast, Concat, Substr
+
+from .specs import deriver
 
 
 class Categorie(models.Model):
@@ -6,10 +12,66 @@ class Categorie(models.Model):
     parent = models.ForeignKey(
         'self', on_delete=models.CASCADE, null=True, blank=True, related_name='enfants'
     )
+    # Chemin matérialisé "/<id racine>/.../<id>/" : les descendants partagent ce préfixe
+    chemin = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    profondeur = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.parent} > {self.nom}" if self.parent else self.nom
 
+    @staticmethod
+    def chemin_pour(pk, chemin_parent=None):
+        return f"{chemin_parent or '/'}{pk}/"
+
+    @staticmethod
+    def filtre_descendants(chemin, champ='chemin'):
+        """
+        Q couvrant une catégorie et tous ses descendants : préfixe `chemin` ("/1/"
+        couvre "/1/5/" mais pas "/10/"). Un intervalle supposerait l'ordre des
+        octets, faux sous une collation de locale ; sur PostgreSQL le LIKE 'x%'
+        est servi par un index *_pattern_ops (celui que Django crée pour
+        Categorie.chemin, lecture_actif_chemin_idx pour le modèle de lecture).
+        """
+        return models.Q(**{f'{champ}__startswith': chemin})
+
+    def descendants(self, inclure_soi=True):
+        queryset = Categorie.objects.filter(self.filtre_descendants(self.chemin))
+        return queryset if inclure_soi else queryset.exclude(pk=self.pk)
+
+    def save(self, *args, **kwargs):
+        ancien_chemin = self.chemin
+        chemin_parent = None
+        if self.parent_id:
+            chemin_parent = Categorie.objects.values_list('chemin', flat=True).get(pk=self.parent_id)
+            if self.pk and ancien_chemin and chemin_parent.startswith(ancien_chemin):
+                raise ValueError("Une catégorie ne peut pas être déplacée sous l'un de ses descendants.")
+
+        if self.pk and ancien_chemin:
+            # Catégorie existante : sous-arbre réécrit avant l'enregistrement, pour que
+            # post_save (modèle de lecture, index) voie déjà les chemins définitifs
+            nouveau_chemin = self.chemin_pour(self.pk, chemin_parent)
+            if nouveau_chemin != ancien_chemin:
+                self._deplacer(ancien_chemin, nouveau_chemin)
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = set(kwargs['update_fields']) | {'chemin', 'profondeur'}
+            super().save(*args, **kwargs)
+            return
+
+        # Nouvelle catégorie : l'id, et donc le chemin, n'est connu qu'après l'insertion
+        super().save(*args, **kwargs)
+        self.chemin = self.chemin_pour(self.pk, chemin_parent)
+        self.profondeur = self.chemin.count('/') - 2
+        Categorie.objects.filter(pk=self.pk).update(chemin=self.chemin, profondeur=self.profondeur)
+
+    def _deplacer(self, ancien_chemin, nouveau_chemin):
+        """Déplacement : réécrit le préfixe de tout le sous-arbre en une requête."""
+        self.chemin = nouveau_chemin
+        self.profondeur = nouveau_chemin.count('/') - 2
+        Categorie.objects.filter(self.filtre_descendants(ancien_chemin)).exclude(pk=self.pk).update(
+            chemin=Concat(Value(nouveau_chemin), Substr('chemin', len(ancien_chemin) + 1)),
+            profondeur=F('profondeur') + (self.profondeur - (ancien_chemin.count('/') - 2)),
+        )
+
 
 class Marque(models.Model):
     nom = models.CharField(max_length=150, unique=True, db_index=True)
@@ -18,6 +80,76 @@ class Marque(models.Model):
         return self.nom
 
 
+# Clés de `caracteristiques_additionnelles` (quand c'est un objet) promues en
+# attributs filtrables : chacune a son index d'expression et ses filtres
+# ?attribut_<clé>= (product/filters.py). 'nombre' compare en flottant les seules
+# valeurs JSON numériques, 'texte' à l'identique.
+ATTRIBUTS_PROMUS = {
+    'garantie_ans': 'nombre',
+    'nombre_mppt': 'nombre',
+    'indice_protection': 'texte',
+    'communication': 'texte',
+    'technologie_batterie': 'texte',
+}
+
+
+class AttributJSON(Func):
+    """
+    Valeur d'une clé de premier niveau de caracteristiques_additionnelles.
+    Le chemin est écrit en toutes lettres dans le SQL (pas en paramètre) et le
+    SQL produit est stable d'une requête à l'autre : c'est ce qui permet aux
+    moteurs d'utiliser l'index d'expression. KT ne convient pas ici, son SQL
+    SQLite varie d'un processus à l'autre.
+    """
+    output_field = TextField()
+
+    def __init__(self, cle, **extra):
+        if not re.fullmatch(r'[a-z0-9_]+', cle):
+            raise ValueError(f"Clé d'attribut invalide : {cle!r}")
+        self.cle = cle
+        super().__init__(F('caracteristiques_additionnelles'), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template=f"JSON_EXTRACT(%(expressions)s, '$.{self.cle}')", **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template=f"(%(expressions)s ->> '{self.cle}')", **extra_context
+        )
+
+
+class NombreJSON(AttributJSON):
+    """
+    Valeur numérique d'une clé de caracteristiques_additionnelles, NULL quand la
+    valeur JSON n'est pas un nombre ("10 ans", "IP65") : le cast est gardé par
+    le type JSON et ne peut pas échouer, ni à l'écriture (index) ni en lecture.
+    """
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        template = (
+            f"(CASE WHEN JSON_TYPE(%(expressions)s, '$.{self.cle}') IN ('integer', 'real') "
+            f"THEN CAST(JSON_EXTRACT(%(expressions)s, '$.{self.cle}') AS REAL) END)"
+        )
+        return Func.as_sql(self, compiler, connection, template=template, **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        template = (
+            f"(CASE WHEN jsonb_typeof(%(expressions)s -> '{self.cle}') = 'number' "
+            f"THEN (%(expressions)s ->> '{self.cle}')::double precision END)"
+        )
+        return Func.as_sql(self, compiler, connection, template=template, **extra_context)
+
+
+def expression_attribut(cle):
+    """Expression SQL d'un attribut promu, identique à celle de son index."""
+    if ATTRIBUTS_PROMUS[cle] == 'nombre':
+        return NombreJSON(cle)
+    return Cast(AttributJSON(cle), CharField())
+
+
 class Equipement(models.Model):
     MODE_CHOICES = (
         ('AC', 'Alternatif'),
@@ -84,5 +216,190 @@ class Equipement(models.Model):
 
     mode = models.CharField(max_length=10, choices=MODE_CHOICES, blank=True)
 
+    # Colonnes dérivées des caractéristiques en texte libre (product/specs.py), recalculées à chaque écriture
+    cycle_vie_min = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    cycle_vie_max = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    tension_systeme_min_V = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    tension_systeme_max_V = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    tensions_systeme_V = models.CharField(max_length=100, blank=True, editable=False)  # ex: "/12/24/48/"
+    longueur_mm = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    largeur_mm = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    epaisseur_mm = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    surface_m2 = models.DecimalField(max_digits=8, decimal_places=4, null=True, blank=True, editable=False)
+    temperature_min_C = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True, editable=False)
+    temperature_max_C = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True, editable=False)
+    tolerance_puissance_min_W = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    tolerance_puissance_max_W = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+
+    # Suivi de l'import fournisseur (voir product/importation.py)
+    empreinte_source = models.CharField(max_length=64, blank=True, editable=False)  # SHA-256 du contenu importé
+    source_import = models.CharField(max_length=100, blank=True, editable=False)  # flux d'origine (--source)
+    actif = models.BooleanField(default=True, db_index=True)  # False = retiré du flux fournisseur
+
+    class Meta:
+        # Index composites derrière les filtres de dimensionnement (product/filters.py) :
+        # catégorie (résolue depuis le chemin) puis caractéristiques comparées par intervalle.
+        indexes = [
+            models.Index(fields=['categorie', 'tension_V', 'capacite_Ah'], name='equip_cat_tension_capa_idx'),
+            models.Index(fields=['categorie', 'mode', 'puissance_VA'], name='equip_cat_mode_va_idx'),
+            models.Index(fields=['categorie', 'puissance_W'], name='equip_cat_puissance_idx'),
+            models.Index(fields=['tension_V', 'capacite_Ah'], name='equip_tension_capa_idx'),
+            models.Index(fields=['mode', 'puissance_VA'], name='equip_mode_va_idx'),
+            models.Index(fields=['categorie', 'cycle_vie_min'], name='equip_cat_cycles_idx'),
+            models.Index(fields=['tension_systeme_min_V', 'tension_systeme_max_V'], name='equip_tension_sys_idx'),
+            models.Index(fields=['categorie', 'surface_m2'], name='equip_cat_surface_idx'),
+            models.Index(fields=['temperature_min_C', 'temperature_max_C'], name='equip_temperature_idx'),
+            *[
+                models.Index(expression_attribut(cle), name=f'eq_attr_{cle}'[:26] + '_idx')
+                for cle in ATTRIBUTS_PROMUS
+            ],
+        ]
+
     def __str__(self):
         return f"{self.nom} ({self.marque.nom if self.marque else 'Sans marque'})"
+
+    def normaliser_specs(self):
+        """Recalcule les colonnes dérivées ; retourne les noms de celles qui ont changé."""
+        derives = deriver({field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields})
+        modifies = []
+        for champ, valeur in derives.items():
+            if getattr(self, champ) != valeur:
+                setattr(self, champ, valeur)
+                modifies.append(champ)
+        return modifies
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valeurs lues en base : les signaux ne recalculent que ce qui en dépend et a changé
+        instance._valeurs_chargees = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        self.retenir_valeurs(fields)
+
+    def retenir_valeurs(self, champs=None):
+        """Note les valeurs `champs` (toutes par défaut) comme celles de la base."""
+        noms = (
+            {self._meta.get_field(champ).attname for champ in champs} if champs is not None
+            else {field.attname for field in self._meta.concrete_fields}
+        )
+        self._valeurs_chargees = {
+            **getattr(self, '_valeurs_chargees', {}),
+            **{nom: self.__dict__[nom] for nom in noms if nom in self.__dict__},
+        }
+
+    def save(self, *args, **kwargs):
+        modifies = self.normaliser_specs()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and modifies:
+            kwargs['update_fields'] = set(update_fields) | set(modifies)
+        super().save(*args, **kwargs)
+        self.retenir_valeurs(kwargs.get('update_fields'))
+
+
+class EquipementLecture(models.Model):
+    """
+    Modèle de lecture dénormalisé d'un équipement (voir product/lecture.py) :
+    chemin de catégorie, marque et nom d'affichage déjà résolus, et le document
+    JSON compact de l'équipement déjà rendu. La liste en flux le renvoie tel quel,
+    sans jointure ni conversion des décimaux ligne à ligne.
+    """
+    equipement = models.OneToOneField(
+        Equipement, on_delete=models.CASCADE, primary_key=True, related_name='lecture'
+    )
+    categorie_chemin = models.CharField(max_length=255)  # chemin matérialisé de la catégorie
+    chemin_categorie = models.CharField(max_length=500)  # ex: "Solaire > Batterie"
+    marque_nom = models.CharField(max_length=150, blank=True)
+    nom_affiche = models.CharField(max_length=500)
+    actif = models.BooleanField(default=True)
+    document = models.TextField()
+
+    class Meta:
+        indexes = [
+            # Classes d'opérateurs « pattern » : préfixe LIKE servi quelle que soit la collation (PostgreSQL)
+            models.Index(
+                fields=['actif', 'categorie_chemin'], name='lecture_actif_chemin_idx',
+                opclasses=['bool_ops', 'varchar_pattern_ops'],
+            ),
+        ]
+
+    def __str__(self):
+        return self.nom_affiche
+
+
+class AttributEquipement(models.Model):
+    """
+    Copie clé/valeur (EAV) de `caracteristiques_additionnelles`, tenue par
+    product/attributs.py : permet filtres et facettes sur n'importe quel attribut
+    sans relire le JSON de chaque ligne. Les éléments d'une liste sont rangés
+    sous la clé 'caracteristique'.
+    """
+    equipement = models.ForeignKey(Equipement, on_delete=models.CASCADE, related_name='attributs')
+    cle = models.CharField(max_length=100)
+    valeur = models.CharField(max_length=255)
+    valeur_nombre = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cle', 'valeur'], name='attr_cle_valeur_idx'),
+            models.Index(fields=['cle', 'valeur_nombre'], name='attr_cle_nombre_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cle}={self.valeur}"
+
+
+class IncompatibiliteEquipement(models.Model):
+    """
+    Paire d'équipements électriquement incompatibles, calculée en masse par
+    product/compatibilite.py (après l'import, et pour l'équipement enregistré).
+    Chaque paire est rangée une fois, dans le sens de sa règle (`equipement`
+    panneau, `incompatible` contrôleur...) ; une paire absente est compatible.
+    """
+    equipement = models.ForeignKey(Equipement, on_delete=models.CASCADE, related_name='incompatibilites')
+    incompatible = models.ForeignKey(Equipement, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['equipement', 'incompatible'], name='incompat_paire_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.equipement_id} !~ {self.incompatible_id}"
+
+
+class PrixEquipement(models.Model):
+    """
+    Grille de prix datée : prix de vente d'un équipement à partir de `date_effet`,
+    valable jusqu'à l'entrée suivante du même équipement et de la même province.
+    Province vide : prix national, remplacé par celui de la province quand elle
+    en a un (voir installation/devis.py).
+    """
+    equipement = models.ForeignKey(Equipement, on_delete=models.CASCADE, related_name='prix')
+    province = models.CharField(max_length=100, blank=True)
+    prix = models.DecimalField(max_digits=12, decimal_places=2)  # FCFA, hors main d'œuvre
+    date_effet = models.DateField()
+
+    class Meta:
+        # L'index de la contrainte sert aussi la recherche du prix en vigueur
+        constraints = [
+            models.UniqueConstraint(fields=['equipement', 'province', 'date_effet'], name='prix_equip_province_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.equipement_id} : {self.prix} ({self.province or 'national'}, {self.date_effet})"
+
+
+class MarqueurCatalogue(models.Model):
+    """
+    Marqueur de modification par table du catalogue, incrémenté à chaque écriture.
+    Sert de validateur bon marché pour les ETag / Last-Modified des lectures.
+    """
+    table = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    modifie_le = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
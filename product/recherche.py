@@ -0,0 +1,203 @@
+"""
+Index plein texte du catalogue d'équipements.
+
+Les textes (nom, type, catégorie, marque, description) sont normalisés ici, en
+Python, de la même façon à l'indexation et à la recherche : minuscules, accents
+retirés, mots composés indexés à la fois collés et séparés ("mono-cristallin"
+donne monocristallin, mono et cristallin). La base n'a donc pas besoin de
+dictionnaire français ni d'extension unaccent.
+
+Le stockage dépend du moteur :
+- SQLite : table virtuelle FTS5 (rowid = id de l'équipement), classement bm25 ;
+- PostgreSQL : colonne tsvector pondérée sous index GIN, classement ts_rank_cd.
+Sur un autre moteur, `disponible()` est faux et la recherche retombe sur
+SearchFilter (LIKE).
+"""
+import re
+import unicodedata
+
+from django.db import connection as connexion_defaut
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import Equipement
+
+
+TABLE_INDEX = 'product_equipement_fts'
+
+# Colonnes indexées, par ordre de poids décroissant
+COLONNES = [
+    ('nom', 'nom'),
+    ('type_equipement', 'type_equipement'),
+    ('marque', 'marque__nom'),
+    ('categorie', 'categorie__nom'),
+    ('description', 'description'),
+]
+
+# Poids bm25 (SQLite) dans l'ordre de COLONNES, et lettres tsvector (PostgreSQL)
+POIDS_BM25 = (10.0, 4.0, 3.0, 2.0, 1.0)
+POIDS_TSVECTOR = ('A', 'B', 'B', 'C', 'D')
+
+MOTEURS = ('sqlite', 'postgresql')
+
+TAILLE_LOT_INDEX = 500
+
+_MOT = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def disponible(connexion=None):
+    return (connexion or connexion_defaut).vendor in MOTEURS
+
+
+def sans_accents(texte):
+    decompose = unicodedata.normalize('NFKD', texte)
+    return ''.join(c for c in decompose if not unicodedata.combining(c))
+
+
+def mots(texte):
+    """Mots normalisés du texte, les mots composés restant liés par '-'."""
+    return _MOT.findall(sans_accents(texte or '').lower().replace('_', '-'))
+
+
+def tokens_document(texte):
+    """Tokens à indexer : chaque mot composé l'est collé et par morceaux."""
+    tokens = []
+    for mot in mots(texte):
+        morceaux = mot.split('-')
+        if len(morceaux) > 1:
+            tokens.append(''.join(morceaux))
+        tokens.extend(morceaux)
+    return ' '.join(tokens)
+
+
+def groupes_requete(texte):
+    """
+    Une liste d'alternatives par mot de la requête, toutes à satisfaire :
+    "mono-cristallin" -> [['monocristallin'], ['mono', 'cristallin']].
+    """
+    groupes = []
+    for mot in mots(texte):
+        morceaux = mot.split('-')
+        if len(morceaux) > 1:
+            groupes.append([[''.join(morceaux)], morceaux])
+        else:
+            groupes.append([morceaux])
+    return groupes
+
+
+def requete_fts5(groupes):
+    # Chaque token est cherché en préfixe : "ond" trouve "onduleur"
+    termes = []
+    for alternatives in groupes:
+        formes = [' AND '.join(f'"{t}"*' for t in alternative) for alternative in alternatives]
+        termes.append(formes[0] if len(formes) == 1 else '(' + ' OR '.join(f'({f})' for f in formes) + ')')
+    return ' AND '.join(termes)
+
+
+def requete_tsquery(groupes):
+    termes = []
+    for alternatives in groupes:
+        formes = [' & '.join(f'{t}:*' for t in alternative) for alternative in alternatives]
+        termes.append(formes[0] if len(formes) == 1 else '(' + ' | '.join(f'({f})' for f in formes) + ')')
+    return ' & '.join(termes)
+
+
+# Filtrage et classement
+
+def rechercher(queryset, texte):
+    """
+    Restreint `queryset` aux équipements correspondant à `texte` et annote
+    `pertinence` (plus grand = plus pertinent), trié par pertinence décroissante.
+    """
+    groupes = groupes_requete(texte)
+    if not groupes:
+        return queryset
+    table = queryset.model._meta.db_table
+    if connexion_defaut.vendor == 'sqlite':
+        requete = requete_fts5(groupes)
+        poids = ', '.join(str(p) for p in POIDS_BM25)
+        correspondants = RawSQL(f"SELECT rowid FROM {TABLE_INDEX} WHERE {TABLE_INDEX} MATCH %s", [requete])
+        # bm25 est négatif, les meilleurs résultats ayant la valeur la plus basse
+        pertinence = RawSQL(
+            f"SELECT -bm25({TABLE_INDEX}, {poids}) FROM {TABLE_INDEX} "
+            f"WHERE {TABLE_INDEX} MATCH %s AND rowid = {table}.id",
+            [requete], output_field=FloatField(),
+        )
+    else:
+        requete = requete_tsquery(groupes)
+        correspondants = RawSQL(
+            f"SELECT equipement_id FROM {TABLE_INDEX} WHERE document @@ to_tsquery('simple', %s)", [requete]
+        )
+        pertinence = RawSQL(
+            f"SELECT ts_rank_cd(document, to_tsquery('simple', %s)) FROM {TABLE_INDEX} "
+            f"WHERE equipement_id = {table}.id",
+            [requete], output_field=FloatField(),
+        )
+    return queryset.filter(id__in=correspondants).annotate(pertinence=pertinence).order_by('-pertinence')
+
+
+# Indexation
+
+def _documents(modele, ids, connexion):
+    champs = [source for _, source in COLONNES]
+    for ligne in modele.objects.using(connexion.alias).filter(pk__in=ids).values_list('id', *champs):
+        yield ligne[0], [tokens_document(valeur) for valeur in ligne[1:]]
+
+
+def _ecrire(cursor, vendor, documents):
+    if not documents:
+        return
+    if vendor == 'sqlite':
+        colonnes = ', '.join(nom for nom, _ in COLONNES)
+        marques = ', '.join(['%s'] * (len(COLONNES) + 1))
+        cursor.executemany(
+            f"INSERT INTO {TABLE_INDEX} (rowid, {colonnes}) VALUES ({marques})",
+            [[pk, *textes] for pk, textes in documents],
+        )
+    else:
+        vecteur = ' || '.join(
+            f"setweight(to_tsvector('simple', %s), '{lettre}')" for lettre in POIDS_TSVECTOR
+        )
+        cursor.executemany(
+            f"INSERT INTO {TABLE_INDEX} (equipement_id, document) VALUES (%s, {vecteur})",
+            [[pk, *textes] for pk, textes in documents],
+        )
+
+
+def desindexer(ids, connexion=None):
+    connexion = connexion or connexion_defaut
+    if not disponible(connexion):
+        return
+    cle = 'rowid' if connexion.vendor == 'sqlite' else 'equipement_id'
+    ids = list(ids)
+    with connexion.cursor() as cursor:
+        for i in range(0, len(ids), TAILLE_LOT_INDEX):
+            tranche = ids[i:i + TAILLE_LOT_INDEX]
+            marques = ', '.join(['%s'] * len(tranche))
+            cursor.execute(f"DELETE FROM {TABLE_INDEX} WHERE {cle} IN ({marques})", tranche)
+
+
+def indexer(ids, connexion=None, modele=Equipement):
+    """(Ré)indexe les équipements donnés ; ceux qui n'existent plus sont retirés de l'index."""
+    connexion = connexion or connexion_defaut
+    if not disponible(connexion):
+        return
+    ids = list(ids)
+    desindexer(ids, connexion)
+    with connexion.cursor() as cursor:
+        for i in range(0, len(ids), TAILLE_LOT_INDEX):
+            _ecrire(cursor, connexion.vendor, list(_documents(modele, ids[i:i + TAILLE_LOT_INDEX], connexion)))
+
+
+def reconstruire(connexion=None, modele=Equipement):
+    """Vide l'index et y remet tout le catalogue."""
+    connexion = connexion or connexion_defaut
+    if not disponible(connexion):
+        return 0
+    with connexion.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE_INDEX}")
+    ids = list(modele.objects.using(connexion.alias).order_by('pk').values_list('pk', flat=True))
+    with connexion.cursor() as cursor:
+        for i in range(0, len(ids), TAILLE_LOT_INDEX):
+            _ecrire(cursor, connexion.vendor, list(_documents(modele, ids[i:i + TAILLE_LOT_INDEX], connexion)))
+    return len(ids)
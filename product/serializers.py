@@ -1,27 +1,56 @@
 from rest_framework import serializers
-from .models import Categorie, Marque, Equipement
+from .models import Categorie, Marque, Equipement, PrixEquipement
 
 
-class CategorieSerializer(serializers.ModelSerializer):
+class ChampsDynamiquesMixin:
+    """
+    Permet de restreindre les champs sérialisés :
+    Serializer(obj, champs=['id', 'nom']) ou Serializer(obj, exclus=['description']).
+    Les noms sont passés par la vue (paramètres ?fields= / ?omit=), jamais aux serializers imbriqués.
+    """
+
+    def __init__(self, *args, champs=None, exclus=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if champs is not None:
+            for nom in set(self.fields) - set(champs):
+                self.fields.pop(nom)
+        for nom in exclus or ():
+            self.fields.pop(nom, None)
+
+
+def indexer_par_parent(categories):
+    """Regroupe des catégories par parent_id, dans l'ordre reçu."""
+    index = {}
+    for categorie in categories:
+        index.setdefault(categorie.parent_id, []).append(categorie)
+    return index
+
+
+class CategorieSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     enfants = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Categorie
-        fields = ['id', 'nom', 'parent', 'enfants']
+        fields = ['id', 'nom', 'parent', 'chemin', 'profondeur', 'enfants']
 
     def get_enfants(self, obj):
-        enfants = obj.enfants.all()
-        serializer = CategorieSerializer(enfants, many=True, context=self.context)
+        # L'arbre est chargé une seule fois par requête et partagé via le contexte,
+        # au lieu d'une requête obj.enfants.all() par nœud.
+        index = self.context.get('index_categories')
+        if index is None:
+            index = indexer_par_parent(Categorie.objects.order_by('id'))
+            self.context['index_categories'] = index
+        serializer = CategorieSerializer(index.get(obj.pk, []), many=True, context=self.context)
         return serializer.data
 
 
-class MarqueSerializer(serializers.ModelSerializer):
+class MarqueSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = Marque
         fields = ['id', 'nom']
 
 
-class EquipementSerializer(serializers.ModelSerializer):
+class EquipementSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     categorie = CategorieSerializer(read_only=True)
     categorie_id = serializers.PrimaryKeyRelatedField(
         queryset=Categorie.objects.all(), source='categorie', write_only=True
@@ -99,4 +128,23 @@ class EquipementSerializer(serializers.ModelSerializer):
             'caracteristiques_additionnelles',
             'conditions_test',
             'type_stockage',
+            'cycle_vie_min',
+            'cycle_vie_max',
+            'tension_systeme_min_V',
+            'tension_systeme_max_V',
+            'tensions_systeme_V',
+            'longueur_mm',
+            'largeur_mm',
+            'epaisseur_mm',
+            'surface_m2',
+            'temperature_min_C',
+            'temperature_max_C',
+            'tolerance_puissance_min_W',
+            'tolerance_puissance_max_W',
         ]
+
+
+class PrixEquipementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PrixEquipement
+        fields = ['id', 'equipement', 'province', 'prix', 'date_effet']
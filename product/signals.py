@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import attributs, autocompletion, compatibilite, lecture, recherche
+from .cache import marquer_modification
+from .models import Categorie, Marque, Equipement
+
+
+@receiver(post_save, sender=Categorie)
+@receiver(post_save, sender=Marque)
+@receiver(post_save, sender=Equipement)
+@receiver(post_delete, sender=Categorie)
+@receiver(post_delete, sender=Marque)
+@receiver(post_delete, sender=Equipement)
+def catalogue_modifie(sender, **kwargs):
+    # Après le commit : une lecture concurrente ne doit pas remettre en cache
+    # l'état d'avant l'écriture sous la nouvelle version.
+    transaction.on_commit(lambda: marquer_modification(sender._meta.model_name))
+
+
+# Index d'autocomplétion en mémoire : enregistré après catalogue_modifie, donc
+# appliqué une fois le marqueur incrémenté par la même écriture
+
+@receiver(post_save, sender=Categorie)
+@receiver(post_save, sender=Marque)
+@receiver(post_save, sender=Equipement)
+@receiver(post_delete, sender=Categorie)
+@receiver(post_delete, sender=Marque)
+@receiver(post_delete, sender=Equipement)
+def autocompletion_modifiee(sender, instance, **kwargs):
+    type_, pk = sender._meta.model_name, instance.pk
+    libelle = None
+    if kwargs.get('signal') is post_save and getattr(instance, 'actif', True):
+        libelle = instance.nom
+    transaction.on_commit(lambda: autocompletion.appliquer(type_, pk, libelle))
+
+
+# Index plein texte : mis à jour dans la même transaction que l'écriture
+
+@receiver(post_save, sender=Equipement)
+def indexer_equipement(sender, instance, **kwargs):
+    recherche.indexer([instance.pk])
+
+
+@receiver(post_save, sender=Equipement)
+def synchroniser_attributs(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'caracteristiques_additionnelles' in update_fields:
+        attributs.synchroniser([instance.pk])
+
+
+@receiver(post_delete, sender=Equipement)
+def desindexer_equipement(sender, instance, **kwargs):
+    recherche.desindexer([instance.pk])
+
+
+@receiver(post_save, sender=Equipement)
+def rafraichir_lecture(sender, instance, **kwargs):
+    lecture.rafraichir([instance.pk])
+
+
+@receiver(post_save, sender=Equipement)
+def recalculer_compatibilites(sender, instance, **kwargs):
+    # Seulement si une colonne lue par les règles a changé, et après le commit :
+    # le recalcul charge des familles entières, il n'allonge pas la transaction
+    if compatibilite.a_recalculer(instance):
+        pk = instance.pk
+        transaction.on_commit(lambda: compatibilite.recalculer([pk]))
+
+
+@receiver(post_save, sender=Categorie)
+@receiver(post_save, sender=Marque)
+def reindexer_rattaches(sender, instance, created, **kwargs):
+    # Le nom de la catégorie ou de la marque fait partie du document indexé et du
+    # modèle de lecture ; pour une catégorie, le chemin affiché de tout son sous-arbre aussi
+    if created:
+        return
+    recherche.indexer(instance.equipements.values_list('pk', flat=True))
+    if sender is Categorie:
+        equipements = Equipement.objects.filter(Categorie.filtre_descendants(instance.chemin, 'categorie__chemin'))
+    else:
+        equipements = instance.equipements.all()
+    lecture.rafraichir(equipements.values_list('pk', flat=True))
+    if sender is Categorie:
+        # La famille d'un équipement (panneau, batterie...) dépend du nom et de la place de sa catégorie
+        compatibilite.recalculer(equipements.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Marque)
+def reindexer_avant_suppression(sender, instance, **kwargs):
+    # SET_NULL passe par un UPDATE sans signal : on note les équipements avant
+    ids = list(instance.equipements.values_list('pk', flat=True))
+    transaction.on_commit(lambda: recherche.indexer(ids))
+    transaction.on_commit(lambda: lecture.rafraichir(ids))
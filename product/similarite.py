@@ -0,0 +1,130 @@
+"""
+Équipements similaires : plus proches voisins sur les caractéristiques
+numériques (puissance, tension, capacité, rendement, dimensions, poids), au sein
+d'une même catégorie.
+
+Chaque caractéristique est passée au logarithme (100 W contre 150 W compte
+autant que 1000 W contre 1500 W) puis centrée-réduite par catégorie. La
+distance est la moyenne quadratique des écarts sur les caractéristiques
+renseignées des deux côtés ; une recherche exhaustive vectorisée sur la
+catégorie suffit (quelques milliers de lignes au plus).
+
+Comme l'autocomplétion, l'index est gardé en mémoire du processus et
+reconstruit quand les marqueurs du catalogue en base ont changé.
+"""
+import threading
+import warnings
+
+import numpy as np
+
+from .cache import version_marqueurs
+from .models import Equipement
+
+
+CARACTERISTIQUES = [
+    'puissance_W',
+    'puissance_VA',
+    'tension_V',
+    'capacite_Ah',
+    'energie_Wh',
+    'efficacite_module_pourcent',
+    'courant_charge_A',
+    'tension_max_PV_V',
+    'longueur_mm',
+    'largeur_mm',
+    'epaisseur_mm',
+    'poids_kg',
+]
+
+
+def _brutes(lignes):
+    """Tableau (n, caractéristiques) des valeurs, log(1 + x), NaN si non renseignée."""
+    valeurs = np.array(
+        [[np.nan if v is None else float(v) for v in ligne] for ligne in lignes], dtype=float,
+    ).reshape(len(lignes), len(CARACTERISTIQUES))
+    with np.errstate(invalid='ignore'):
+        return np.log1p(np.maximum(valeurs, 0))
+
+
+class CategorieSimilarite:
+    """Vecteurs normalisés des équipements actifs d'une catégorie."""
+
+    def __init__(self, ids, brutes):
+        self.ids = np.array(ids, dtype=np.int64)
+        with warnings.catch_warnings():
+            # Caractéristique absente de toute la catégorie : moyenne NaN, sans avertissement
+            warnings.simplefilter('ignore', RuntimeWarning)
+            self.moyenne = np.nanmean(brutes, axis=0)
+            ecart = np.nanstd(brutes, axis=0)
+        # Caractéristique constante ou absente : écart unitaire, elle ne départage rien
+        self.ecart = np.where(np.isfinite(ecart) & (ecart > 0), ecart, 1.0)
+        self.vecteurs = (brutes - self.moyenne) / self.ecart
+
+    def voisins(self, brute, k, exclure=None):
+        """[(id, distance, caractéristiques comparées)] des k plus proches de `brute`."""
+        vecteur = (brute - self.moyenne) / self.ecart
+        ecarts = self.vecteurs - vecteur
+        comparees = np.count_nonzero(~np.isnan(ecarts), axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            distances = np.sqrt(np.nansum(ecarts ** 2, axis=1) / comparees)
+        distances[comparees == 0] = np.inf
+        if exclure is not None:
+            distances[self.ids == exclure] = np.inf
+
+        nombre = min(k, int(np.count_nonzero(np.isfinite(distances))))
+        if not nombre:
+            return []
+        retenus = np.argpartition(distances, nombre - 1)[:nombre]
+        retenus = retenus[np.lexsort((self.ids[retenus], distances[retenus]))]
+        return [(int(self.ids[i]), float(distances[i]), int(comparees[i])) for i in retenus]
+
+
+class IndexSimilarite:
+
+    def __init__(self, version=None):
+        self.version = version
+        self.categories = {}
+
+    @classmethod
+    def construire(cls, version=None):
+        index = cls(version)
+        lignes = (
+            Equipement.objects.filter(actif=True).order_by('categorie_id', 'pk')
+            .values_list('categorie_id', 'pk', *CARACTERISTIQUES)
+        )
+        groupes = {}
+        for categorie_id, pk, *valeurs in lignes.iterator(chunk_size=2000):
+            ids, brutes = groupes.setdefault(categorie_id, ([], []))
+            ids.append(pk)
+            brutes.append(valeurs)
+        for categorie_id, (ids, brutes) in groupes.items():
+            index.categories[categorie_id] = CategorieSimilarite(ids, _brutes(brutes))
+        return index
+
+    def __len__(self):
+        return sum(len(categorie.ids) for categorie in self.categories.values())
+
+    def similaires(self, equipement, k=10):
+        """Voisins de `equipement` (actif ou non) dans sa catégorie."""
+        categorie = self.categories.get(equipement.categorie_id)
+        if categorie is None:
+            return []
+        brute = _brutes([[getattr(equipement, champ) for champ in CARACTERISTIQUES]])[0]
+        return categorie.voisins(brute, k, exclure=equipement.pk)
+
+
+_verrou = threading.Lock()
+_index = None
+
+
+def index_similarite():
+    """Index courant, (re)construit si absent ou en retard sur les marqueurs du catalogue."""
+    global _index
+    version = version_marqueurs()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _verrou:
+        if _index is None or _index.version != version:
+            _index = IndexSimilarite.construire(version)
+        return _index
@@ -0,0 +1,176 @@
+"""
+Analyse des caractéristiques saisies en texte libre par les fournisseurs
+("500-800 cycles @ 50% DoD", "12/24 (Auto-détection)", "1000 x 670 x 30",
+"-40 à +85", "0 à +5W") en colonnes numériques filtrables et triables en SQL.
+
+Comme product/flux.py, ce module ne dépend pas de Django : il est appelé par
+`normaliser_item` dans les processus d'analyse de l'import.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+
+# Une virgule suivie d'exactement trois chiffres sépare les milliers ("1,500"),
+# sinon c'est la virgule décimale ("2,5")
+_MILLIERS = r',(?=\d{3}(?!\d))'
+_VIRGULE_LISTE = r',(?!\d{3}(?!\d))'
+_NOMBRE = r'[-+]?\d+(?:,\d{3}(?!\d))*(?:[.,]\d+)?'
+# "à" / "a" seulement en minuscules et entre espaces : "40A 12V" ou "30 A 24V"
+# donnent l'intensité puis la tension, pas un intervalle
+_SEPARATEUR_INTERVALLE = r'(?:\s*(?:-|–|—|~|to|\.\.)\s*|\s+(?-i:à|a)\s+)'
+
+NOMBRE = re.compile(_NOMBRE)
+# Unité facultative répétée après la première borne : "-40°C to +85°C"
+_UNITE_BORNE = r'\s*(?:°\s*C|V|W|A)?'
+INTERVALLE = re.compile(
+    rf'(?P<min>{_NOMBRE}){_UNITE_BORNE}{_SEPARATEUR_INTERVALLE}(?P<max>{_NOMBRE})', re.IGNORECASE
+)
+PLUS_MOINS = re.compile(rf'(?:±|\+/-|\+-)\s*(?P<valeur>\d+(?:[.,]\d+)?)')
+DIMENSIONS = re.compile(
+    rf'(?P<a>\d+(?:[.,]\d+)?)\s*[x×*]\s*(?P<b>\d+(?:[.,]\d+)?)(?:\s*[x×*]\s*(?P<c>\d+(?:[.,]\d+)?))?'
+    r'\s*(?P<unite>mm|cm|m)?\b',
+    re.IGNORECASE,
+)
+PARENTHESES = re.compile(r'\([^)]*\)')
+
+FACTEURS_MM = {'mm': 1, 'cm': 10, 'm': 1000}
+# Tensions de parc de batteries retenues dans un intervalle de tension système ("12-48V")
+TENSIONS_PARC = (12, 24, 36, 48)
+
+
+def decimal(texte):
+    try:
+        return Decimal(re.sub(_MILLIERS, '', texte).replace(',', '.').lstrip('+'))
+    except (InvalidOperation, AttributeError):
+        return None
+
+
+def nombres(texte):
+    """Tous les nombres du texte, signe compris."""
+    return [decimal(n) for n in NOMBRE.findall(texte or '')]
+
+
+def intervalle(texte):
+    """
+    (min, max) d'une valeur ou d'un intervalle : "500-800 cycles" -> (500, 800),
+    "-40 à +85" ou "-40°C to +85°C" -> (-40, 85), "±3%" -> (-3, 3), "48" -> (48, 48).
+    Seul ce qui précède une précision entre parenthèses ou après '@' est lu.
+    """
+    if not texte:
+        return None, None
+    texte = PARENTHESES.sub(' ', str(texte)).split('@')[0]
+    correspondance = PLUS_MOINS.search(texte)
+    if correspondance:
+        valeur = decimal(correspondance.group('valeur'))
+        return -valeur, valeur
+    correspondance = INTERVALLE.search(texte)
+    if correspondance:
+        bornes = sorted([decimal(correspondance.group('min')), decimal(correspondance.group('max'))])
+        return bornes[0], bornes[1]
+    valeurs = nombres(texte)
+    if valeurs:
+        return valeurs[0], valeurs[0]
+    return None, None
+
+
+def liste_valeurs(texte, paliers=()):
+    """
+    Valeurs séparées par '/', ',' ou ';' : "12/24/48 (Auto-détection)" -> [12, 24, 48].
+    Un intervalle donne ses bornes et les `paliers` compris entre elles :
+    "12-48V" -> [12, 48], ou [12, 24, 48] avec les paliers (12, 24, 48).
+    """
+    if not texte:
+        return []
+    texte = PARENTHESES.sub(' ', str(texte))
+    valeurs = []
+    for morceau in re.split(rf'[/;]|{_VIRGULE_LISTE}|\bou\b|\bet\b', texte):
+        correspondance = INTERVALLE.search(morceau)
+        if correspondance:
+            bas, haut = sorted([decimal(correspondance.group('min')), decimal(correspondance.group('max'))])
+            trouvees = [bas, *(Decimal(p) for p in paliers if bas < p < haut), haut]
+        else:
+            nombre = NOMBRE.search(morceau)
+            trouvees = [decimal(nombre.group())] if nombre else []
+        for valeur in trouvees:
+            if valeur is not None and valeur not in valeurs:
+                valeurs.append(valeur)
+    return sorted(valeurs)
+
+
+def dimensions_mm(texte):
+    """(a, b, c) en mm de "1000 x 670 x 30" (c None pour deux dimensions), ou None."""
+    if not texte:
+        return None
+    correspondance = DIMENSIONS.search(str(texte))
+    if not correspondance:
+        return None
+    facteur = FACTEURS_MM[(correspondance.group('unite') or 'mm').lower()]
+    return tuple(
+        decimal(correspondance.group(cle)) * facteur if correspondance.group(cle) else None
+        for cle in ('a', 'b', 'c')
+    )
+
+
+def encoder_liste(valeurs):
+    """Liste encodée "/12/24/48/" : une valeur v est supportée si la chaîne contient "/v/"."""
+    if not valeurs:
+        return ''
+    return '/' + '/'.join(format(v.normalize(), 'f') for v in valeurs) + '/'
+
+
+# Colonnes dérivées d'Equipement, toujours recalculées à partir des champs texte
+CHAMPS_DERIVES = [
+    'cycle_vie_min',
+    'cycle_vie_max',
+    'tension_systeme_min_V',
+    'tension_systeme_max_V',
+    'tensions_systeme_V',
+    'longueur_mm',
+    'largeur_mm',
+    'epaisseur_mm',
+    'surface_m2',
+    'temperature_min_C',
+    'temperature_max_C',
+    'tolerance_puissance_min_W',
+    'tolerance_puissance_max_W',
+]
+
+
+def deriver(valeurs):
+    """
+    Colonnes dérivées (voir CHAMPS_DERIVES) à partir d'un dict de valeurs
+    d'Equipement ; une caractéristique absente ou illisible donne None.
+    """
+    derives = dict.fromkeys(CHAMPS_DERIVES)
+    derives['tensions_systeme_V'] = ''
+
+    cycles = intervalle(valeurs.get('cycle_vie_cycles'))
+    if cycles[0] is not None and cycles[0] >= 0:
+        derives['cycle_vie_min'], derives['cycle_vie_max'] = (int(c) for c in cycles)
+
+    tensions = liste_valeurs(valeurs.get('tension_systeme_V'), TENSIONS_PARC)
+    if tensions:
+        derives['tension_systeme_min_V'], derives['tension_systeme_max_V'] = tensions[0], tensions[-1]
+        derives['tensions_systeme_V'] = encoder_liste(tensions)
+
+    dimensions = dimensions_mm(valeurs.get('taille_mm')) or dimensions_mm(valeurs.get('taille'))
+    if dimensions:
+        derives['longueur_mm'], derives['largeur_mm'], derives['epaisseur_mm'] = dimensions
+        if dimensions[0] and dimensions[1]:
+            derives['surface_m2'] = (dimensions[0] * dimensions[1] / Decimal(1_000_000)).quantize(Decimal('0.0001'))
+
+    derives['temperature_min_C'], derives['temperature_max_C'] = intervalle(
+        valeurs.get('temperature_module_fonctionnement_C')
+    )
+
+    tolerance = valeurs.get('tolerance_puissance_W')
+    bornes = intervalle(tolerance)
+    if bornes[0] is not None:
+        if '%' in str(tolerance):
+            # Tolérance en pourcentage : ramenée en watts sur la puissance nominale
+            puissance = valeurs.get('puissance_W')
+            bornes = tuple(
+                (b * Decimal(puissance) / 100).quantize(Decimal('0.01')) for b in bornes
+            ) if puissance else (None, None)
+        derives['tolerance_puissance_min_W'], derives['tolerance_puissance_max_W'] = bornes
+    return derives
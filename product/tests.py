@@ -1,3 +1,1249 @@
-from django.test import TestCase
+import importlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+from collections import Counter
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.apps import apps
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.filters import OrderingFilter
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from idav.pagination import PaginationCurseur
+from . import autocompletion, compatibilite, lecture, recherche, similarite
+from .compatibilite import CHAMPS, REGLES, Famille
+from .cache import cache_catalogue, marquer_modification, version_marqueurs
+from .facettes import calculer_facettes, facettes_catalogue
+from .flux import analyser_en_parallele, lire_produits, normaliser_item
+from .importation import ImportateurCatalogue, champs_importables
+from .models import (
+    AttributEquipement, Categorie, Equipement, EquipementLecture, Marque, MarqueurCatalogue, PrixEquipement,
+    expression_attribut,
+)
+from .specs import deriver, intervalle, liste_valeurs
+from user.models import User
+
+
+class EditeurSchema:
+    """Ce qu'utilisent les étapes RunPython des migrations, sur la connexion de test."""
+    connection = connection
+
+    def execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+def enregistrements(*items):
+    champs, decimaux = champs_importables()
+    return [normaliser_item(item, champs, decimaux) for item in items]
+
+
+class ImportateurCatalogueTests(TestCase):
+    """Écriture par lots : création, mise à jour par clé naturelle, simulation."""
+
+    def produits(self, nombre, puissance=100, prefixe='Panneau'):
+        return enregistrements(*(
+            {'nom': f'{prefixe} {i}', 'categorie': 'Solaire', 'sous_categorie': 'Panneau',
+             'marque': 'Soleil', 'puissance_W': puissance}
+            for i in range(nombre)
+        ))
+
+    def test_creation_puis_mise_a_jour(self):
+        compteurs = ImportateurCatalogue(taille_lot=4).executer(self.produits(10))
+        self.assertEqual((compteurs['crees'], compteurs['mis_a_jour']), (10, 0))
+        self.assertEqual((compteurs['categories_creees'], compteurs['marques_creees']), (2, 1))
+        self.assertEqual(Categorie.objects.get(nom='Panneau').parent.nom, 'Solaire')
+
+        compteurs = ImportateurCatalogue(taille_lot=4).executer(self.produits(10, puissance=150))
+        self.assertEqual((compteurs['crees'], compteurs['mis_a_jour']), (0, 10))
+        self.assertEqual(Equipement.objects.count(), 10)
+        self.assertEqual(set(Equipement.objects.values_list('puissance_W', flat=True)), {150})
+
+    def verbes_sql(self, prefixe, nombre):
+        # Lot de `nombre` lignes existantes modifiées et autant de nouvelles
+        ImportateurCatalogue().executer(self.produits(nombre, prefixe=prefixe))
+        with CaptureQueriesContext(connection) as requetes:
+            ImportateurCatalogue(taille_lot=500).executer(self.produits(2 * nombre, prefixe=prefixe, puissance=150))
+        # executemany est journalisé "N times: <sql>"
+        verbes = Counter(re.sub(r'^\d+ times: ', '', r['sql']).split()[0] for r in requetes.captured_queries)
+        # Les INSERT sont découpés selon la limite de paramètres du moteur
+        del verbes['INSERT']
+        return verbes
+
+    def test_requetes_par_lot(self):
+        # Aucune requête par ligne : lectures et écritures en nombre fixe pour le lot
+        self.assertEqual(self.verbes_sql('A', 5), self.verbes_sql('B', 20))
+
+    def test_flux_inchange(self):
+        ImportateurCatalogue().executer(self.produits(10))
+        with CaptureQueriesContext(connection) as requetes:
+            compteurs = ImportateurCatalogue().executer(self.produits(10))
+        self.assertEqual((compteurs['inchanges'], compteurs['mis_a_jour'], compteurs['crees']), (10, 0, 0))
+        verbes = {r['sql'].split()[0] for r in requetes.captured_queries}
+        self.assertFalse(verbes & {'INSERT', 'UPDATE'})
+
+    def test_retrait_absents(self):
+        ImportateurCatalogue().executer(self.produits(3))
+        saisie = Equipement.objects.create(nom='Saisie manuelle', categorie=Categorie.objects.get(nom='Panneau'))
+
+        compteurs = ImportateurCatalogue(retirer_absents=True).executer(self.produits(2))
+
+        self.assertEqual(compteurs['retires'], 1)
+        self.assertFalse(Equipement.objects.get(nom='Panneau 2').actif)
+        saisie.refresh_from_db()
+        self.assertTrue(saisie.actif)
+
+        # Réapparu dans le flux : réactivé même si son contenu n'a pas changé
+        compteurs = ImportateurCatalogue().executer(self.produits(3))
+        self.assertEqual(compteurs['mis_a_jour'], 1)
+        self.assertTrue(Equipement.objects.get(nom='Panneau 2').actif)
+
+    def test_retrait_limite_au_flux(self):
+        ImportateurCatalogue(source='a').executer(self.produits(2, prefixe='A'))
+        ImportateurCatalogue(source='b').executer(self.produits(1, prefixe='B'))
+
+        compteurs = ImportateurCatalogue(source='a', retirer_absents=True).executer(self.produits(1, prefixe='A'))
+
+        self.assertEqual(compteurs['retires'], 1)
+        actifs = set(Equipement.objects.filter(actif=True).values_list('nom', flat=True))
+        self.assertEqual(actifs, {'A 0', 'B 0'})
+
+        # Passé dans un autre flux : réécrit pour retenir sa nouvelle source
+        compteurs = ImportateurCatalogue(source='b').executer(self.produits(1, prefixe='A'))
+        self.assertEqual(compteurs['mis_a_jour'], 1)
+        self.assertEqual(Equipement.objects.get(nom='A 0').source_import, 'b')
+
+    def test_simulation(self):
+        compteurs = ImportateurCatalogue(simulation=True).executer(self.produits(3))
+        self.assertEqual(compteurs['crees'], 3)
+        self.assertFalse(Equipement.objects.exists())
+        self.assertFalse(Categorie.objects.exists())
+
+
+class LecteurFluxTests(SimpleTestCase):
+    """lire_produits rend les mêmes produits quelle que soit la taille des blocs lus."""
+
+    PRODUITS = [
+        {'nom': 'Panneau [100W], mono', 'puissance_W': 100},
+        {'nom': 'Batterie "gel" 12V', 'caracteristiques': {'cycles': [500, 800], 'note': '}{ ] ,'}},
+        {'nom': 'Onduleur é à ü', 'tension_V': 24.5},
+    ]
+    TAILLES = [1, 2, 3, 7, 16, 64 * 1024]
+
+    def ecrire(self, contenu):
+        descripteur, chemin = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(descripteur, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+        self.addCleanup(os.remove, chemin)
+        return chemin
+
+    def lire(self, contenu):
+        chemin = self.ecrire(contenu)
+        return {taille: list(lire_produits(chemin, taille_bloc=taille)) for taille in self.TAILLES}
+
+    def test_tableau_json(self):
+        contenu = '  \n[\n' + ' ,\n'.join(json.dumps(p, ensure_ascii=False) for p in self.PRODUITS) + '\n]\n'
+        for taille, produits in self.lire(contenu).items():
+            with self.subTest(taille=taille):
+                self.assertEqual(produits, self.PRODUITS)
+
+    def test_ndjson(self):
+        contenu = '\n'.join(json.dumps(p, ensure_ascii=False) for p in self.PRODUITS) + '\n\n'
+        for taille, produits in self.lire(contenu).items():
+            with self.subTest(taille=taille):
+                self.assertEqual(produits, self.PRODUITS)
+
+    def test_ndjson_sans_saut_de_ligne_final(self):
+        contenu = '\n'.join(json.dumps(p) for p in self.PRODUITS)
+        for taille, produits in self.lire(contenu).items():
+            with self.subTest(taille=taille):
+                self.assertEqual(produits, self.PRODUITS)
+
+    def test_bom_utf8(self):
+        # Avec des blocs d'un caractère, le premier ne contient que le BOM
+        contenu = '\ufeff' + json.dumps(self.PRODUITS, ensure_ascii=False)
+        for taille, produits in self.lire(contenu).items():
+            with self.subTest(taille=taille):
+                self.assertEqual(produits, self.PRODUITS)
+
+    def test_fichier_vide_et_tableau_vide(self):
+        for contenu in ('', '  \n ', '[]', ' [ \n ] '):
+            for taille, produits in self.lire(contenu).items():
+                with self.subTest(contenu=contenu, taille=taille):
+                    self.assertEqual(produits, [])
+
+    def test_tableau_tronque(self):
+        chemin = self.ecrire('[{"nom": "a"}, {"nom": "b"')
+        for taille in self.TAILLES:
+            with self.subTest(taille=taille), self.assertRaises(ValueError):
+                list(lire_produits(chemin, taille_bloc=taille))
+
+    def test_produit_invalide_sans_lire_la_suite(self):
+        # Erreur au milieu du fichier : levée dès le bloc qui la contient
+        contenu = '[{"nom": "a"}, {"nom": b}, ' + ', '.join(['{"nom": "suite"}'] * 1000) + ']'
+        chemin = self.ecrire(contenu)
+        raw_decode = json.JSONDecoder.raw_decode
+        for taille in self.TAILLES:
+            with self.subTest(taille=taille), \
+                    mock.patch.object(json.JSONDecoder, 'raw_decode', autospec=True, side_effect=raw_decode) as decodage:
+                with self.assertRaisesRegex(ValueError, 'JSON invalide'):
+                    list(lire_produits(chemin, taille_bloc=taille))
+                self.assertLess(decodage.call_count, 100)
+
+    def test_taille_max_d_un_produit(self):
+        for contenu in (json.dumps([{'nom': 'a' * 500}]), json.dumps({'nom': 'a' * 500})):
+            chemin = self.ecrire(contenu)
+            with self.subTest(contenu=contenu[:1]), self.assertRaisesRegex(ValueError, 'plus de 100 caractères'):
+                list(lire_produits(chemin, taille_bloc=16, taille_max=100))
+
+
+class AnalyseParalleleTests(SimpleTestCase):
+    """Les processus d'analyse rendent les enregistrements d'une lecture séquentielle."""
+
+    def ecrire(self, produits):
+        descripteur, chemin = tempfile.mkstemp(suffix='.ndjson')
+        with os.fdopen(descripteur, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(json.dumps(p) for p in produits))
+        self.addCleanup(os.remove, chemin)
+        return chemin
+
+    def test_meme_resultat_que_la_lecture_sequentielle(self):
+        champs, decimaux = champs_importables()
+        fichiers = [
+            self.ecrire([{'nom': f'Produit {f}-{i}', 'puissance_W': i} for i in range(25)])
+            for f in range(3)
+        ]
+        sequentiel = sorted(
+            (chemin, normaliser_item(item, champs, decimaux)['champs']['nom'])
+            for chemin in fichiers for item in lire_produits(chemin)
+        )
+        fins = []
+        parallele = sorted(
+            (chemin, e['champs']['nom'])
+            for chemin, e in analyser_en_parallele(
+                fichiers, champs, decimaux, 2, 10, lambda evenement, chemin, *details: fins.append(evenement)
+            )
+        )
+        self.assertEqual(parallele, sequentiel)
+        self.assertEqual(fins.count('fin'), 3)
+
+    def test_erreur_d_analyse(self):
+        champs, decimaux = champs_importables()
+        fichiers = [self.ecrire([{'nom': 'A'}]), self.ecrire([])]
+        with open(fichiers[1], 'w') as f:
+            f.write('[{"nom": "tronqué"')
+        manager = multiprocessing.Manager()
+        with mock.patch('multiprocessing.Manager', return_value=manager), \
+                mock.patch.object(manager, 'shutdown', wraps=manager.shutdown) as shutdown:
+            with self.assertRaises(ValueError):
+                list(analyser_en_parallele(fichiers, champs, decimaux, 2, 10))
+        # Le gestionnaire n'est arrêté qu'une fois, avant d'attendre le pool
+        shutdown.assert_called_once_with()
+
+    def test_produit_qui_n_est_pas_un_objet(self):
+        champs, decimaux = champs_importables()
+        with self.assertRaises(ValueError):
+            normaliser_item([1, 2], champs, decimaux)
+        fichiers = [self.ecrire([{'nom': 'A'}, [1, 2]])]
+        with self.assertRaisesRegex(ValueError, 'objet JSON attendu'):
+            list(analyser_en_parallele(fichiers, champs, decimaux, 2, 10))
+
+
+class FiltreDescendantsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.chemins = ['/1/', '/1/5/', '/1/50/', '/1/5/7/', '/10/', '/10/1/', '/2/1/']
+        for i, chemin in enumerate(cls.chemins):
+            categorie = Categorie.objects.create(nom=f'Catégorie {i}')
+            Categorie.objects.filter(pk=categorie.pk).update(chemin=chemin)
+
+    def descendants(self, chemin):
+        return set(Categorie.objects.filter(Categorie.filtre_descendants(chemin)).values_list('chemin', flat=True))
+
+    def test_prefixe_voisin_exclu(self):
+        self.assertEqual(self.descendants('/1/'), {'/1/', '/1/5/', '/1/50/', '/1/5/7/'})
+        self.assertEqual(self.descendants('/1/5/'), {'/1/5/', '/1/5/7/'})
+        self.assertEqual(self.descendants('/10/'), {'/10/', '/10/1/'})
+
+    def test_prefixe_independant_de_la_collation(self):
+        # Un intervalle sur `chemin` supposerait l'ordre des octets
+        requete = str(Categorie.objects.filter(Categorie.filtre_descendants('/1/')).query)
+        self.assertIn('LIKE', requete)
+
+    def test_champ_lie(self):
+        categorie = Categorie.objects.get(chemin='/1/5/7/')
+        voisine = Categorie.objects.get(chemin='/10/1/')
+        dans = Equipement.objects.create(nom='Dans le sous-arbre', categorie=categorie)
+        Equipement.objects.create(nom='Hors du sous-arbre', categorie=voisine)
+        equipements = Equipement.objects.filter(Categorie.filtre_descendants('/1/', 'categorie__chemin'))
+        self.assertEqual(list(equipements), [dans])
+
+
+class ArbreCategoriesTests(TestCase):
+    """Chemins matérialisés tenus à jour par save() et arbre lu en une requête."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.solaire = Categorie.objects.create(nom='Solaire')
+        cls.stockage = Categorie.objects.create(nom='Stockage', parent=cls.solaire)
+        cls.batterie = Categorie.objects.create(nom='Batterie', parent=cls.stockage)
+        cls.appareils = Categorie.objects.create(nom='Appareils')
+        cls.utilisateur = User.objects.create_user('tech@example.com', 'motdepasse', role='technicien')
+
+    def test_chemins(self):
+        self.batterie.refresh_from_db()
+        self.assertEqual(self.batterie.chemin, f'/{self.solaire.pk}/{self.stockage.pk}/{self.batterie.pk}/')
+        self.assertEqual(self.batterie.profondeur, 2)
+
+    def test_deplacement_du_sous_arbre(self):
+        self.stockage.parent = self.appareils
+        self.stockage.save()
+        self.batterie.refresh_from_db()
+        self.assertEqual(self.batterie.chemin, f'/{self.appareils.pk}/{self.stockage.pk}/{self.batterie.pk}/')
+        self.assertEqual(self.batterie.profondeur, 2)
+
+        self.stockage.parent = self.batterie
+        with self.assertRaises(ValueError):
+            self.stockage.save()
+
+    def test_arbre_en_une_requete(self):
+        client = APIClient()
+        client.force_authenticate(self.utilisateur)
+        cache_catalogue().clear()
+        # Marqueurs de modification (ETag), puis les nœuds
+        with self.assertNumQueries(2):
+            response = client.get('/product/api/categories/arbre/')
+        self.assertEqual([n['nom'] for n in response.json()], ['Solaire', 'Appareils'])
+        self.assertEqual(response.json()[0]['enfants'][0]['enfants'][0]['nom'], 'Batterie')
+
+        with self.assertNumQueries(3):
+            response = client.get(f'/product/api/categories/arbre/?racine={self.stockage.pk}')
+        self.assertEqual([n['nom'] for n in response.json()], ['Stockage'])
+        self.assertEqual(response.json()[0]['enfants'][0]['nom'], 'Batterie')
+
+
+class CacheCatalogueTests(TestCase):
+    """Réponses du catalogue servies depuis le cache jusqu'à la prochaine écriture."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorie = Categorie.objects.create(nom='Batterie')
+        cls.equipement = Equipement.objects.create(nom='Batterie 100Ah', categorie=cls.categorie, tension_V=12)
+
+    def setUp(self):
+        cache_catalogue().clear()
+        self.client = APIClient()
+
+    def lire(self, url='/product/api/equipements/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_lecture_en_cache(self):
+        premiere = self.lire()
+        # Seule la lecture des marqueurs (ETag) touche la base
+        with self.assertNumQueries(1):
+            self.assertEqual(self.lire(), premiere)
+
+    def test_ecriture_invalide(self):
+        self.lire()
+        version = version_marqueurs()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipement.tension_V = 24
+            self.equipement.save()
+        self.assertEqual(version_marqueurs(), version + 1)
+        self.assertEqual(self.lire()['results'][0]['tension_V'], '24.00')
+
+    def test_invalidation_explicite(self):
+        # Écritures bulk de l'import : aucun signal, marqueur incrémenté par la commande
+        self.lire()
+        Equipement.objects.filter(pk=self.equipement.pk).update(nom='Batterie renommée')
+        self.assertEqual(self.lire()['results'][0]['nom'], 'Batterie 100Ah')
+        marquer_modification('equipement')
+        self.assertEqual(self.lire()['results'][0]['nom'], 'Batterie renommée')
+
+    def test_ecriture_d_un_autre_processus(self):
+        # Un autre processus (import, autre worker) n'a accès qu'à la base : il modifie
+        # la ligne et le marqueur sans toucher au cache local de celui-ci
+        response = self.client.get('/product/api/equipements/')
+        etag = response['ETag']
+        Equipement.objects.filter(pk=self.equipement.pk).update(nom='Batterie renommée')
+        MarqueurCatalogue.objects.update_or_create(table='equipement', defaults={'version': 1000})
+
+        response = self.client.get('/product/api/equipements/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # Nouvel ETag, nouveau contenu : jamais l'ancienne réponse sous le nouvel ETag
+        self.assertEqual(response.json()['results'][0]['nom'], 'Batterie renommée')
+        response = self.client.get(f'/product/api/equipements/{self.equipement.pk}/')
+        self.assertEqual(response.json()['nom'], 'Batterie renommée')
+
+
+class RequetesConditionnellesTests(TestCase):
+    """ETag / Last-Modified dérivés des marqueurs de modification du catalogue."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorie = Categorie.objects.create(nom='Batterie')
+        cls.equipement = Equipement.objects.create(nom='Batterie 100Ah', categorie=cls.categorie)
+        marquer_modification('categorie', 'marque', 'equipement')
+
+    def setUp(self):
+        cache_catalogue().clear()
+        self.client = APIClient()
+
+    def test_304_sur_etag_identique(self):
+        response = self.client.get('/product/api/equipements/')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get('/product/api/equipements/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_par_requete(self):
+        tous = self.client.get('/product/api/equipements/')['ETag']
+        tries = self.client.get('/product/api/equipements/?ordering=-nom')['ETag']
+        self.assertNotEqual(tous, tries)
+
+    def test_etag_change_apres_ecriture(self):
+        etag = self.client.get('/product/api/equipements/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categorie.nom = 'Batteries'
+            self.categorie.save()
+        response = self.client.get('/product/api/equipements/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['categorie']['nom'], 'Batteries')
+
+
+class ChampsDynamiquesTests(TestCase):
+    """?fields= et ?omit= : champs sérialisés et colonnes lues."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categorie = Categorie.objects.create(nom='Panneau')
+        marque = Marque.objects.create(nom='Soleil')
+        Equipement.objects.create(nom='Panneau 100W', categorie=categorie, marque=marque, puissance_W=100)
+
+    def setUp(self):
+        cache_catalogue().clear()
+        self.client = APIClient()
+
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get('/product/api/equipements/?fields=id,nom,puissance_W')
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'nom', 'puissance_W'])
+        lecture = next(r['sql'] for r in requetes.captured_queries if 'FROM "product_equipement"' in r['sql'])
+        self.assertNotIn('description', lecture)
+        self.assertNotIn('JOIN', lecture)
+
+    def test_omit(self):
+        produit = self.client.get('/product/api/equipements/?omit=description,categorie').json()['results'][0]
+        self.assertNotIn('description', produit)
+        self.assertNotIn('categorie', produit)
+        self.assertEqual(produit['marque']['nom'], 'Soleil')
+
+    def test_imbrique_intact(self):
+        produit = self.client.get('/product/api/equipements/?fields=nom,categorie').json()['results'][0]
+        self.assertEqual(set(produit['categorie']), {'id', 'nom', 'parent', 'chemin', 'profondeur', 'enfants'})
+
+    def test_champ_inconnu(self):
+        response = self.client.get('/product/api/equipements/?fields=nom,inexistant')
+        self.assertEqual(response.status_code, 400)
+
+
+def curseur(lien):
+    return parse_qs(urlparse(lien).query)['cursor'][0]
+
+
+class VueTri:
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['puissance_W', 'nom']
+    ordering = ['nom']
+
+
+class PaginationCurseurTests(TestCase):
+    """Parcours complet, en avant puis en arrière, sur une clé de tri nullable et non unique."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categorie = Categorie.objects.create(nom='Solaire')
+        puissances = [None, 100, 200, None, 100, 300, None, 200, 100]
+        for i, puissance in enumerate(puissances):
+            Equipement.objects.create(nom=f'Équipement {i}', categorie=categorie, puissance_W=puissance)
+
+    def page(self, parametres):
+        pagination = PaginationCurseur()
+        requete = Request(APIRequestFactory().get('/equipements/', parametres))
+        page = pagination.paginate_queryset(Equipement.objects.all(), requete, VueTri())
+        return [e.pk for e in page], pagination.get_next_link(), pagination.get_previous_link()
+
+    def parcourir(self, ordering, page_size=2):
+        parametres = {'ordering': ordering, 'page_size': page_size}
+        pages = []
+        ids, suivant, _ = self.page(parametres)
+        pages.append(ids)
+        while suivant:
+            ids, suivant, precedent = self.page({**parametres, 'cursor': curseur(suivant)})
+            pages.append(ids)
+
+        retour = [pages[-1]]
+        while precedent:
+            ids, _, precedent = self.page({**parametres, 'cursor': curseur(precedent)})
+            retour.insert(0, ids)
+        return pages, retour
+
+    def attendu(self, decroissant):
+        lignes = list(Equipement.objects.values_list('pk', 'puissance_W'))
+        renseignees = sorted((l for l in lignes if l[1] is not None), key=lambda l: (l[1], l[0]), reverse=decroissant)
+        nulles = sorted((l for l in lignes if l[1] is None), key=lambda l: l[0], reverse=decroissant)
+        return [pk for pk, _ in renseignees + nulles]
+
+    def test_croissant_null_en_dernier(self):
+        pages, retour = self.parcourir('puissance_W')
+        self.assertEqual([pk for page in pages for pk in page], self.attendu(decroissant=False))
+        self.assertEqual(retour, pages)
+
+    def test_decroissant_null_en_dernier(self):
+        pages, retour = self.parcourir('-puissance_W')
+        self.assertEqual([pk for page in pages for pk in page], self.attendu(decroissant=True))
+        self.assertEqual(retour, pages)
+
+    def test_pages_de_une_ligne(self):
+        pages, retour = self.parcourir('puissance_W', page_size=1)
+        self.assertEqual(len(pages), Equipement.objects.count())
+        self.assertEqual(retour, pages)
+
+    def test_comptage_sur_demande(self):
+        client = APIClient()
+        self.assertNotIn('count', client.get('/product/api/equipements/').json())
+        self.assertEqual(client.get('/product/api/equipements/?count=true').json()['count'], 9)
+
+    def test_curseur_invalide(self):
+        client = APIClient()
+        # Pas du base64, puis {"v":["abc",1]}, {"v":[100,"x"]} et {"v":[100]}
+        for brut in ['pas-du-base64', 'eyJ2IjpbImFiYyIsMV19', 'eyJ2IjpbMTAwLCJ4Il19', 'eyJ2IjpbMTAwXX0=']:
+            response = client.get('/product/api/equipements/', {'ordering': 'puissance_W', 'cursor': brut})
+            self.assertEqual(response.status_code, 404, brut)
+            self.assertEqual(response.json(), {'detail': 'Curseur invalide.'})
+
+
+class FiltresEquipementTests(TestCase):
+    """Filtres exacts, d'intervalle et de liste sur les caractéristiques."""
+
+    @classmethod
+    def setUpTestData(cls):
+        solaire = Categorie.objects.create(nom='Solaire')
+        batteries = Categorie.objects.create(nom='Batterie', parent=solaire)
+        cls.autre = Categorie.objects.create(nom='Appareils')
+        for tension, capacite in [(12, 100), (12, 200), (24, 150), (48, 100)]:
+            Equipement.objects.create(
+                nom=f'Batterie {tension}V {capacite}Ah', categorie=batteries, tension_V=tension, capacite_Ah=capacite,
+            )
+        Equipement.objects.create(nom='Ventilateur', categorie=cls.autre, mode='AC')
+        cls.solaire = solaire
+
+    def setUp(self):
+        cache_catalogue().clear()
+
+    def noms(self, parametres):
+        response = APIClient().get('/product/api/equipements/', parametres)
+        self.assertEqual(response.status_code, 200)
+        return {e['nom'] for e in response.json()['results']}
+
+    def test_intervalle_et_exact(self):
+        self.assertEqual(
+            self.noms({'tension_V': 12, 'capacite_Ah__gte': 150}), {'Batterie 12V 200Ah'},
+        )
+        self.assertEqual(
+            self.noms({'capacite_Ah__range': '100,150', 'tension_V__lt': 48}),
+            {'Batterie 12V 100Ah', 'Batterie 24V 150Ah'},
+        )
+
+    def test_liste(self):
+        self.assertEqual(self.noms({'tension_V__in': '24,48'}), {'Batterie 24V 150Ah', 'Batterie 48V 100Ah'})
+
+    def test_categorie_et_descendants(self):
+        self.assertEqual(len(self.noms({'categorie': self.solaire.pk})), 4)
+        self.assertEqual(self.noms({'categorie': self.autre.pk}), {'Ventilateur'})
+        response = APIClient().get('/product/api/equipements/', {'categorie': 999999})
+        self.assertEqual(response.status_code, 400)
+
+
+class RechercheTests(TestCase):
+    """Recherche plein texte : normalisation, préfixes et classement par pertinence."""
+
+    @classmethod
+    def setUpTestData(cls):
+        panneaux = Categorie.objects.create(nom='Panneau Solaire')
+        batteries = Categorie.objects.create(nom='Batterie')
+        victron = Marque.objects.create(nom='Victron')
+        cls.panneau = Equipement.objects.create(
+            nom='Panneau mono-cristallin 100W', categorie=panneaux, marque=victron,
+        )
+        cls.batterie = Equipement.objects.create(
+            nom='Batterie gel 100Ah', categorie=batteries, description='Compatible panneau monocristallin',
+        )
+        Equipement.objects.create(nom='Onduleur hybride', categorie=batteries, marque=victron)
+
+    def setUp(self):
+        cache_catalogue().clear()
+
+    def ids(self, texte, **parametres):
+        response = APIClient().get('/product/api/equipements/', {'search': texte, **parametres})
+        self.assertEqual(response.status_code, 200)
+        return [e['id'] for e in response.json()['results']]
+
+    def test_mots_composes_et_accents(self):
+        self.assertEqual(recherche.tokens_document('Mono-cristallin Élevé'), 'monocristallin mono cristallin eleve')
+        self.assertEqual(self.ids('monocristallin'), [self.panneau.pk, self.batterie.pk])
+        self.assertEqual(self.ids('mono-cristallin'), [self.panneau.pk, self.batterie.pk])
+
+    def test_prefixe_et_tous_les_mots(self):
+        self.assertEqual(len(self.ids('ond')), 1)
+        self.assertEqual(self.ids('victron pann'), [self.panneau.pk])
+
+    def test_nom_avant_description(self):
+        # "panneau" est dans le nom du premier, seulement dans la description du second
+        self.assertEqual(self.ids('panneau'), [self.panneau.pk, self.batterie.pk])
+        # Un tri explicite l'emporte sur la pertinence
+        self.assertEqual(self.ids('panneau', ordering='nom'), [self.batterie.pk, self.panneau.pk])
+
+    def test_index_suit_les_modifications(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batterie.nom = 'Batterie lithium 100Ah'
+            self.batterie.save()
+        self.assertEqual(self.ids('lithium'), [self.batterie.pk])
+        self.assertEqual(self.ids('gel'), [])
+
+    def test_index_rempli_par_la_migration(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {recherche.TABLE_INDEX}")
+        self.assertEqual(self.ids('monocristallin'), [])
+        migration = importlib.import_module('product.migrations.0006_recherche_plein_texte')
+        migration.creer_index(apps, EditeurSchema())
+        cache_catalogue().clear()
+        self.assertEqual(self.ids('monocristallin'), [self.panneau.pk, self.batterie.pk])
+        self.assertEqual(self.ids('victron pann'), [self.panneau.pk])
+
+
+class AutocompletionTests(TestCase):
+    """Index de préfixes : débuts de mot, classement par type, mises à jour."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorie = Categorie.objects.create(nom='Onduleurs')
+        cls.marque = Marque.objects.create(nom='Ondulys')
+        cls.onduleur = Equipement.objects.create(nom='Onduleur hybride 5kW', categorie=cls.categorie)
+        Equipement.objects.create(nom='Panneau mono-cristallin', categorie=cls.categorie)
+        Equipement.objects.create(nom='Onduleur retiré', categorie=cls.categorie, actif=False)
+
+    def setUp(self):
+        autocompletion._index = None
+        cache_catalogue().clear()
+
+    def noms(self, texte, **options):
+        return [nom for _, _, nom in autocompletion.completer(texte, **options)]
+
+    def test_debuts_de_mot(self):
+        self.assertEqual(self.noms('hyb'), ['Onduleur hybride 5kW'])
+        self.assertEqual(self.noms('5k'), ['Onduleur hybride 5kW'])
+        self.assertEqual(self.noms('monocris'), ['Panneau mono-cristallin'])
+        self.assertEqual(self.noms('cristallin'), ['Panneau mono-cristallin'])
+        self.assertEqual(self.noms('xyz'), [])
+
+    def test_classement(self):
+        # Marque, puis catégorie, puis équipement ; les équipements inactifs sont exclus
+        self.assertEqual(self.noms('ond'), ['Ondulys', 'Onduleurs', 'Onduleur hybride 5kW'])
+        self.assertEqual(self.noms('ond', limite=1), ['Ondulys'])
+        self.assertEqual(self.noms('ond', types=['equipement']), ['Onduleur hybride 5kW'])
+
+    def test_ecriture_appliquee(self):
+        self.noms('ond')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.onduleur.nom = 'Convertisseur hybride'
+            self.onduleur.save()
+        # Écriture reportée sur l'index : seule la version est relue, pas le catalogue
+        with self.assertNumQueries(1):
+            self.assertEqual(self.noms('conv'), ['Convertisseur hybride'])
+        self.assertEqual(self.noms('ond', types=['equipement']), [])
+
+    def test_reconstruit_apres_ecriture_ailleurs(self):
+        # Import en masse ou autre processus : seuls la base et son marqueur changent
+        self.noms('ond')
+        Marque.objects.filter(pk=self.marque.pk).update(nom='Victron')
+        marquer_modification('marque')
+        self.assertEqual(self.noms('vic'), ['Victron'])
+
+    def test_api(self):
+        response = APIClient().get('/product/api/autocompletion/', {'q': 'ond', 'types': 'marque'})
+        self.assertEqual(response.json()['results'], [{'type': 'marque', 'id': self.marque.pk, 'nom': 'Ondulys'}])
+        response = APIClient().get('/product/api/autocompletion/', {'q': 'ond', 'types': 'inconnu'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FacettesTests(TestCase):
+    """Comptes par catégorie, marque et mode, en une requête."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batteries = Categorie.objects.create(nom='Batterie')
+        cls.appareils = Categorie.objects.create(nom='Appareils')
+        cls.victron = Marque.objects.create(nom='Victron')
+        Equipement.objects.create(nom='Batterie 12V', categorie=cls.batteries, marque=cls.victron, mode='DC', tension_V=12)
+        Equipement.objects.create(nom='Batterie 24V', categorie=cls.batteries, marque=cls.victron, mode='DC', tension_V=24)
+        Equipement.objects.create(nom='Ventilateur', categorie=cls.appareils, mode='AC')
+        Equipement.objects.create(nom='Ancien', categorie=cls.appareils, actif=False)
+
+    def setUp(self):
+        cache_catalogue().clear()
+
+    def test_comptes_en_une_requete(self):
+        with self.assertNumQueries(1):
+            facettes = calculer_facettes(Equipement.objects.filter(actif=True))
+        self.assertEqual(facettes['total'], 3)
+        self.assertEqual(facettes['categorie'], [
+            {'id': self.batteries.pk, 'nom': 'Batterie', 'nombre': 2},
+            {'id': self.appareils.pk, 'nom': 'Appareils', 'nombre': 1},
+        ])
+        self.assertEqual(facettes['marque'], [
+            {'id': self.victron.pk, 'nom': 'Victron', 'nombre': 2},
+            {'id': None, 'nom': None, 'nombre': 1},
+        ])
+        self.assertEqual(facettes['mode'], [{'valeur': 'DC', 'nombre': 2}, {'valeur': 'AC', 'nombre': 1}])
+
+    def test_catalogue_complet_en_cache(self):
+        facettes_catalogue()
+        # Seule la version des marqueurs est relue
+        with self.assertNumQueries(1):
+            self.assertEqual(facettes_catalogue()['total'], 3)
+
+    def test_recalcul_apres_ecriture_ailleurs(self):
+        facettes_catalogue()
+        # Écriture bulk d'un autre processus : seul le marqueur en base change
+        Equipement.objects.filter(nom='Ancien').update(actif=True)
+        marquer_modification('equipement')
+        self.assertEqual(facettes_catalogue()['total'], 4)
+
+    def test_filtres_de_la_liste(self):
+        response = APIClient().get('/product/api/equipements/facettes/', {'tension_V__gte': 20})
+        self.assertEqual(response.json()['total'], 1)
+        self.assertEqual(response.json()['mode'], [{'valeur': 'DC', 'nombre': 1}])
+
+
+class IntervalleTests(SimpleTestCase):
+
+    def test_formes_reconnues(self):
+        cas = {
+            "500-800 cycles": (500, 800),
+            "-40 à +85": (-40, 85),
+            "-40°C to +85°C": (-40, 85),
+            "-20 °C ~ 60 °C": (-20, 60),
+            "10A-60A": (10, 60),
+            "150V - 450V (MPPT)": (150, 450),
+            "±3%": (-3, 3),
+            "48": (48, 48),
+            "1,500-2,000 cycles": (1500, 2000),
+            "2,5 à 3,5": (Decimal('2.5'), Decimal('3.5')),
+            # Intensité puis tension, pas un intervalle
+            "40A 12V": (40, 40),
+            "30 A 24V": (30, 30),
+        }
+        for texte, attendu in cas.items():
+            with self.subTest(texte=texte):
+                self.assertEqual(intervalle(texte), tuple(Decimal(v) for v in attendu))
+
+    def test_liste_de_valeurs(self):
+        self.assertEqual(liste_valeurs('12,24,48'), [12, 24, 48])
+        self.assertEqual(liste_valeurs('12-48V'), [12, 48])
+        self.assertEqual(liste_valeurs('12 à 48 V', paliers=(12, 24, 36, 48, 96)), [12, 24, 36, 48])
+        self.assertEqual(deriver({'tension_systeme_V': '12-48V'})['tensions_systeme_V'], '/12/24/36/48/')
+
+    def test_vide(self):
+        self.assertEqual(intervalle(''), (None, None))
+        self.assertEqual(intervalle('non précisé'), (None, None))
+
+
+class SpecsNormaliseesTests(TestCase):
+    """Colonnes numériques dérivées des caractéristiques en texte libre."""
+
+    def test_deriver(self):
+        derives = deriver({
+            'cycle_vie_cycles': '500-800 cycles @ 50% DoD',
+            'tension_systeme_V': '12/24/48 (Auto-détection)',
+            'taille_mm': '100 x 67 x 3 cm',
+            'tolerance_puissance_W': '0~+3%',
+            'puissance_W': 300,
+        })
+        self.assertEqual((derives['cycle_vie_min'], derives['cycle_vie_max']), (500, 800))
+        self.assertEqual(liste_valeurs('12/24/48 (Auto-détection)'), [12, 24, 48])
+        self.assertEqual(derives['tensions_systeme_V'], '/12/24/48/')
+        self.assertEqual((derives['longueur_mm'], derives['largeur_mm'], derives['epaisseur_mm']), (1000, 670, 30))
+        self.assertEqual(derives['surface_m2'], Decimal('0.67'))
+        self.assertEqual((derives['tolerance_puissance_min_W'], derives['tolerance_puissance_max_W']), (0, 9))
+        self.assertIsNone(derives['temperature_min_C'])
+
+    def test_save_et_filtre_tension_systeme(self):
+        categorie = Categorie.objects.create(nom='Régulateur')
+        regulateur = Equipement.objects.create(nom='MPPT 40A', categorie=categorie, tension_systeme_V='12/24 V')
+        Equipement.objects.create(nom='MPPT 60A', categorie=categorie, tension_systeme_V='48')
+        self.assertEqual(regulateur.tensions_systeme_V, '/12/24/')
+
+        cache_catalogue().clear()
+        response = APIClient().get('/product/api/equipements/', {'tension_systeme_supportee': 24})
+        self.assertEqual([e['nom'] for e in response.json()['results']], ['MPPT 40A'])
+
+
+class AttributsTests(TestCase):
+    """Filtres et facettes sur caracteristiques_additionnelles."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categorie = Categorie.objects.create(nom='Onduleur')
+        Equipement.objects.create(
+            nom='Onduleur A', categorie=categorie,
+            caracteristiques_additionnelles={'garantie_ans': 10, 'indice_protection': 'IP65', 'nombre_mppt': 2},
+        )
+        Equipement.objects.create(
+            nom='Onduleur B', categorie=categorie,
+            caracteristiques_additionnelles={'garantie_ans': 5, 'indice_protection': 'IP21'},
+        )
+        Equipement.objects.create(
+            nom='Onduleur C', categorie=categorie,
+            caracteristiques_additionnelles=['Écran LCD', 'Protection surcharge'],
+        )
+        Equipement.objects.create(
+            nom='Onduleur D', categorie=categorie,
+            caracteristiques_additionnelles={'garantie_ans': '10 ans', 'nombre_mppt': 'deux'},
+        )
+
+    def setUp(self):
+        cache_catalogue().clear()
+
+    def noms(self, parametres):
+        response = APIClient().get('/product/api/equipements/', parametres)
+        self.assertEqual(response.status_code, 200)
+        return {e['nom'] for e in response.json()['results']}
+
+    def test_table_cle_valeur(self):
+        self.assertEqual(
+            set(AttributEquipement.objects.filter(equipement__nom='Onduleur C').values_list('cle', 'valeur')),
+            {('caracteristique', 'Écran LCD'), ('caracteristique', 'Protection surcharge')},
+        )
+        self.assertEqual(
+            AttributEquipement.objects.get(equipement__nom='Onduleur A', cle='garantie_ans').valeur_nombre, 10,
+        )
+
+    def test_attributs_promus(self):
+        self.assertEqual(self.noms({'attribut_garantie_ans__gte': 8}), {'Onduleur A'})
+        self.assertEqual(self.noms({'attribut_garantie_ans__lt': 8}), {'Onduleur B'})
+        self.assertEqual(self.noms({'attribut_indice_protection': 'IP21'}), {'Onduleur B'})
+
+    def test_valeur_non_numerique(self):
+        # "10 ans" n'est pas un nombre JSON : ni converti à moitié, ni en erreur
+        self.assertEqual(self.noms({'attribut_garantie_ans__gte': 8}), {'Onduleur A'})
+        self.assertEqual(self.noms({'attribut_nombre_mppt__gte': 0}), {'Onduleur A'})
+
+    def test_filtre_sur_l_index(self):
+        requete = Equipement.objects.alias(g=expression_attribut('garantie_ans')).filter(g__gte=8)
+        sql, parametres = requete.values('pk').query.sql_with_params()
+        with connection.cursor() as curseur:
+            curseur.execute(f'EXPLAIN QUERY PLAN {sql}', parametres)
+            plan = ' '.join(str(ligne) for ligne in curseur.fetchall())
+        self.assertIn('eq_attr_garantie_ans_idx', plan)
+
+    def test_attributs_non_promus(self):
+        self.assertEqual(self.noms({'caracteristique': 'Écran LCD'}), {'Onduleur C'})
+        self.assertEqual(self.noms({'attribut': 'nombre_mppt:2'}), {'Onduleur A'})
+        self.assertEqual(self.noms({'attribut': 'indice_protection'}), {'Onduleur A', 'Onduleur B'})
+
+    def test_facettes(self):
+        attributs = calculer_facettes(Equipement.objects.all())['attributs']
+        self.assertEqual(attributs['indice_protection'], [{'valeur': 'IP21', 'nombre': 1}, {'valeur': 'IP65', 'nombre': 1}])
+        self.assertNotIn('caracteristique', attributs)
+
+    def test_table_remplie_par_la_migration(self):
+        attendu = set(AttributEquipement.objects.values_list('equipement_id', 'cle', 'valeur', 'valeur_nombre'))
+        AttributEquipement.objects.all().delete()
+        migration = importlib.import_module('product.migrations.0008_attributs_equipement')
+        migration.remplir_attributs(apps, EditeurSchema())
+        self.assertEqual(
+            set(AttributEquipement.objects.values_list('equipement_id', 'cle', 'valeur', 'valeur_nombre')), attendu,
+        )
+
+
+class LotEquipementsTests(TestCase):
+    """Lecture d'une liste d'ids en une requête, dans l'ordre demandé."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categorie = Categorie.objects.create(nom='Batterie')
+        cls.ids = [
+            Equipement.objects.create(nom=f'Batterie {i}', categorie=categorie, tension_V=12).pk
+            for i in range(3)
+        ]
+        cls.retire = Equipement.objects.create(nom='Retirée', categorie=categorie, actif=False).pk
+
+    def setUp(self):
+        cache_catalogue().clear()
+        self.client = APIClient()
+
+    def test_get_dans_l_ordre(self):
+        demandes = [self.ids[2], self.retire, self.ids[0], 999999]
+        response = self.client.get('/product/api/equipements/lot/', {'ids': ','.join(map(str, demandes))})
+        self.assertEqual([e['id'] for e in response.json()['results']], [self.ids[2], self.ids[0]])
+        self.assertEqual(response.json()['manquants'], [self.retire, 999999])
+
+    def test_post_et_champs(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.post(
+                '/product/api/equipements/lot/?fields=id,nom', {'ids': self.ids}, format='json',
+            )
+        self.assertEqual(response.json()['results'][1], {'id': self.ids[1], 'nom': 'Batterie 1'})
+        lectures = [r for r in requetes.captured_queries if 'FROM "product_equipement"' in r['sql']]
+        self.assertEqual(len(lectures), 1)
+
+    def test_parametres_invalides(self):
+        self.assertEqual(self.client.get('/product/api/equipements/lot/').status_code, 400)
+        self.assertEqual(self.client.get('/product/api/equipements/lot/', {'ids': 'a,b'}).status_code, 400)
+        trop = {'ids': list(range(1, 202))}
+        self.assertEqual(self.client.post('/product/api/equipements/lot/', trop, format='json').status_code, 400)
+
+
+class ModeleLectureTests(TestCase):
+    """Documents dénormalisés tenus à jour à l'écriture et liste en flux."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.solaire = Categorie.objects.create(nom='Solaire')
+        cls.batteries = Categorie.objects.create(nom='Batterie', parent=cls.solaire)
+        cls.appareils = Categorie.objects.create(nom='Appareils')
+        cls.marque = Marque.objects.create(nom='Victron')
+        cls.batterie = Equipement.objects.create(
+            nom='Batterie 100Ah', categorie=cls.batteries, marque=cls.marque, tension_V=12,
+        )
+        Equipement.objects.create(nom='Ventilateur', categorie=cls.appareils)
+        Equipement.objects.create(nom='Retiré', categorie=cls.appareils, actif=False)
+
+    def flux(self, parametres=None):
+        response = APIClient().get('/product/api/equipements/flux/', parametres or {})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_document_compact(self):
+        ligne = EquipementLecture.objects.get(equipement=self.batterie)
+        self.assertEqual(ligne.chemin_categorie, 'Solaire > Batterie')
+        self.assertEqual(ligne.nom_affiche, 'Batterie 100Ah (Victron)')
+        document = json.loads(ligne.document)
+        self.assertEqual(document['tension_V'], '12.00')
+        self.assertNotIn('description', document)
+        self.assertEqual(set(document['categorie']), {'id', 'nom', 'chemin'})
+
+    def test_remplissage_par_la_migration(self):
+        attendu = list(EquipementLecture.objects.order_by('pk').values())
+        EquipementLecture.objects.all().delete()
+        migration = importlib.import_module('product.migrations.0009_lecture_equipement')
+        migration.remplir_lecture(apps, EditeurSchema())
+        self.assertEqual(list(EquipementLecture.objects.order_by('pk').values()), attendu)
+
+    def test_flux(self):
+        with self.assertNumQueries(2):
+            documents = self.flux()
+        self.assertEqual([d['nom'] for d in documents], ['Batterie 100Ah', 'Ventilateur'])
+        self.assertEqual([d['nom'] for d in self.flux({'categorie': self.solaire.pk})], ['Batterie 100Ah'])
+
+    def test_renommages_repercutes(self):
+        self.solaire.nom = 'Énergie'
+        self.solaire.save()
+        self.marque.nom = 'Victron Energy'
+        self.marque.save()
+        ligne = EquipementLecture.objects.get(equipement=self.batterie)
+        self.assertEqual(ligne.chemin_categorie, 'Énergie > Batterie')
+        self.assertEqual(json.loads(ligne.document)['marque']['nom'], 'Victron Energy')
+
+    def test_reconstruire(self):
+        EquipementLecture.objects.all().delete()
+        self.assertEqual(lecture.reconstruire(), 3)
+        self.assertEqual(EquipementLecture.objects.filter(actif=True).count(), 2)
+
+
+def famille(nom, *equipements):
+    """Famille de compatibilite.py à partir de dicts partiels (champs absents : non renseignés)."""
+    lignes = []
+    for i, valeurs in enumerate(equipements):
+        ligne = {champ: None for champ in CHAMPS}
+        ligne.update(id=i, nom='', type_equipement='', mode='', tensions_systeme_V='')
+        ligne.update(valeurs)
+        lignes.append(ligne)
+    return Famille(nom, lignes)
+
+
+class ReglesCompatibiliteTests(SimpleTestCase):
+    """Pour chaque règle : une paire compatible (colonne 0) et une incompatible (colonne 1)."""
+
+    PAIRES = {
+        ('panneau', 'regulateur'): (
+            {'tension_circuit_ouvert_VOC': 22.5, 'courant_court_circuit_ISC': 5.75},
+            [{'tension_max_PV_V': 100, 'courant_charge_A': 20}, {'tension_max_PV_V': 25, 'courant_charge_A': 20}],
+        ),
+        ('panneau', 'onduleur'): (
+            {'tension_circuit_ouvert_VOC': 45},
+            [
+                {'nom': 'Onduleur hybride 3kVA', 'tension_max_PV_V': 450},
+                {'nom': 'Onduleur hybride 1kVA', 'tension_max_PV_V': 50},
+            ],
+        ),
+        ('regulateur', 'batterie'): (
+            {'tensions_systeme_V': '/12/24/'},
+            [{'tension_V': 12.8}, {'tension_V': 48}],
+        ),
+        ('regulateur', 'onduleur'): (
+            {'tensions_systeme_V': '/12/24/'},
+            [{'tension_entree_DC_V': 24}, {'tension_entree_DC_V': 48}],
+        ),
+        ('onduleur', 'batterie'): (
+            {'tension_entree_DC_V': 24},
+            [{'tension_V': 12}, {'tension_V': 48}],
+        ),
+        ('appareil', 'onduleur'): (
+            {'mode': 'AC', 'puissance_W': 800},
+            [{'puissance_VA': 1500}, {'puissance_W': 500}],
+        ),
+        ('appareil', 'batterie'): (
+            {'mode': 'DC', 'tension_V': 12},
+            [{'tension_V': 12}, {'tension_V': 24}],
+        ),
+    }
+
+    def test_chaque_regle(self):
+        self.assertEqual(set(self.PAIRES), set(REGLES))
+        for (nom_a, nom_b), (a, b) in self.PAIRES.items():
+            with self.subTest(regle=f'{nom_a}_{nom_b}'):
+                regle, _ = REGLES[(nom_a, nom_b)]
+                compatible = regle(famille(nom_a, a), famille(nom_b, *b))
+                self.assertEqual(compatible.tolist(), [[True, False]])
+
+    def test_valeur_inconnue_jamais_incompatible(self):
+        for (nom_a, nom_b), (regle, _) in REGLES.items():
+            with self.subTest(regle=f'{nom_a}_{nom_b}'):
+                self.assertTrue(regle(famille(nom_a, {}), famille(nom_b, {})).all())
+
+    def test_paires_non_couvertes(self):
+        # Appareil continu et onduleur, onduleur sans entrée PV et panneaux : pas de branchement direct
+        regle, _ = REGLES[('appareil', 'onduleur')]
+        appareil = famille('appareil', {'mode': 'DC', 'puissance_W': 5000})
+        self.assertTrue(regle(appareil, famille('onduleur', {'puissance_W': 100})).all())
+        regle, _ = REGLES[('panneau', 'onduleur')]
+        panneau = famille('panneau', {'tension_circuit_ouvert_VOC': 45})
+        self.assertTrue(regle(panneau, famille('onduleur', {'tension_max_PV_V': 20})).all())
+
+
+class TableCompatibiliteTests(TestCase):
+    """Table des paires incompatibles : calcul complet, recalcul d'un équipement, lectures."""
+
+    @classmethod
+    def setUpTestData(cls):
+        solaire = Categorie.objects.create(nom='Solaire')
+        categories = {
+            famille: Categorie.objects.create(nom=nom, parent=solaire)
+            for famille, nom in compatibilite.FAMILLES.items()
+        }
+        cls.panneau = Equipement.objects.create(
+            nom='Panneau 100W', categorie=categories['panneau'],
+            tension_circuit_ouvert_VOC=22.5, courant_court_circuit_ISC=5.75,
+        )
+        cls.regulateur = Equipement.objects.create(
+            nom='Contrôleur 20A', categorie=categories['regulateur'],
+            tension_max_PV_V=100, courant_charge_A=20, tension_systeme_V='12/24',
+        )
+        cls.petit_regulateur = Equipement.objects.create(
+            nom='Contrôleur 10A', categorie=categories['regulateur'],
+            tension_max_PV_V=25, courant_charge_A=10, tension_systeme_V='12',
+        )
+        cls.batterie_12 = Equipement.objects.create(nom='Batterie 12V', categorie=categories['batterie'], tension_V=12)
+        cls.batterie_48 = Equipement.objects.create(nom='Batterie 48V', categorie=categories['batterie'], tension_V=48)
+        compatibilite.recalculer()
+
+    def paires(self):
+        return set(compatibilite.IncompatibiliteEquipement.objects.values_list('equipement_id', 'incompatible_id'))
+
+    def test_seules_les_incompatibilites_sont_rangees(self):
+        self.assertEqual(self.paires(), {
+            (self.panneau.pk, self.petit_regulateur.pk),
+            (self.regulateur.pk, self.batterie_48.pk),
+            (self.petit_regulateur.pk, self.batterie_48.pk),
+        })
+
+    def test_recalcul_d_un_equipement(self):
+        complet = self.paires()
+        compatibilite.IncompatibiliteEquipement.objects.all().delete()
+        compatibilite.recalculer([self.batterie_48.pk])
+        self.assertEqual(self.paires(), {p for p in complet if self.batterie_48.pk in p})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batterie_48.tension_V = 24
+            self.batterie_48.save()
+        self.assertNotIn((self.regulateur.pk, self.batterie_48.pk), self.paires())
+        self.assertIn((self.petit_regulateur.pk, self.batterie_48.pk), self.paires())
+
+    def test_recalcul_seulement_si_une_regle_en_depend(self):
+        batterie = Equipement.objects.get(pk=self.batterie_12.pk)
+        with mock.patch.object(compatibilite, 'recalculer') as recalculer:
+            with self.captureOnCommitCallbacks(execute=True):
+                batterie.description = 'Batterie AGM'
+                batterie.tension_V = '12.00'
+                batterie.save()
+            recalculer.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                batterie.tension_V = 24
+                batterie.save()
+            recalculer.assert_called_once_with([batterie.pk])
+            # Relu en base après l'écriture : rien n'a changé depuis
+            with self.captureOnCommitCallbacks(execute=True):
+                batterie.save()
+            recalculer.assert_called_once()
+
+    def test_verifier(self):
+        resultat = compatibilite.verifier([self.panneau.pk, self.regulateur.pk, self.batterie_12.pk])
+        self.assertTrue(resultat['valide'])
+        self.assertEqual(resultat['verifications'], 2)
+
+        resultat = compatibilite.verifier([self.batterie_48.pk, self.panneau.pk, self.petit_regulateur.pk])
+        self.assertFalse(resultat['valide'])
+        self.assertEqual(
+            sorted(sorted(i['equipements']) for i in resultat['incompatibilites']),
+            sorted([
+                sorted([self.panneau.pk, self.petit_regulateur.pk]),
+                sorted([self.petit_regulateur.pk, self.batterie_48.pk]),
+            ]),
+        )
+
+    def test_compatibles_et_alternatives(self):
+        self.assertEqual(set(compatibilite.compatibles(self.panneau.pk)), {self.regulateur.pk})
+        self.assertEqual(
+            set(compatibilite.compatibles(self.regulateur.pk)), {self.panneau.pk, self.batterie_12.pk},
+        )
+        self.assertEqual(set(compatibilite.compatibles(self.regulateur.pk, 'batterie')), {self.batterie_12.pk})
+        self.assertEqual(
+            set(compatibilite.alternatives(self.petit_regulateur.pk, [self.panneau.pk, self.batterie_12.pk])),
+            {self.regulateur.pk},
+        )
+        self.assertEqual(set(compatibilite.alternatives(self.batterie_12.pk, [self.regulateur.pk])), set())
+
+    def test_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('client@example.com', 'motdepasse', role='client'))
+        url = f'/product/api/equipements/{self.regulateur.pk}/compatibles/'
+        ids = {e['id'] for e in client.get(url, {'famille': 'batterie'}).json()['results']}
+        self.assertEqual(ids, {self.batterie_12.pk})
+        self.assertEqual(client.get(url, {'famille': 'inconnue'}).status_code, 400)
+        url = f'/product/api/equipements/{self.petit_regulateur.pk}/alternatives/'
+        ids = {e['id'] for e in client.get(url, {'avec': f'{self.panneau.pk},{self.batterie_12.pk}'}).json()['results']}
+        self.assertEqual(ids, {self.regulateur.pk})
+
+
+class SimilariteTests(TestCase):
+    """Voisins dans la catégorie, sur les caractéristiques renseignées des deux côtés."""
+
+    @classmethod
+    def setUpTestData(cls):
+        panneaux = Categorie.objects.create(nom='Panneau Solaire')
+        batteries = Categorie.objects.create(nom='Batterie')
+        cls.panneaux = {
+            puissance: Equipement.objects.create(
+                nom=f'Panneau {puissance}', categorie=panneaux, puissance_W=puissance, tension_V=24,
+            )
+            for puissance in (100, 110, 300, 1000)
+        }
+        Equipement.objects.create(nom='Batterie', categorie=batteries, puissance_W=105, tension_V=24)
+        cls.retire = Equipement.objects.create(nom='Panneau 105', categorie=panneaux, puissance_W=105, actif=False)
+        Equipement.objects.create(nom='Panneau vide', categorie=panneaux)
+
+    def setUp(self):
+        similarite._index = None
+
+    def test_voisins_par_distance(self):
+        voisins = similarite.index_similarite().similaires(self.panneaux[100], k=10)
+        self.assertEqual(
+            [pk for pk, _, _ in voisins],
+            [self.panneaux[110].pk, self.panneaux[300].pk, self.panneaux[1000].pk],
+        )
+        distances = [distance for _, distance, _ in voisins]
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual({comparees for _, _, comparees in voisins}, {2})
+        self.assertEqual(len(similarite.index_similarite().similaires(self.panneaux[100], k=1)), 1)
+
+    def test_equipement_retire(self):
+        voisins = similarite.index_similarite().similaires(self.retire, k=2)
+        self.assertEqual({pk for pk, _, _ in voisins}, {self.panneaux[100].pk, self.panneaux[110].pk})
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('client@example.com', 'motdepasse', role='client'))
+        url = f'/product/api/equipements/{self.panneaux[300].pk}/similar/'
+        donnees = client.get(url, {'k': 2, 'fields': 'id,nom'}).json()
+        self.assertEqual(donnees['id'], self.panneaux[300].pk)
+        self.assertEqual(
+            [r['nom'] for r in donnees['results']], ['Panneau 110', 'Panneau 100'],
+        )
+        self.assertEqual(set(donnees['results'][0]), {'id', 'nom', 'distance', 'caracteristiques_comparees'})
+        self.assertEqual(client.get(url, {'k': 'x'}).status_code, 400)
+
+    def test_reconstruit_apres_modification(self):
+        index = similarite.index_similarite()
+        self.assertIs(similarite.index_similarite(), index)
+        with self.captureOnCommitCallbacks(execute=True):
+            Equipement.objects.create(nom='Panneau 101', categorie=self.panneaux[100].categorie, puissance_W=101, tension_V=24)
+        voisins = similarite.index_similarite().similaires(self.panneaux[100], k=1)
+        self.assertEqual(Equipement.objects.get(pk=voisins[0][0]).nom, 'Panneau 101')
+
+    def test_reconstruit_apres_ecriture_ailleurs(self):
+        similarite.index_similarite()
+        # Écriture bulk d'un autre processus : seul le marqueur en base change
+        Equipement.objects.filter(pk=self.panneaux[1000].pk).update(puissance_W=101)
+        marquer_modification('equipement')
+        voisins = similarite.index_similarite().similaires(self.panneaux[100], k=1)
+        self.assertEqual(voisins[0][0], self.panneaux[1000].pk)
+
+
+class GrillePrixTests(TestCase):
+    """Grille de prix : lecture pour tout utilisateur connecté, écriture réservée aux admins."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.equipement = Equipement.objects.create(nom='Panneau', categorie=Categorie.objects.create(nom='Panneau Solaire'))
+        cls.prix = PrixEquipement.objects.create(equipement=cls.equipement, prix=100000, date_effet='2026-01-01')
+
+    def client_pour(self, role, **champs):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(f'{role}@example.com', 'motdepasse', role=role, **champs))
+        return client
+
+    def test_lecture_ouverte(self):
+        response = self.client_pour('client').get('/product/api/prix/', {'equipement': self.equipement.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.prix.pk])
+
+    def test_ecriture_reservee(self):
+        url = f'/product/api/prix/{self.prix.pk}/'
+        donnees = {'equipement': self.equipement.pk, 'province': '', 'prix': '90000', 'date_effet': '2026-06-01'}
+        for role in ('client', 'technicien'):
+            client = self.client_pour(role)
+            with self.subTest(role=role):
+                self.assertEqual(client.post('/product/api/prix/', donnees).status_code, 403)
+                self.assertEqual(client.patch(url, {'prix': '1'}).status_code, 403)
+                self.assertEqual(client.delete(url).status_code, 403)
+        self.assertEqual(self.client_pour('admin').post('/product/api/prix/', donnees).status_code, 201)
+        # Staff Django sans rôle admin
+        staff = APIClient()
+        staff.force_authenticate(User.objects.create_user('staff@example.com', 'motdepasse', is_staff=True))
+        self.assertEqual(staff.patch(url, {'prix': '95000'}).status_code, 200)
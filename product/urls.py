@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategorieViewSet, MarqueViewSet, EquipementViewSet
+from .views import CategorieViewSet, MarqueViewSet, EquipementViewSet, PrixEquipementViewSet, AutocompletionViewSet
 
 router = DefaultRouter()
 router.register(r'categories', CategorieViewSet, basename='categorie')
 router.register(r'marques', MarqueViewSet, basename='marque')
 router.register(r'equipements', EquipementViewSet, basename='equipement')
+router.register(r'prix', PrixEquipementViewSet, basename='prixequipement')
+router.register(r'autocompletion', AutocompletionViewSet, basename='autocompletion')
 
 urlpatterns = [
     path('api/', include(router.urls)),
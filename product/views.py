@@ -1,32 +1,345 @@
-from django.shortcuts import render
+from django.core.exceptions import FieldDoesNotExist
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 # Create your views here.
-from rest_framework import viewsets, filters
-from .models import Categorie, Marque, Equipement
-from .serializers import CategorieSerializer, MarqueSerializer, EquipementSerializer
+from rest_framework import viewsets, filters, serializers
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from idav.permissions import IsAdminOrReadOnly
+from .autocompletion import POIDS_TYPES, completer
+from .cache import CacheCatalogueMixin
+from .compatibilite import FAMILLES, alternatives, compatibles
+from .facettes import calculer_facettes, facettes_catalogue
+from .filters import EquipementFilter, RechercheEquipementFilter
+from .lecture import flux_json
+from .models import Categorie, Marque, Equipement, EquipementLecture, PrixEquipement
+from .similarite import CARACTERISTIQUES, index_similarite
+from .serializers import (
+    CategorieSerializer, MarqueSerializer, EquipementSerializer, PrixEquipementSerializer, indexer_par_parent,
+)
 
 from rest_framework.permissions import IsAuthenticated, IsAdminUser ,AllowAny
-class CategorieViewSet(viewsets.ModelViewSet):
+
+
+class ChampsDynamiquesVueMixin:
+    """
+    ?fields=a,b (champs à garder) et ?omit=c,d (champs à retirer) en lecture :
+    restreint le serializer et, quand tous les champs correspondent à des colonnes,
+    la liste des colonnes lues via .only() et les jointures select_related.
+    `actions_lecture` liste les actions en POST qui ne font que lire (lot d'ids...).
+    """
+    actions_lecture = ()
+
+    def champs_demandes(self):
+        if self.request is None:
+            return None, None
+        if self.request.method not in SAFE_METHODS and self.action not in self.actions_lecture:
+            return None, None
+        params = self.request.query_params
+        champs = [c for c in params.get('fields', '').split(',') if c] or None
+        exclus = [c for c in params.get('omit', '').split(',') if c] or None
+        if champs is None and exclus is None:
+            return None, None
+
+        lisibles = [nom for nom, field in self.get_serializer_class()().fields.items() if not field.write_only]
+        inconnus = [c for c in (champs or []) + (exclus or []) if c not in lisibles]
+        if inconnus:
+            raise ValidationError({'fields': [f"Champ inconnu : {nom}" for nom in inconnus]})
+        return champs, exclus
+
+    def champs_lus(self):
+        """Noms des champs effectivement sérialisés, ou None si tous."""
+        champs, exclus = self.champs_demandes()
+        if champs is None and exclus is None:
+            return None
+        serializer = self.get_serializer_class()()
+        noms = [nom for nom, field in serializer.fields.items() if not field.write_only]
+        return [nom for nom in noms if (champs is None or nom in champs) and nom not in (exclus or [])]
+
+    def get_serializer(self, *args, **kwargs):
+        champs, exclus = self.champs_demandes()
+        if champs is not None:
+            kwargs.setdefault('champs', champs)
+        if exclus is not None:
+            kwargs.setdefault('exclus', exclus)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        noms = self.champs_lus()
+        if noms is None:
+            return queryset
+
+        serializer = self.get_serializer_class()()
+        modele = queryset.model
+        colonnes = {modele._meta.pk.name}
+        relations = set()
+        for nom in noms:
+            field = serializer.fields[nom]
+            source = field.source.split('.')[0]
+            try:
+                model_field = modele._meta.get_field(source)
+            except FieldDoesNotExist:
+                # Champ calculé (SerializerMethodField...) : colonnes inconnues, pas de restriction
+                return queryset
+            colonnes.add(source)
+            if model_field.is_relation and isinstance(field, serializers.BaseSerializer):
+                relations.add(source)
+
+        jointures = queryset.query.select_related
+        if isinstance(jointures, dict):
+            # select_related() sans argument suivrait toutes les clés étrangères : on repart de zéro
+            conservees = [r for r in jointures if r in relations]
+            queryset = queryset.select_related(None)
+            if conservees:
+                queryset = queryset.select_related(*conservees)
+        return queryset.only(*colonnes)
+
+
+class CategorieViewSet(CacheCatalogueMixin, ChampsDynamiquesVueMixin, viewsets.ModelViewSet):
     queryset = Categorie.objects.all()
     serializer_class = CategorieSerializer
+    tables_catalogue = ('categorie',)
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['nom']
     ordering_fields = ['nom']
 
+    @action(detail=False, methods=['get'])
+    def arbre(self, request):
+        """
+        GET /categories/arbre/ : toute la hiérarchie.
+        GET /categories/arbre/?racine=<id> : le sous-arbre de cette catégorie.
+        Les nœuds sont lus en une requête sur le chemin matérialisé.
+        """
+        return self.reponse_catalogue(request, self._arbre)
+
+    def _arbre(self, request):
+        noeuds = Categorie.objects.order_by('id')
+        racine_id = request.query_params.get('racine')
+        if racine_id:
+            racine = get_object_or_404(Categorie, pk=racine_id)
+            noeuds = noeuds.filter(Categorie.filtre_descendants(racine.chemin))
+
+        noeuds = list(noeuds)
+        index = indexer_par_parent(noeuds)
+        racines = [racine] if racine_id else index.get(None, [])
+        context = self.get_serializer_context()
+        context['index_categories'] = index
+        return Response(CategorieSerializer(racines, many=True, context=context).data)
 
-class MarqueViewSet(viewsets.ModelViewSet):
+
+class MarqueViewSet(CacheCatalogueMixin, ChampsDynamiquesVueMixin, viewsets.ModelViewSet):
     queryset = Marque.objects.all()
     serializer_class = MarqueSerializer
+    tables_catalogue = ('marque',)
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['nom']
     permission_classes = [IsAuthenticated]
     ordering_fields = ['nom']
 
 
-class EquipementViewSet(viewsets.ModelViewSet):
-    queryset = Equipement.objects.select_related('categorie', 'marque').all()
+class EquipementViewSet(CacheCatalogueMixin, ChampsDynamiquesVueMixin, viewsets.ModelViewSet):
+    queryset = Equipement.objects.select_related('categorie', 'marque').filter(actif=True)
     serializer_class = EquipementSerializer
     permission_classes = [AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    tables_catalogue = ('equipement', 'categorie', 'marque')
+    actions_lecture = ('lot',)
+    taille_lot_max = 200
+    similaires_par_defaut = 10
+    similaires_max = 50
+    filter_backends = [DjangoFilterBackend, RechercheEquipementFilter, filters.OrderingFilter]
+    filterset_class = EquipementFilter
     search_fields = ['nom', 'description', 'type_equipement', 'categorie__nom', 'marque__nom']
-    ordering_fields = ['nom', 'categorie__nom', 'marque__nom', 'puissance_W', 'tension_V']
+    ordering_fields = [
+        'nom', 'categorie__nom', 'marque__nom', 'puissance_W', 'tension_V',
+        'puissance_VA', 'capacite_Ah', 'energie_Wh', 'efficacite_module_pourcent',
+        'cycle_vie_min', 'cycle_vie_max', 'surface_m2', 'tension_systeme_max_V',
+    ]
+
+    @action(detail=False, methods=['get'])
+    def facettes(self, request):
+        """
+        GET /equipements/facettes/ : nombre d'équipements par catégorie, marque et mode,
+        avec les mêmes filtres et ?search= que la liste, en une requête.
+        Sans paramètre, facettes du catalogue complet précalculées en cache.
+        """
+        return self.reponse_catalogue(request, self._facettes)
+
+    @action(detail=False, methods=['get', 'post'])
+    def lot(self, request):
+        """
+        Plusieurs équipements en une requête, dans l'ordre demandé :
+        GET /equipements/lot/?ids=3,8,15 ou POST {"ids": [3, 8, 15]}.
+        Accepte ?fields= / ?omit= ; les ids inconnus ou retirés sont listés dans `manquants`.
+        """
+        if request.method == 'GET':
+            return self.reponse_catalogue(request, self._lot)
+        return self._lot(request)
+
+    def _lot(self, request):
+        if request.method == 'GET':
+            brut = [i for i in request.query_params.get('ids', '').split(',') if i.strip()]
+        else:
+            brut = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if not isinstance(brut, list) or not brut:
+            raise ValidationError({'ids': ["Liste d'identifiants attendue."]})
+        try:
+            ids = list(dict.fromkeys(int(i) for i in brut))
+        except (TypeError, ValueError):
+            raise ValidationError({'ids': ["Les identifiants doivent être des entiers."]})
+        if len(ids) > self.taille_lot_max:
+            raise ValidationError({'ids': [f"{self.taille_lot_max} identifiants au plus par requête."]})
+
+        trouves = self.get_queryset().in_bulk(ids)
+        equipements = [trouves[pk] for pk in ids if pk in trouves]
+        return Response({
+            'results': self.get_serializer(equipements, many=True).data,
+            'manquants': [pk for pk in ids if pk not in trouves],
+        })
+
+    @action(detail=False, methods=['get'])
+    def flux(self, request):
+        """
+        GET /equipements/flux/ : tout le catalogue actif en un tableau JSON envoyé
+        au fil de l'eau, depuis le modèle de lecture (documents déjà rendus, champs
+        vides omis). ?categorie=<id> restreint au sous-arbre de cette catégorie.
+        """
+        etag, modifie_le = self.validateurs(request)
+        horodatage = int(modifie_le.timestamp()) if modifie_le else None
+        non_modifie = get_conditional_response(request._request, etag=etag, last_modified=horodatage)
+        if non_modifie is not None:
+            return non_modifie
+
+        documents = EquipementLecture.objects.filter(actif=True).order_by('equipement_id')
+        categorie_id = request.query_params.get('categorie')
+        if categorie_id:
+            categorie = get_object_or_404(Categorie, pk=categorie_id)
+            documents = documents.filter(Categorie.filtre_descendants(categorie.chemin, 'categorie_chemin'))
+
+        response = StreamingHttpResponse(flux_json(documents), content_type='application/json')
+        response['ETag'] = etag
+        if horodatage:
+            response['Last-Modified'] = http_date(horodatage)
+        return response
+
+    @action(detail=True, methods=['get'])
+    def compatibles(self, request, pk=None):
+        """
+        GET /equipements/{id}/compatibles/?famille=batterie : équipements électriquement
+        compatibles, lus dans la table des paires précalculées. Filtres, ?search=
+        et tri de la liste s'appliquent.
+        """
+        return self.reponse_catalogue(request, self._compatibles, pk)
+
+    @action(detail=True, methods=['get'])
+    def alternatives(self, request, pk=None):
+        """
+        GET /equipements/{id}/alternatives/?avec=3,8 : équipements de la même famille,
+        compatibles avec chacun des équipements `avec` (le reste d'une proposition).
+        """
+        return self.reponse_catalogue(request, self._alternatives, pk)
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similaires(self, request, pk=None):
+        """
+        GET /equipements/{id}/similar/?k=10 : équipements actifs de la même catégorie
+        aux caractéristiques les plus proches (index en mémoire), du plus proche au
+        plus lointain, avec leur distance. Accepte ?fields= / ?omit=.
+        """
+        return self.reponse_catalogue(request, self._similaires, pk)
+
+    def _similaires(self, request, pk):
+        try:
+            k = int(request.query_params.get('k', self.similaires_par_defaut))
+        except ValueError:
+            raise ValidationError({'k': ["Entier attendu."]})
+        k = max(1, min(k, self.similaires_max))
+        # L'équipement de départ peut être retiré du catalogue (rupture) : lu sans filtre `actif`
+        equipement = get_object_or_404(Equipement.objects.only('pk', 'categorie_id', *CARACTERISTIQUES), pk=pk)
+        voisins = index_similarite().similaires(equipement, k)
+
+        trouves = self.get_queryset().in_bulk([pk for pk, _, _ in voisins])
+        resultats = []
+        for pk, distance, comparees in voisins:
+            if pk in trouves:
+                donnees = self.get_serializer(trouves[pk]).data
+                resultats.append({'distance': round(distance, 4), 'caracteristiques_comparees': comparees, **donnees})
+        return Response({'id': equipement.pk, 'results': resultats})
+
+    def _compatibles(self, request, pk):
+        famille = request.query_params.get('famille')
+        if famille and famille not in FAMILLES:
+            raise ValidationError({'famille': [f"Famille inconnue : {famille}"]})
+        equipement = get_object_or_404(Equipement, pk=pk)
+        return self._liste_equipements(self.get_queryset().filter(pk__in=compatibles(equipement.pk, famille)))
+
+    def _alternatives(self, request, pk):
+        brut = [i for i in request.query_params.get('avec', '').split(',') if i.strip()]
+        try:
+            avec = [int(i) for i in brut]
+        except ValueError:
+            raise ValidationError({'avec': ["Les identifiants doivent être des entiers."]})
+        equipement = get_object_or_404(Equipement, pk=pk)
+        return self._liste_equipements(self.get_queryset().filter(pk__in=alternatives(equipement.pk, avec)))
+
+    def _liste_equipements(self, queryset):
+        queryset = self.filter_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    def _facettes(self, request):
+        if not set(request.query_params) - {'format'}:
+            return Response(facettes_catalogue())
+        return Response(calculer_facettes(self.filter_queryset(self.get_queryset())))
+
+
+class PrixEquipementViewSet(viewsets.ModelViewSet):
+    """
+    Grille de prix datée. ?equipement=<id>&province=<nom> filtre les entrées ;
+    le prix appliqué à un devis est résolu par installation/devis.py.
+    """
+    queryset = PrixEquipement.objects.order_by('equipement_id', 'province', '-date_effet')
+    serializer_class = PrixEquipementSerializer
+    # Les prix alimentent tous les devis : lecture pour tout utilisateur connecté, écriture admin
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['equipement', 'province']
+    ordering_fields = ['date_effet', 'prix']
+
+
+class AutocompletionViewSet(viewsets.ViewSet):
+    """
+    GET /autocompletion/?q=ond : noms d'équipements, marques et catégories
+    commençant par les mots saisis, depuis l'index en mémoire (aucune requête).
+    ?limit= (10 par défaut, 50 au plus), ?types=marque,categorie pour restreindre.
+    """
+    permission_classes = [AllowAny]
+    limite_par_defaut = 10
+    limite_max = 50
+
+    def list(self, request):
+        texte = request.query_params.get('q', '')
+        try:
+            limite = int(request.query_params.get('limit', self.limite_par_defaut))
+        except ValueError:
+            raise ValidationError({'limit': ["Entier attendu."]})
+        limite = max(1, min(limite, self.limite_max))
+
+        types = [t for t in request.query_params.get('types', '').split(',') if t] or None
+        inconnus = [t for t in types or [] if t not in POIDS_TYPES]
+        if inconnus:
+            raise ValidationError({'types': [f"Type inconnu : {t}" for t in inconnus]})
+
+        resultats = completer(texte, limite, types)
+        return Response({
+            'q': texte,
+            'results': [{'type': type_, 'id': pk, 'nom': nom} for type_, pk, nom in resultats],
+        })